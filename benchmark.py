@@ -0,0 +1,449 @@
+"""Бенчмарки запросов журнала на синтетических данных.
+
+Данные создаются в отдельной схеме journal_bench, которая удаляется после
+замера, поэтому рабочие таблицы не затрагиваются. Параметры подключения по
+умолчанию берутся из config.ini, как в самом приложении.
+
+Пример запуска:
+    python benchmark.py indexes --rows 2000000
+    python benchmark.py docx --sizes 1000 10000 100000
+    python benchmark.py audio --seconds 5 --consumer-ms 50 500 2000
+    python benchmark.py speech --wav dictation.wav
+"""
+import argparse
+import configparser
+import os
+import random
+import statistics
+import tempfile
+import threading
+import tracemalloc
+from time import perf_counter, sleep
+
+import numpy as np
+import psycopg2
+import pyaudio
+import speech_recognition as sr
+
+from journal import (
+    SCHEMA_MIGRATIONS, build_filter_query, build_report_document, DocxReportWriter, AudioCapture, AUDIO_RATE,
+    AUDIO_FRAMES_PER_BUFFER, SPEECH_ENGINES, load_speech_settings,
+)
+
+BENCH_SCHEMA = "journal_bench"
+ROWS_PER_DAY = 100  # Записей журнала на дату (обе смены) в синтетических данных
+
+
+def connect(args):
+    """Подключается к базе данных с параметрами из командной строки или config.ini."""
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    credentials = config["Credentials"] if "Credentials" in config else {}
+    return psycopg2.connect(
+        host=args.host or credentials.get("host", "localhost"),
+        user=args.user or credentials.get("username", ""),
+        password=args.password or credentials.get("password", ""),
+        dbname=args.dbname
+    )
+
+
+def migration(version):
+    """Возвращает SQL-операторы миграции схемы с указанным номером для схемы замеров.
+
+    search_path замеров содержит только journal_bench, чтобы неквалифицированные
+    DROP INDEX миграций не задели рабочие индексы в public. Поэтому pg_trgm
+    создается явно в public, а его класс операторов указывается со схемой.
+    """
+    for migration_version, _, statements in SCHEMA_MIGRATIONS:
+        if migration_version == version:
+            return [bench_statement(statement) for statement in statements]
+    raise KeyError(version)
+
+
+def bench_statement(statement):
+    """Адаптирует оператор миграции к search_path без public."""
+    if statement.startswith("CREATE EXTENSION IF NOT EXISTS pg_trgm"):
+        return "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public"
+    return statement.replace("gin_trgm_ops", "public.gin_trgm_ops")
+
+
+def apply_migrations(cursor, *versions):
+    """Применяет указанные миграции к схеме замеров и обновляет статистику."""
+    for version in versions:
+        for statement in migration(version):
+            cursor.execute(statement)
+    cursor.execute("ANALYZE")
+
+
+def create_bench_schema(cursor):
+    """Создает пустую схему для замеров и делает ее текущей."""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+    for statement in migration(1):
+        cursor.execute(statement)
+
+
+def seed(cursor, rows):
+    """Заполняет таблицы синтетическими записями и возвращает число дат."""
+    cursor.execute(
+        """
+        INSERT INTO journal (date, shift, time, content, note)
+        SELECT
+            DATE '2000-01-01' + g / %(per_day)s,
+            CASE WHEN g %% 2 = 0 THEN '1-я смена' ELSE '2-я смена' END,
+            TIME '00:00' + (g %% 1440) * INTERVAL '1 minute',
+            'Запись ' || g || ': ' || md5(g::text),
+            CASE WHEN g %% 5 = 0 THEN 'Примечание ' || md5((g + 1)::text) ELSE '' END
+        FROM generate_series(0, %(rows)s - 1) AS g
+        """,
+        {"rows": rows, "per_day": ROWS_PER_DAY}
+    )
+    days = max(rows // ROWS_PER_DAY, 1)
+    cursor.execute(
+        """
+        INSERT INTO engineers (shift, date, name)
+        SELECT shift, DATE '2000-01-01' + d, 'Инженер ' || n
+        FROM generate_series(0, %s - 1) AS d,
+             (VALUES ('1-я смена'), ('2-я смена')) AS s(shift),
+             generate_series(1, 3) AS n
+        """,
+        (days,)
+    )
+    cursor.execute(
+        """
+        INSERT INTO engineers_info (full_name, tab_number)
+        SELECT 'Инженер ' || n, lpad(n::text, 6, '0') FROM generate_series(1, 50) AS n
+        """
+    )
+    cursor.execute("ANALYZE")
+    return days
+
+
+def random_shifts(cursor, days, count):
+    """Случайные пары (дата, смена) из диапазона синтетических данных."""
+    cursor.execute(
+        "SELECT DATE '2000-01-01' + (random() * %s)::int FROM generate_series(1, %s)",
+        (days - 1, count)
+    )
+    return [(row[0], random.choice(["1-я смена", "2-я смена"])) for row in cursor.fetchall()]
+
+
+def measure(cursor, query, params_list):
+    """Выполняет запрос для каждого набора параметров и возвращает медиану в мс."""
+    timings = []
+    for params in params_list:
+        started = perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append((perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def plan_root(cursor, query, params):
+    """Возвращает описание верхних узлов плана запроса."""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    node = cursor.fetchone()[0][0]["Plan"]
+    nodes = []
+    while node:
+        nodes.append(node["Node Type"])
+        node = node.get("Plans", [None])[0]
+    return " -> ".join(nodes)
+
+
+def print_results(title, results):
+    print(title)
+    print(f"{'запрос':<28}{'до, мс':>12}{'после, мс':>12}   план после")
+    for name, before, after, plan in results:
+        print(f"{name:<28}{before:>12.2f}{after:>12.2f}   {plan}")
+
+
+SHIFT_JOURNAL_QUERY = """
+    SELECT id, date, shift, time, content, note
+    FROM journal
+    WHERE date = %s AND shift = %s
+    ORDER BY
+        CASE
+            WHEN shift = '2-я смена' AND time >= '00:00' AND time < '08:30' THEN date + INTERVAL '1 day'
+            ELSE date
+        END ASC,
+        time ASC
+"""
+SHIFT_JOURNAL_EVENT_TS_QUERY = """
+    SELECT id, date, shift, time, content, note
+    FROM journal
+    WHERE date = %s AND shift = %s
+    ORDER BY event_ts, id
+"""
+SHIFT_ENGINEERS_QUERY = "SELECT name FROM engineers WHERE date = %s AND shift = %s"
+
+
+def bench_indexes(cursor, args):
+    """Выборки одной смены до и после индексов миграций 2 и 6 (сортировка по event_ts)."""
+    days = seed(cursor, args.rows)
+    params = random_shifts(cursor, days, args.repeats)
+    queries = [
+        ("журнал смены", SHIFT_JOURNAL_QUERY),
+        ("инженеры смены", SHIFT_ENGINEERS_QUERY),
+    ]
+
+    before = {name: measure(cursor, query, params) for name, query in queries}
+    apply_migrations(cursor, 2)
+    results = [
+        (name, before[name], measure(cursor, query, params), plan_root(cursor, query, params[0]))
+        for name, query in queries
+    ]
+
+    # Сортировка CASE по индексу миграции 2 против сортировки по индексу event_ts
+    case_sort = measure(cursor, SHIFT_JOURNAL_QUERY, params)
+    apply_migrations(cursor, 6)
+    results.append((
+        "журнал смены, event_ts", case_sort, measure(cursor, SHIFT_JOURNAL_EVENT_TS_QUERY, params),
+        plan_root(cursor, SHIFT_JOURNAL_EVENT_TS_QUERY, params[0])
+    ))
+    print_results(f"Индексы журнала, {args.rows} записей, {args.repeats} запросов:", results)
+
+
+def bench_pagination(cursor, args):
+    """Переход на глубокие страницы: LIMIT/OFFSET против выборки по ключу (event_ts, id)."""
+    seed(cursor, args.rows)
+    apply_migrations(cursor, 6)
+
+    page_size = 100
+    offset_query = "SELECT id, date, shift, time, content, note FROM journal ORDER BY event_ts, id LIMIT %s OFFSET %s"
+    keyset_query = """
+        SELECT id, date, shift, time, content, note FROM journal
+        WHERE (event_ts, id) > (%s, %s)
+        ORDER BY event_ts, id LIMIT %s
+    """
+    results = []
+    for page in (1, 100, 1000, args.rows // page_size // 2):
+        cursor.execute(
+            "SELECT event_ts, id FROM journal ORDER BY event_ts, id OFFSET %s LIMIT 1",
+            (page * page_size - 1,)
+        )
+        key = cursor.fetchone()
+        offset_ms = measure(cursor, offset_query, [(page_size, page * page_size)] * args.repeats)
+        keyset_params = (*key, page_size)
+        keyset_ms = measure(cursor, keyset_query, [keyset_params] * args.repeats)
+        results.append((f"страница {page}", offset_ms, keyset_ms, plan_root(cursor, keyset_query, keyset_params)))
+    print_results(f"Пагинация, {args.rows} записей (до - OFFSET, после - по ключу):", results)
+
+
+def bench_trigram(cursor, args):
+    """Поиск подстроки в фильтре журнала: ILIKE без индекса против триграммных индексов."""
+    seed(cursor, args.rows)
+    apply_migrations(cursor, 2, 6)
+
+    cursor.execute("SELECT substr(md5((random() * %s)::int::text), 1, 8)", (args.rows,))
+    rare = cursor.fetchone()[0]
+    keywords = [
+        ("редкое слово", rare, ""),
+        ("частое слово", "Запись", ""),
+        ("примечание", "", rare[:6]),
+    ]
+    old_query = "SELECT date, shift, time, content, note FROM journal WHERE {} ORDER BY event_ts, id LIMIT 100"
+
+    before = {}
+    for name, content_filter, note_filter in keywords:
+        column, keyword = ("content", content_filter) if content_filter else ("note", note_filter)
+        before[name] = measure(cursor, old_query.format(f"{column} ILIKE %s"), [(f"%{keyword}%",)] * args.repeats)
+
+    apply_migrations(cursor, 4)
+    results = []
+    for name, content_filter, note_filter in keywords:
+        query, params = build_filter_query(content_filter, note_filter, limit=100)
+        results.append((name, before[name], measure(cursor, query, [params] * args.repeats), plan_root(cursor, query, params)))
+    print_results(f"Поиск подстроки, {args.rows} записей (до - ILIKE без индекса, после - pg_trgm):", results)
+
+
+def render_report(render, path, memory):
+    """Выполняет запись отчета и возвращает (время в мс, пиковая память в МБ или None).
+
+    tracemalloc видит только память Python: дерево lxml внутри python-docx
+    в замер не попадает, так что его оценка для python-docx занижена.
+    """
+    if memory:
+        tracemalloc.start()
+    started = perf_counter()
+    render(path)
+    elapsed = (perf_counter() - started) * 1000
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_docx(args):
+    """Отчет Word: python-docx (table.add_row и .text) против потоковой записи DocxReportWriter."""
+    writer = DocxReportWriter()
+    title = "Журнал смены: 2-я смена, Дата: 01 January 2000"
+    engineers = ["Инженер 1", "Инженер 2", "Инженер 3"]
+
+    def rows(count):
+        for i in range(count):
+            note = "Примечание" if i % 5 == 0 else ""
+            yield f"{i // 60 % 24:02d}:{i % 60:02d}", f"Запись {i}: проверка оборудования", note
+
+    print("Отчет Word" + (" (время с учетом накладных расходов tracemalloc)" if args.memory else "") + ":")
+    print(f"{'строк':>8}{'python-docx, мс':>18}{'поток, мс':>12}{'python-docx, МБ':>18}{'поток, МБ':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "report.docx")
+        for size in args.sizes:
+            before_ms, before_mb = render_report(
+                lambda target: build_report_document(title, engineers, list(rows(size))).save(target), path, args.memory
+            )
+            after_ms, after_mb = render_report(
+                lambda target: writer.write(target, title, engineers, rows(size)), path, args.memory
+            )
+            memory = f"{before_mb:>18.1f}{after_mb:>12.1f}" if args.memory else ""
+            print(f"{size:>8}{before_ms:>18.0f}{after_ms:>12.0f}{memory}")
+
+
+class FakeInputStream:
+    """Поддельный входной поток: синус 440 Гц буферами frames_per_buffer в реальном темпе rate.
+
+    Вызывает callback из своего потока, как PortAudio. Каждый overflow_every-й
+    буфер помечается флагом переполнения входа.
+    """
+
+    def __init__(self, rate, frames_per_buffer, callback, overflow_every=0):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.overflow_every = overflow_every
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.buffers = 0
+
+    def run(self):
+        started = perf_counter()
+        while not self.stopped.is_set():
+            position = self.buffers * self.frames_per_buffer
+            self.buffers += 1
+            overflow = self.overflow_every and self.buffers % self.overflow_every == 0
+            data = sine(position, self.frames_per_buffer, self.rate).tobytes()
+            self.callback(data, self.frames_per_buffer, None, pyaudio.paInputOverflow if overflow else 0)
+            # Следующий буфер - по расписанию от начала, чтобы темп не уплывал
+            delay = started + self.buffers * self.frames_per_buffer / self.rate - perf_counter()
+            if delay > 0:
+                sleep(delay)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def close(self):
+        pass
+
+
+def sine(start, count, rate):
+    """Отсчеты int16 синуса 440 Гц с номерами [start, start + count)."""
+    t = np.arange(start, start + count) / rate
+    return (np.sin(2 * np.pi * 440 * t) * 10000).astype(np.int16)
+
+
+def bench_audio(args):
+    """Захват звука: сколько отсчетов теряется при разной периодичности чтения кольцевого буфера."""
+    print(f"Захват {args.seconds} с звука {AUDIO_RATE} Гц буферами по {AUDIO_FRAMES_PER_BUFFER}, "
+          f"кольцевой буфер {args.buffer_seconds} с:")
+    print(f"{'чтение, мс':>12}{'записано':>10}{'прочитано':>11}{'потеряно':>10}{'переполн.':>11}{'без искаж.':>12}")
+    for consumer_ms in args.consumer_ms:
+        capture = AudioCapture(
+            buffer_seconds=args.buffer_seconds,
+            stream_factory=lambda rate, frames, callback: FakeInputStream(rate, frames, callback, overflow_every=50),
+        )
+        chunks = []
+        capture.start()
+        started = perf_counter()
+        while perf_counter() - started < args.seconds:
+            sleep(consumer_ms / 1000)
+            chunks.append(capture.read())
+        capture.stop()
+        chunks.append(capture.read())
+        samples = np.concatenate(chunks)
+        stats = capture.stats()
+        assert stats["captured"] == len(samples) + stats["dropped"]
+        # Прочитанное должно быть концом непрерывного синуса: потери только целыми отрезками
+        intact = not stats["dropped"] and np.array_equal(samples, sine(0, len(samples), AUDIO_RATE))
+        print(f"{consumer_ms:>12}{stats['captured']:>10}{len(samples):>11}{stats['dropped']:>10}"
+              f"{stats['overflows']:>11}{('да' if intact else '-'):>12}")
+
+
+def bench_speech(args):
+    """Распознавание речи: задержка и RTF каждого доступного движка на одной записи."""
+    if not args.wav:
+        raise SystemExit("Укажите запись речи: --wav файл.wav")
+    with sr.AudioFile(args.wav) as source:
+        audio_data = sr.Recognizer().record(source)
+    duration = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+    settings = load_speech_settings()
+    print(f"Запись {args.wav}: {duration:.1f} с")
+    print(f"{'движок':>8}{'задержка, с':>13}{'RTF':>7}  текст")
+    for name, engine_class in SPEECH_ENGINES.items():
+        try:
+            engine = engine_class(settings)
+            engine.recognize(audio_data)  # Прогрев: загрузка модели не входит в замер
+            result = engine.recognize(audio_data)
+        except Exception as e:
+            print(f"{name:>8}  недоступен: {e}")
+            continue
+        rtf = f"{result.rtf:>7.2f}" if result.rtf is not None else f"{'-':>7}"
+        print(f"{name:>8}{result.latency:>13.2f}{rtf}  {result.text[:60]}")
+
+
+BENCHMARKS = {
+    "indexes": bench_indexes,
+    "pagination": bench_pagination,
+    "trigram": bench_trigram,
+}
+# Бенчмарки без подключения к базе данных
+OFFLINE_BENCHMARKS = {
+    "docx": bench_docx,
+    "audio": bench_audio,
+    "speech": bench_speech,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки запросов журнала инженеров по АСУ.")
+    parser.add_argument("benchmark", choices=sorted({**BENCHMARKS, **OFFLINE_BENCHMARKS}))
+    parser.add_argument("--rows", type=int, default=2000000, help="Количество синтетических записей журнала")
+    parser.add_argument("--repeats", type=int, default=50, help="Количество замеров каждого запроса")
+    parser.add_argument("--host")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--dbname", default="shift_journal_db")
+    parser.add_argument("--keep", action="store_true", help="Не удалять схему journal_bench после замера")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Количество строк таблицы отчета Word (docx)")
+    parser.add_argument("--memory", action="store_true", help="Замерять пиковую память (docx)")
+    parser.add_argument("--seconds", type=float, default=5, help="Длительность захвата звука (audio)")
+    parser.add_argument("--consumer-ms", type=int, nargs="+", default=[50, 500, 2000],
+                        help="Периодичность чтения кольцевого буфера, мс (audio)")
+    parser.add_argument("--buffer-seconds", type=int, default=1, help="Емкость кольцевого буфера, с (audio)")
+    parser.add_argument("--wav", help="WAV-файл с записью речи (speech)")
+    args = parser.parse_args()
+
+    if args.benchmark in OFFLINE_BENCHMARKS:
+        OFFLINE_BENCHMARKS[args.benchmark](args)
+        return
+
+    connection = connect(args)
+    try:
+        with connection.cursor() as cursor:
+            create_bench_schema(cursor)
+            BENCHMARKS[args.benchmark](cursor, args)
+            if not args.keep:
+                cursor.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
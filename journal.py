@@ -1,17 +1,49 @@
 import sys
 import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+import psycopg2.extras
 import configparser
-import win32com.client as win32
+import threading
+import itertools
+import math
+import html
+import json
+import sqlite3
+import uuid
+import datetime
+import argparse
+import csv
+import io
+import re
+import zipfile
+import string
+import multiprocessing
+import concurrent.futures
+import queue
+import socket
+import tempfile
+from collections import namedtuple
+from xml.sax.saxutils import escape as xml_escape
+from contextlib import contextmanager, closing
+from time import monotonic
+import smtplib
+import ssl
+import email
+import email.policy
+from email.message import EmailMessage
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, 
     QMessageBox, QCheckBox, QHBoxLayout, QFormLayout, QTableWidget, 
-    QTableWidgetItem, QComboBox, QTextEdit, QTimeEdit, QDateEdit, QGroupBox, QListWidget, QHeaderView, QMenuBar, QAction, QDialog, QFileDialog, QSizePolicy, QSlider)
-from PyQt5.QtCore import QTime, QDate, Qt, QTimer, QRegExp, QSettings
+    QTableWidgetItem, QComboBox, QTextEdit, QTimeEdit, QDateEdit, QGroupBox, QListWidget, QHeaderView, QMenuBar, QAction, QDialog, QFileDialog, QSizePolicy, QSlider,
+    QInputDialog, QProgressDialog, QProgressBar)
+from PyQt5.QtCore import QTime, QDate, Qt, QTimer, QRegExp, QSettings, QObject, QRunnable, QThreadPool, QSocketNotifier, pyqtSignal, QMarginsF, QRectF
 from docx import Document
 from docx.shared import Pt, RGBColor
 from docx.oxml.ns import qn
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from PyQt5.QtGui import QIcon, QPixmap, QFont, QRegExpValidator
+from PyQt5.QtGui import (
+    QIcon, QPixmap, QFont, QRegExpValidator, QPdfWriter, QPainter, QPageSize, QPageLayout, QColor, QPen)
 import logging
 import os
 import resources
@@ -21,6 +53,16 @@ import pyaudio
 import wave
 import speech_recognition as sr
 
+try:
+    import openpyxl  # Нужен только для импорта журналов из XLSX
+except ImportError:
+    openpyxl = None
+
+try:
+    import vosk  # Офлайн-распознавание речи, нужна также модель языка
+except ImportError:
+    vosk = None
+
 # Определяем путь к директории, где находится исполняемый файл (.exe) или скрипт (.py)
 if getattr(sys, 'frozen', False):  # Если запущен .exe файл
     current_dir = os.path.dirname(sys.executable)
@@ -36,6 +78,2531 @@ logging.basicConfig(
 
 logging.info("Приложение запущено.")
 
+
+class _CountingConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool, который считает количество созданных соединений."""
+
+    def __init__(self, *args, **kwargs):
+        self.created = 0
+        super().__init__(*args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self.created += 1
+        return conn
+
+
+class ConnectionPool:
+    """Пул соединений с PostgreSQL, общий для всех окон приложения.
+
+    Соединение выдается на одну операцию (`with pool.cursor() as cursor:`),
+    проверяется при выдаче и возвращается в пул с commit или rollback.
+    Если все соединения заняты, запрос ждет не дольше acquire_timeout секунд
+    и получает PoolError: окно покажет ошибку, а не зависнет за долгим
+    экспортом или импортом. Фоновые задачи передают timeout=math.inf.
+    """
+
+    def __init__(self, minconn=1, maxconn=5, health_check_interval=30, acquire_timeout=10, **dsn):
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval  # Секунды простоя, после которых соединение пингуется
+        self.acquire_timeout = acquire_timeout
+        self._pool = _CountingConnectionPool(minconn, maxconn, **dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)  # Ожидание свободного соединения вместо PoolError
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.in_use = 0
+        self.checkouts = 0
+        self.broken = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _is_healthy(self, conn):
+        """Проверяет соединение перед выдачей."""
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Незавершенная или прерванная транзакция от предыдущей операции
+            conn.rollback()
+        if monotonic() - self._last_used.get(id(conn), 0) > self.health_check_interval:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except (psycopg2.InterfaceError, psycopg2.OperationalError):
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        """Выдает проверенное соединение, ожидая освобождения не дольше timeout (по умолчанию acquire_timeout)."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = monotonic()
+        if math.isinf(timeout):
+            self._slots.acquire()
+        elif not self._slots.acquire(timeout=timeout):
+            logging.warning(f"Нет свободного соединения за {timeout} с, пул: {self.metrics()}")
+            raise psycopg2.pool.PoolError("Все соединения с базой данных заняты, повторите попытку позже.")
+        waited = monotonic() - started
+        try:
+            while True:
+                conn = self._pool.getconn()
+                try:
+                    healthy = self._is_healthy(conn)
+                except psycopg2.Error:
+                    healthy = False
+                if healthy:
+                    break
+                logging.warning("Соединение из пула неработоспособно, создается новое.")
+                with self._lock:
+                    self.broken += 1
+                self._pool.putconn(conn, close=True)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Возвращает соединение в пул."""
+        self._last_used[id(conn)] = monotonic()
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Выдает соединение на одну операцию: commit при успехе, rollback при ошибке."""
+        conn = self.getconn(timeout)
+        close = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            close = True  # Соединение могло оборваться, в пул его не возвращаем
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn, close=close)
+
+    @contextmanager
+    def cursor(self, timeout=None):
+        """Выдает курсор на отдельном соединении из пула."""
+        with self.connection(timeout) as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def metrics(self):
+        """Возвращает метрики пула: ожидание, занятые и созданные соединения."""
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "created": self._pool.created,
+                "checkouts": self.checkouts,
+                "broken": self.broken,
+                "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 2) if self.checkouts else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 2),
+            }
+
+    def closeall(self):
+        logging.info(f"Закрытие пула соединений, метрики: {self.metrics()}")
+        self._pool.closeall()
+
+
+class QuerySignals(QObject):
+    """Сигналы фоновой задачи, через которые результат передается в GUI-поток."""
+    finished = pyqtSignal(object, int, object)  # Канал, номер запроса, результат
+    failed = pyqtSignal(object, int, object)  # Канал, номер запроса, исключение
+
+
+class QueryTask(QRunnable):
+    """Выполняет work(cursor) на соединении из пула в потоке QThreadPool."""
+
+    def __init__(self, pool, channel, request_id, work):
+        super().__init__()
+        self.pool = pool
+        self.channel = channel
+        self.request_id = request_id
+        self.work = work
+        self.signals = QuerySignals()
+
+    def run(self):
+        try:
+            with self.pool.cursor(timeout=math.inf) as cursor:  # В фоне ждем соединение сколько нужно
+                result = self.work(cursor)
+        except Exception as e:
+            logging.error(f"Ошибка фонового запроса ({self.channel}): {e}")
+            self.signals.failed.emit(self.channel, self.request_id, e)
+        else:
+            self.signals.finished.emit(self.channel, self.request_id, result)
+
+
+class QueryExecutor(QObject):
+    """Выполняет запросы вне GUI-потока и возвращает результаты через сигналы.
+
+    Запросы одного канала (например, "journal") вытесняют друг друга: обработчик
+    вызывается только для последнего отправленного запроса, результаты более
+    ранних отбрасываются. Запросы с каналом None (записи) никогда не устаревают.
+    """
+    loading_changed = pyqtSignal(str, bool)  # Канал, идет ли загрузка
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.thread_pool = QThreadPool(self)
+        # Одно соединение пула остается за короткими запросами GUI-потока
+        self.thread_pool.setMaxThreadCount(max(1, pool.maxconn - 1))
+        self._request_ids = itertools.count(1)
+        self._latest = {}  # Канал -> номер последнего запроса
+        self._pending = {}  # Номер запроса -> (сигналы, on_result, on_error)
+        self.stale_dropped = 0
+
+    def submit(self, channel, work, on_result=None, on_error=None):
+        """Ставит work(cursor) в очередь пула потоков и возвращает номер запроса."""
+        request_id = next(self._request_ids)
+        task = QueryTask(self.pool, channel, request_id, work)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        # Держим ссылку на сигналы, пока результат не будет доставлен
+        self._pending[request_id] = (task.signals, on_result, on_error)
+        if channel is not None:
+            self._latest[channel] = request_id
+            self.loading_changed.emit(channel, True)
+        self.thread_pool.start(task)
+        return request_id
+
+    def is_loading(self, channel):
+        return channel in self._latest
+
+    def _take(self, channel, request_id):
+        """Возвращает обработчики запроса или None, если его результат устарел."""
+        _, on_result, on_error = self._pending.pop(request_id)
+        if channel is None:
+            return on_result, on_error
+        if self._latest.get(channel) != request_id:
+            self.stale_dropped += 1
+            logging.info(f"Отброшен устаревший результат запроса {request_id} ({channel}).")
+            return None
+        del self._latest[channel]
+        self.loading_changed.emit(channel, False)
+        return on_result, on_error
+
+    def _on_finished(self, channel, request_id, result):
+        handlers = self._take(channel, request_id)
+        if handlers and handlers[0]:
+            handlers[0](result)
+
+    def _on_failed(self, channel, request_id, error):
+        handlers = self._take(channel, request_id)
+        if handlers and handlers[1]:
+            handlers[1](error)
+
+
+SHIFT_CHANGE_TIME = "08:30"  # Пересменка: записи второй смены до этого времени сделаны на следующие сутки
+CHANGES_CHANNEL = "journal_changes"  # Канал LISTEN/NOTIFY для синхронизации рабочих мест
+
+# Версионированные миграции схемы: (версия, описание, SQL-операторы).
+# Новые миграции только добавляются в конец списка, уже примененные не изменяются.
+SCHEMA_MIGRATIONS = [
+    (1, "Базовые таблицы журнала", [
+        '''
+        CREATE TABLE IF NOT EXISTS journal (
+            id SERIAL PRIMARY KEY,
+            date DATE,
+            shift VARCHAR(50),
+            time TIME,
+            content TEXT,
+            note TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS engineers (
+            id SERIAL PRIMARY KEY,
+            shift VARCHAR(50),
+            date DATE,
+            name VARCHAR(255)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS engineers_info (
+            id SERIAL PRIMARY KEY,
+            full_name VARCHAR(255) NOT NULL,
+            tab_number VARCHAR(50) NOT NULL
+        )
+        ''',
+    ]),
+    (2, "Индексы для выборок по дате и смене, уникальный табельный номер", [
+        "CREATE INDEX IF NOT EXISTS journal_date_shift_time_idx ON journal (date, shift, time)",
+        "CREATE INDEX IF NOT EXISTS engineers_date_shift_idx ON engineers (date, shift)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS engineers_info_tab_number_key ON engineers_info (tab_number)",
+    ]),
+    (3, "Индекс для постраничного просмотра журнала по ключу (date, time, id)", [
+        "CREATE INDEX IF NOT EXISTS journal_date_time_id_idx ON journal (date, time, id)",
+    ]),
+    (4, "Триграммные GIN-индексы для поиска подстроки в содержании и примечании", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS journal_content_trgm_idx ON journal USING gin (content gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS journal_note_trgm_idx ON journal USING gin (note gin_trgm_ops)",
+    ]),
+    (5, "Полнотекстовый поиск: хранимый tsvector (russian) и GIN-индекс", [
+        '''
+        ALTER TABLE journal ADD COLUMN IF NOT EXISTS search_tsv tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(content, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(note, '')), 'B')
+        ) STORED
+        ''',
+        "CREATE INDEX IF NOT EXISTS journal_search_tsv_idx ON journal USING gin (search_tsv)",
+    ]),
+    (6, "Момент события event_ts: записи второй смены после полуночи относятся к следующим суткам", [
+        f'''
+        ALTER TABLE journal ADD COLUMN IF NOT EXISTS event_ts timestamp
+        GENERATED ALWAYS AS (
+            date + time + CASE
+                WHEN shift = '2-я смена' AND time < '{SHIFT_CHANGE_TIME}' THEN INTERVAL '1 day'
+                ELSE INTERVAL '0'
+            END
+        ) STORED
+        ''',
+        "CREATE INDEX IF NOT EXISTS journal_date_shift_event_ts_idx ON journal (date, shift, event_ts, id)",
+        "CREATE INDEX IF NOT EXISTS journal_event_ts_id_idx ON journal (event_ts, id)",
+        # Индексы по time заменены индексами по event_ts
+        "DROP INDEX IF EXISTS journal_date_shift_time_idx",
+        "DROP INDEX IF EXISTS journal_date_time_id_idx",
+    ]),
+    (7, "Уведомления об изменениях journal и engineers через pg_notify", [
+        # Полезная нагрузка компактная (лимит pg_notify 8000 байт): текст записи клиент читает по id
+        f'''
+        CREATE OR REPLACE FUNCTION notify_journal_change() RETURNS trigger AS $$
+        DECLARE
+            rec journal;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN rec := OLD; ELSE rec := NEW; END IF;
+            PERFORM pg_notify('{CHANGES_CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME, 'op', TG_OP, 'id', rec.id, 'date', rec.date, 'shift', rec.shift
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        f'''
+        CREATE OR REPLACE FUNCTION notify_engineers_change() RETURNS trigger AS $$
+        DECLARE
+            rec engineers;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN rec := OLD; ELSE rec := NEW; END IF;
+            PERFORM pg_notify('{CHANGES_CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME, 'op', TG_OP, 'id', rec.id, 'date', rec.date, 'shift', rec.shift,
+                'name', rec.name
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS journal_notify ON journal",
+        '''
+        CREATE TRIGGER journal_notify AFTER INSERT OR UPDATE OR DELETE ON journal
+        FOR EACH ROW EXECUTE FUNCTION notify_journal_change()
+        ''',
+        "DROP TRIGGER IF EXISTS engineers_notify ON engineers",
+        '''
+        CREATE TRIGGER engineers_notify AFTER INSERT OR UPDATE OR DELETE ON engineers
+        FOR EACH ROW EXECUTE FUNCTION notify_engineers_change()
+        ''',
+    ]),
+    (8, "Счетчик изменений справочника инженеров для сброса кэша", [
+        '''
+        CREATE TABLE IF NOT EXISTS change_counters (
+            table_name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT INTO change_counters (table_name) VALUES ('engineers_info') ON CONFLICT DO NOTHING",
+        f'''
+        CREATE OR REPLACE FUNCTION bump_change_counter() RETURNS trigger AS $$
+        BEGIN
+            UPDATE change_counters SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+            PERFORM pg_notify('{CHANGES_CHANNEL}', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS engineers_info_changes ON engineers_info",
+        '''
+        CREATE TRIGGER engineers_info_changes
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON engineers_info
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_change_counter()
+        ''',
+    ]),
+    (9, "Клиентский идентификатор записи для идемпотентной отправки из локальной очереди", [
+        "ALTER TABLE journal ADD COLUMN IF NOT EXISTS client_uuid uuid NOT NULL DEFAULT gen_random_uuid()",
+        "CREATE UNIQUE INDEX IF NOT EXISTS journal_client_uuid_key ON journal (client_uuid)",
+    ]),
+    (10, "Метки изменения строк и журнал удалений для инкрементальной синхронизации локальной реплики", [
+        "ALTER TABLE journal ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+        "ALTER TABLE engineers ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS journal_updated_at_idx ON journal (updated_at)",
+        "CREATE INDEX IF NOT EXISTS engineers_updated_at_idx ON engineers (updated_at)",
+        '''
+        CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS journal_touch ON journal",
+        '''
+        CREATE TRIGGER journal_touch BEFORE UPDATE ON journal
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+        ''',
+        "DROP TRIGGER IF EXISTS engineers_touch ON engineers",
+        '''
+        CREATE TRIGGER engineers_touch BEFORE UPDATE ON engineers
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS deleted_rows (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            deleted_at timestamptz NOT NULL DEFAULT now()
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS deleted_rows_deleted_at_idx ON deleted_rows (deleted_at)",
+        '''
+        CREATE OR REPLACE FUNCTION record_deleted_row() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO deleted_rows (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS journal_tombstone ON journal",
+        '''
+        CREATE TRIGGER journal_tombstone AFTER DELETE ON journal
+        FOR EACH ROW EXECUTE FUNCTION record_deleted_row()
+        ''',
+        "DROP TRIGGER IF EXISTS engineers_tombstone ON engineers",
+        '''
+        CREATE TRIGGER engineers_tombstone AFTER DELETE ON engineers
+        FOR EACH ROW EXECUTE FUNCTION record_deleted_row()
+        ''',
+    ]),
+    (11, "Подавление построчных уведомлений при массовом импорте", [
+        # Импорт выставляет SET LOCAL shift_journal.bulk_import = 'on' и в конце шлет одно итоговое уведомление
+        f'''
+        CREATE OR REPLACE FUNCTION notify_journal_change() RETURNS trigger AS $$
+        DECLARE
+            rec journal;
+        BEGIN
+            IF current_setting('shift_journal.bulk_import', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN rec := OLD; ELSE rec := NEW; END IF;
+            PERFORM pg_notify('{CHANGES_CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME, 'op', TG_OP, 'id', rec.id, 'date', rec.date, 'shift', rec.shift
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        f'''
+        CREATE OR REPLACE FUNCTION notify_engineers_change() RETURNS trigger AS $$
+        DECLARE
+            rec engineers;
+        BEGIN
+            IF current_setting('shift_journal.bulk_import', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN rec := OLD; ELSE rec := NEW; END IF;
+            PERFORM pg_notify('{CHANGES_CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME, 'op', TG_OP, 'id', rec.id, 'date', rec.date, 'shift', rec.shift,
+                'name', rec.name
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+    ]),
+    (12, "Отметки об автоматически отправленных сводках смен", [
+        # Строку вставляет рабочее место, взявшее смену в работу: остальные ее пропускают
+        '''
+        CREATE TABLE IF NOT EXISTS shift_reports (
+            date DATE NOT NULL,
+            shift VARCHAR(50) NOT NULL,
+            claimed_by TEXT,
+            entries INTEGER,
+            queued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (date, shift)
+        )
+        ''',
+    ]),
+    (13, "Постановка сводки в очередь после фиксации отметки, отметка уже закончившихся смен", [
+        # queued_at пуст, пока взявшее смену рабочее место не поставило письмо в очередь
+        "ALTER TABLE shift_reports ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+        "ALTER TABLE shift_reports ALTER COLUMN queued_at DROP NOT NULL, ALTER COLUMN queued_at DROP DEFAULT",
+        "ALTER TABLE shift_reports ADD COLUMN IF NOT EXISTS skipped BOOLEAN NOT NULL DEFAULT false",
+        # Смены, закончившиеся до установки, не отправляются задним числом
+        '''
+        INSERT INTO shift_reports (date, shift, claimed_by, queued_at, skipped)
+        SELECT day::date, s.shift, 'migration 13', NULL, true
+        FROM generate_series(current_date - 2, current_date, interval '1 day') day
+        CROSS JOIN (VALUES ('1-я смена', time '20:30', 0), ('2-я смена', time '08:30', 1)) s(shift, ends, days)
+        WHERE day::date + s.days + s.ends <= localtimestamp
+        ON CONFLICT (date, shift) DO NOTHING
+        ''',
+    ]),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+SCHEMA_LOCK_ID = 7301  # Ключ advisory-блокировки на время миграции
+
+
+def get_schema_version(cursor):
+    """Возвращает номер примененной версии схемы (0, если миграций еще не было)."""
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT coalesce(max(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(cursor):
+    """Применяет недостающие миграции и возвращает их количество.
+
+    Если схема актуальна, выполняется только чтение номера версии. Миграции
+    выполняются в транзакции курсора под advisory-блокировкой, поэтому
+    одновременный вход с нескольких рабочих мест не применит их дважды.
+    """
+    if get_schema_version(cursor) >= SCHEMA_VERSION:
+        return 0
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    ''')
+    current_version = get_schema_version(cursor)  # Могла измениться, пока ждали блокировку
+
+    applied = 0
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        logging.info(f"Применение миграции схемы {version}: {description}")
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        applied += 1
+    return applied
+
+
+# Колонки записи журнала в порядке, в котором их ожидает таблица MainWindow
+JOURNAL_RECORD_COLUMNS = ("id", "date", "shift", "time", "content", "note", "event_ts", "client_uuid")
+JOURNAL_RECORD_SELECT = ", ".join(JOURNAL_RECORD_COLUMNS)
+
+
+def event_timestamp(date, shift, time):
+    """Момент события записи по тем же правилам, что и колонка event_ts (None, если время не разобрано)."""
+    try:
+        moment = datetime.datetime.combine(
+            datetime.date.fromisoformat(str(date)), datetime.time.fromisoformat(str(time))
+        )
+    except ValueError:
+        return None  # Некорректное время проверит сервер при отправке
+    if shift == "2-я смена" and moment.time() < datetime.time.fromisoformat(SHIFT_CHANGE_TIME):
+        moment += datetime.timedelta(days=1)
+    return moment
+
+
+def open_sqlite(path):
+    """Открывает локальную базу SQLite в режиме WAL с синхронной записью на диск."""
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=FULL")
+    return db
+
+
+class OfflineWriteQueue:
+    """Локальная очередь операций с журналом (SQLite в режиме WAL).
+
+    Добавление, изменение и удаление записей сначала фиксируются на диске и
+    только затем отправляются в PostgreSQL пачками через execute_values,
+    поэтому при обрыве связи с сервером запись инженера не теряется.
+    Операции адресуют записи по client_uuid, так что повторная отправка
+    после сбоя между commit в PostgreSQL и очисткой очереди безопасна.
+    """
+
+    FIELD_TYPES = {"time": "time", "content": "text", "note": "text"}
+
+    def __init__(self, path):
+        self.path = path
+        self._flush_lock = threading.Lock()
+        with closing(open_sqlite(self.path)) as db, db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS pending_writes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL,
+                    client_uuid TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS rejected_writes (
+                    seq INTEGER PRIMARY KEY,
+                    op TEXT NOT NULL,
+                    client_uuid TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    rejected_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def enqueue(self, op, client_uuid, payload):
+        """Сохраняет операцию ("insert", "update" или "delete") и возвращает ее номер."""
+        with closing(open_sqlite(self.path)) as db, db:
+            cursor = db.execute(
+                "INSERT INTO pending_writes (op, client_uuid, payload) VALUES (?, ?, ?)",
+                (op, client_uuid, json.dumps(payload, ensure_ascii=False))
+            )
+            return cursor.lastrowid
+
+    def pending(self, limit=None):
+        """Возвращает неотправленные операции в порядке поступления: (seq, op, client_uuid, payload)."""
+        query = "SELECT seq, op, client_uuid, payload FROM pending_writes ORDER BY seq"
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with closing(open_sqlite(self.path)) as db:
+            return [(seq, op, client_uuid, json.loads(payload)) for seq, op, client_uuid, payload in db.execute(query, params)]
+
+    def count(self):
+        with closing(open_sqlite(self.path)) as db:
+            return db.execute("SELECT count(*) FROM pending_writes").fetchone()[0]
+
+    def flush(self, cursor, batch_size=500):
+        """Отправляет пачку операций в PostgreSQL; выполняется в потоке пула запросов.
+
+        Подряд идущие операции одного вида отправляются одним execute_values.
+        Если пачка отклонена сервером (например, некорректное время), операции
+        повторяются по одной, а отклоненные переносятся в rejected_writes,
+        чтобы не блокировать очередь. Возвращает словарь с измененными
+        записями, отклоненными операциями и числом конфликтов.
+        """
+        result = {"upserted": [], "rejected": [], "conflicts": 0}
+        with self._flush_lock:
+            writes = self.pending(batch_size)
+            if not writes:
+                return result
+
+            rejected = []
+            for (op, field), group in itertools.groupby(writes, key=lambda write: (write[1], write[3].get("field"))):
+                group = list(group)
+                try:
+                    records, conflicts = self._apply_group(cursor, op, field, group)
+                except (psycopg2.DataError, psycopg2.IntegrityError):
+                    records, conflicts = [], 0
+                    for write in group:
+                        try:
+                            write_records, write_conflicts = self._apply_group(cursor, op, field, [write])
+                        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                            logging.error(f"Операция {op} записи {write[2]} отклонена сервером: {e}")
+                            rejected.append((write, str(e).strip()))
+                            continue
+                        records.extend(write_records)
+                        conflicts += write_conflicts
+                result["upserted"].extend(records)
+                result["conflicts"] += conflicts
+
+            cursor.connection.commit()
+
+            # Очередь очищается только после фиксации транзакции в PostgreSQL
+            with closing(open_sqlite(self.path)) as db, db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO rejected_writes (seq, op, client_uuid, payload, reason) VALUES (?, ?, ?, ?, ?)",
+                    [(seq, op, client_uuid, json.dumps(payload, ensure_ascii=False), reason)
+                     for (seq, op, client_uuid, payload), reason in rejected]
+                )
+                db.executemany("DELETE FROM pending_writes WHERE seq = ?", [(write[0],) for write in writes])
+
+        result["rejected"] = [(write[1], write[2]) for write, _ in rejected]
+        if result["conflicts"]:
+            logging.warning(f"Операций без целевой записи на сервере (удалена другим пользователем): {result['conflicts']}")
+        logging.info(f"Отправлено операций из локальной очереди: {len(writes)}, отклонено: {len(rejected)}")
+        return result
+
+    def _apply_group(self, cursor, op, field, group):
+        """Отправляет операции одного вида под точкой сохранения; возвращает (записи, конфликты)."""
+        cursor.execute("SAVEPOINT flush_group")
+        try:
+            if op == "insert":
+                records = psycopg2.extras.execute_values(
+                    cursor,
+                    f'''
+                    INSERT INTO journal (client_uuid, date, shift, time, content, note) VALUES %s
+                    ON CONFLICT (client_uuid) DO UPDATE SET client_uuid = EXCLUDED.client_uuid
+                    RETURNING {JOURNAL_RECORD_SELECT}
+                    ''',
+                    [(client_uuid, p["date"], p["shift"], p["time"], p["content"], p["note"])
+                     for _, _, client_uuid, p in group],
+                    template="(%s::uuid, %s, %s, %s, %s, %s)",
+                    fetch=True
+                )
+                conflicts = 0
+            elif op == "update":
+                # Несколько правок одного поля записи в пачке: применяется последняя
+                values = {client_uuid: p["value"] for _, _, client_uuid, p in group}
+                records = psycopg2.extras.execute_values(
+                    cursor,
+                    f'''
+                    UPDATE journal SET {field} = v.value::{self.FIELD_TYPES[field]}
+                    FROM (VALUES %s) AS v(client_uuid, value)
+                    WHERE journal.client_uuid = v.client_uuid::uuid
+                    RETURNING {", ".join("journal." + column for column in JOURNAL_RECORD_COLUMNS)}
+                    ''',
+                    list(values.items()),
+                    fetch=True
+                )
+                conflicts = len(values) - len(records)
+            else:
+                deleted = psycopg2.extras.execute_values(
+                    cursor,
+                    '''
+                    DELETE FROM journal USING (VALUES %s) AS v(client_uuid)
+                    WHERE journal.client_uuid = v.client_uuid::uuid
+                    RETURNING journal.id
+                    ''',
+                    [(client_uuid,) for _, _, client_uuid, _ in group],
+                    fetch=True
+                )
+                records = []
+                conflicts = len(group) - len(deleted)
+        except psycopg2.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT flush_group")
+            raise
+        cursor.execute("RELEASE SAVEPOINT flush_group")
+        return records, conflicts
+
+
+class LocalMirror:
+    """Локальная реплика последних смен в SQLite: журнал, инженеры смен и справочник.
+
+    Позволяет показать смену сразу при запуске и при недоступном сервере.
+    Синхронизация инкрементальная: с сервера читаются только строки с
+    updated_at новее отметки прошлой синхронизации (с запасом на транзакции,
+    зафиксированные позже своего now()) и удаления из deleted_rows.
+    Справочник engineers_info перечитывается целиком при сдвиге счетчика
+    change_counters.
+    """
+
+    KEEP_DAYS = 31  # Сколько дней журнала хранится локально
+    SYNC_OVERLAP = datetime.timedelta(minutes=5)
+    TOMBSTONE_RETENTION = datetime.timedelta(days=30)  # Срок хранения deleted_rows на сервере
+
+    def __init__(self, path):
+        self.path = path
+        self._sync_lock = threading.Lock()
+        with closing(open_sqlite(self.path)) as db, db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    shift TEXT NOT NULL,
+                    time TEXT,
+                    content TEXT,
+                    note TEXT,
+                    event_ts TEXT,
+                    client_uuid TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            db.execute("CREATE INDEX IF NOT EXISTS journal_date_shift_idx ON journal (date, shift, event_ts, id)")
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS engineers (
+                    id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    shift TEXT NOT NULL,
+                    name TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            db.execute("CREATE INDEX IF NOT EXISTS engineers_date_shift_idx ON engineers (date, shift)")
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS engineers_info (
+                    id INTEGER PRIMARY KEY,
+                    full_name TEXT NOT NULL,
+                    tab_number TEXT NOT NULL
+                )
+            ''')
+            db.execute("CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)")
+
+    def load_shift(self, date, shift):
+        """Возвращает (записи журнала, инженеры смены, справочник) из реплики или None, если она еще пуста."""
+        with closing(open_sqlite(self.path)) as db:
+            if not db.execute("SELECT 1 FROM sync_state WHERE name = 'hwm'").fetchone():
+                return None
+            records = [
+                (record_id, record_date, record_shift, record_time, content, note,
+                 datetime.datetime.fromisoformat(event_ts) if event_ts else None, client_uuid)
+                for record_id, record_date, record_shift, record_time, content, note, event_ts, client_uuid
+                in db.execute(
+                    "SELECT id, date, shift, time, content, note, event_ts, client_uuid FROM journal "
+                    "WHERE date = ? AND shift = ? ORDER BY event_ts, id",
+                    (date, shift)
+                )
+            ]
+            engineers = db.execute(
+                "SELECT name FROM engineers WHERE date = ? AND shift = ? ORDER BY id", (date, shift)
+            ).fetchall()
+            directory = db.execute("SELECT full_name, tab_number FROM engineers_info ORDER BY id").fetchall()
+        return records, engineers, directory
+
+    def sync(self, cursor):
+        """Догоняет реплику по серверу; выполняется в потоке пула запросов. Возвращает число изменений."""
+        with self._sync_lock:
+            with closing(open_sqlite(self.path)) as db:
+                state = dict(db.execute("SELECT name, value FROM sync_state"))
+
+            cursor.execute("SELECT now(), current_date")
+            server_now, today = cursor.fetchone()
+            window_start = today - datetime.timedelta(days=self.KEEP_DAYS)
+
+            # Отметка старше срока хранения удалений: часть удалений уже не узнать, копируем окно заново
+            hwm = datetime.datetime.fromisoformat(state["hwm"]) if "hwm" in state else None
+            full = hwm is None or hwm < server_now - self.TOMBSTONE_RETENTION
+            since = "-infinity" if full else hwm - self.SYNC_OVERLAP
+
+            cursor.execute(
+                "SELECT id, date, shift, time, content, note, event_ts, client_uuid, updated_at FROM journal "
+                "WHERE date >= %s AND updated_at > %s",
+                (window_start, since)
+            )
+            journal_rows = [
+                (record_id, record_date.isoformat(), record_shift, record_time.isoformat() if record_time else None,
+                 content, note, event_ts.isoformat() if event_ts else None, str(client_uuid), updated_at.isoformat())
+                for record_id, record_date, record_shift, record_time, content, note, event_ts, client_uuid, updated_at
+                in cursor.fetchall()
+            ]
+            cursor.execute(
+                "SELECT id, date, shift, name, updated_at FROM engineers WHERE date >= %s AND updated_at > %s",
+                (window_start, since)
+            )
+            engineers_rows = [
+                (row_id, row_date.isoformat(), row_shift, name, updated_at.isoformat())
+                for row_id, row_date, row_shift, name, updated_at in cursor.fetchall()
+            ]
+
+            deleted = []
+            if not full:
+                cursor.execute("SELECT table_name, row_id FROM deleted_rows WHERE deleted_at > %s", (since,))
+                deleted = cursor.fetchall()
+            cursor.execute("DELETE FROM deleted_rows WHERE deleted_at < now() - %s", (self.TOMBSTONE_RETENTION,))
+
+            # Справочник небольшой и меняется редко: при сдвиге счетчика копируется целиком
+            cursor.execute("SELECT version FROM change_counters WHERE table_name = 'engineers_info'")
+            row = cursor.fetchone()
+            directory_version = str(row[0]) if row else None
+            directory = None
+            if full or directory_version is None or directory_version != state.get("directory_version"):
+                cursor.execute("SELECT id, full_name, tab_number FROM engineers_info")
+                directory = cursor.fetchall()
+
+            with closing(open_sqlite(self.path)) as db, db:
+                if full:
+                    db.execute("DELETE FROM journal")
+                    db.execute("DELETE FROM engineers")
+                db.executemany("INSERT OR REPLACE INTO journal VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", journal_rows)
+                db.executemany("INSERT OR REPLACE INTO engineers VALUES (?, ?, ?, ?, ?)", engineers_rows)
+                for table_name, row_id in deleted:
+                    if table_name in ("journal", "engineers"):
+                        db.execute(f"DELETE FROM {table_name} WHERE id = ?", (row_id,))
+                if directory is not None:
+                    db.execute("DELETE FROM engineers_info")
+                    db.executemany("INSERT INTO engineers_info VALUES (?, ?, ?)", directory)
+                # Смены, вышедшие из окна хранения
+                db.execute("DELETE FROM journal WHERE date < ?", (window_start.isoformat(),))
+                db.execute("DELETE FROM engineers WHERE date < ?", (window_start.isoformat(),))
+                db.executemany(
+                    "INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+                    [("hwm", server_now.isoformat()), ("directory_version", directory_version)]
+                )
+
+        changes = len(journal_rows) + len(engineers_rows) + len(deleted)
+        logging.info(
+            f"Локальная реплика синхронизирована ({'полностью' if full else 'инкрементально'}): "
+            f"изменений {changes}, справочник {'обновлен' if directory is not None else 'без изменений'}."
+        )
+        return changes
+
+
+class EngineerDirectory:
+    """Кэш справочника инженеров (engineers_info) в памяти процесса.
+
+    Справочник перечитывается, только если кэш сброшен через invalidate()
+    или на сервере сдвинулся счетчик изменений change_counters. Проверка
+    счетчика - чтение одной строки по первичному ключу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # get() вызывается из потоков пула запросов
+        self._engineers = None
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cursor):
+        """Возвращает список (full_name, tab_number) из кэша или из базы данных."""
+        cursor.execute("SELECT version FROM change_counters WHERE table_name = 'engineers_info'")
+        row = cursor.fetchone()
+        version = row[0] if row else None
+        with self._lock:
+            if self._engineers is not None and version is not None and version == self._version:
+                self.hits += 1
+                return self._engineers
+
+        cursor.execute("SELECT full_name, tab_number FROM engineers_info ORDER BY id")
+        engineers = cursor.fetchall()
+        with self._lock:
+            self._engineers = engineers
+            self._version = version
+            self.misses += 1
+        return engineers
+
+    def invalidate(self):
+        """Сбрасывает кэш после изменения справочника."""
+        with self._lock:
+            self._engineers = None
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "version": self._version}
+
+
+class ListenerConnectTask(QRunnable):
+    """Открывает соединение подписки LISTEN в потоке QThreadPool.
+
+    Подключение к недоступному серверу может длиться до таймаута TCP, поэтому
+    не выполняется в GUI-потоке. Результат передается сигналами QuerySignals
+    с каналом CHANGES_CHANNEL и номером попытки.
+    """
+
+    def __init__(self, dsn, attempt):
+        super().__init__()
+        self.dsn = dsn
+        self.attempt = attempt
+        self.signals = QuerySignals()
+
+    def run(self):
+        connection = None
+        try:
+            connection = psycopg2.connect(**self.dsn)
+            connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANGES_CHANNEL}")
+        except psycopg2.Error as e:
+            if connection is not None:
+                connection.close()
+            self.signals.failed.emit(CHANGES_CHANNEL, self.attempt, e)
+        else:
+            self.signals.finished.emit(CHANGES_CHANNEL, self.attempt, connection)
+
+
+class ChangeListener(QObject):
+    """Принимает уведомления об изменениях журнала (LISTEN/NOTIFY).
+
+    Использует отдельное соединение вне пула: подписка LISTEN живет в сессии.
+    Соединение открывается в потоке thread_pool, а его сокет отслеживается
+    QSocketNotifier в GUI-потоке, поэтому ни опроса по таймеру, ни отдельного
+    потока для приема уведомлений не требуется. При обрыве соединение
+    восстанавливается, после чего испускается reconnected, чтобы получатель
+    перечитал данные, изменения которых мог пропустить.
+    """
+    changed = pyqtSignal(dict)
+    reconnected = pyqtSignal()
+
+    RECONNECT_INTERVAL = 10000  # мс
+
+    def __init__(self, dsn, thread_pool, parent=None):
+        super().__init__(parent)
+        self.dsn = dsn
+        self.thread_pool = thread_pool
+        self.connection = None
+        self.notifier = None
+        self.closed = False
+        self.attempt = 0  # Номер последней попытки подключения; результаты прежних отбрасываются
+        self.reconnecting = False
+        self.task_signals = None  # Держим сигналы задачи, пока результат не доставлен
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.setInterval(self.RECONNECT_INTERVAL)
+        self.reconnect_timer.timeout.connect(self.reconnect)
+        self.connect_listener()
+
+    def connect_listener(self, reconnecting=False):
+        """Запускает подключение в фоне; результат придет в on_connected или on_connect_failed."""
+        self.attempt += 1
+        self.reconnecting = reconnecting
+        task = ListenerConnectTask(self.dsn, self.attempt)
+        task.signals.finished.connect(self.on_connected)
+        task.signals.failed.connect(self.on_connect_failed)
+        self.task_signals = task.signals
+        self.thread_pool.start(task)
+
+    def on_connected(self, channel, attempt, connection):
+        if self.closed or attempt != self.attempt:
+            connection.close()  # Подписка уже не нужна
+            return
+        self.task_signals = None
+        self.connection = connection
+        self.notifier = QSocketNotifier(self.connection.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.read_notifications)
+        logging.info("Подписка на изменения журнала установлена.")
+        if self.reconnecting:
+            self.reconnected.emit()
+
+    def on_connect_failed(self, channel, attempt, error):
+        if self.closed or attempt != self.attempt:
+            return
+        self.task_signals = None
+        logging.error(f"Не удалось подписаться на изменения журнала: {error}")
+        self.reconnect_timer.start()
+
+    def reconnect(self):
+        self.connect_listener(reconnecting=True)
+
+    def read_notifications(self):
+        try:
+            self.connection.poll()
+        except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+            logging.error(f"Соединение подписки на изменения разорвано: {e}")
+            self.close_connection()
+            self.reconnect_timer.start()
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                logging.warning(f"Некорректное уведомление об изменении: {notify.payload}")
+                continue
+            self.changed.emit(payload)
+
+    def close_connection(self):
+        if self.notifier:
+            self.notifier.setEnabled(False)
+            self.notifier.deleteLater()
+            self.notifier = None
+        if self.connection and not self.connection.closed:
+            self.connection.close()
+        self.connection = None
+
+    def close(self):
+        """Закрывает подписку и отменяет запланированное переподключение."""
+        self.closed = True
+        self.reconnect_timer.stop()
+        self.close_connection()
+
+
+# Колонки таблиц, которые можно загрузить импортом, и допустимые заголовки файла
+IMPORT_COLUMNS = {
+    "journal": ("date", "shift", "time", "content", "note"),
+    "engineers": ("date", "shift", "name"),
+}
+IMPORT_HEADER_ALIASES = {
+    "дата": "date", "смена": "shift", "время": "time", "содержание": "content",
+    "примечание": "note", "инженер": "name", "фио": "name",
+}
+IMPORT_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y")
+IMPORT_SHIFT_ALIASES = {
+    "1": "1-я смена", "1-я": "1-я смена", "первая": "1-я смена", "дневная": "1-я смена", "день": "1-я смена",
+    "2": "2-я смена", "2-я": "2-я смена", "вторая": "2-я смена", "ночная": "2-я смена", "ночь": "2-я смена",
+}
+
+
+def normalize_import_date(value):
+    """Приводит дату из файла импорта к виду YYYY-MM-DD."""
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    text = str(value or "").strip()
+    for date_format in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"некорректная дата '{text}'")
+
+
+def normalize_import_shift(value):
+    """Приводит обозначение смены ("2", "вторая", "2-я смена") к виду, принятому в журнале."""
+    text = " ".join(str(value or "").lower().split())
+    if text.endswith(" смена"):
+        text = text[:-len(" смена")]
+    if isinstance(value, float) and value.is_integer():
+        text = str(int(value))  # Номер смены из ячейки Excel
+    if text not in IMPORT_SHIFT_ALIASES:
+        raise ValueError(f"неизвестная смена '{value}'")
+    return IMPORT_SHIFT_ALIASES[text]
+
+
+def normalize_import_time(value):
+    """Приводит время из файла импорта ("8:30", "08.30", "0830") к виду HH:MM."""
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        return value.strftime("%H:%M")
+    text = str(value or "").strip().replace(".", ":")
+    if text.isdigit() and len(text) in (3, 4):
+        text = f"{text[:-2]}:{text[-2:]}"
+    parts = text.split(":")
+    if len(parts) in (2, 3) and all(part.isdigit() for part in parts):
+        hours, minutes = int(parts[0]), int(parts[1])
+        if hours < 24 and minutes < 60:
+            return f"{hours:02d}:{minutes:02d}"
+    raise ValueError(f"некорректное время '{text}'")
+
+
+def read_import_rows(path, encoding="utf-8-sig"):
+    """Построчно читает CSV или XLSX; первая строка - заголовок. Возвращает генератор списков значений."""
+    if path.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise RuntimeError("Для импорта из XLSX установите пакет openpyxl")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for values in workbook.active.iter_rows(values_only=True):
+                yield list(values)
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline="", encoding=encoding) as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(file, dialect)
+
+
+def copy_text(value):
+    """Экранирует значение для текстового формата COPY."""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class BulkImporter:
+    """Массовая загрузка журналов смен и составов смен из CSV/XLSX через COPY FROM STDIN.
+
+    Файл читается потоково, строки проверяются и нормализуются (дата, смена,
+    время) и загружаются порциями по chunk_size, каждая в своей транзакции.
+    Построчные уведомления LISTEN/NOTIFY на время импорта подавляются, в конце
+    отправляется одно итоговое. Отклоненные строки вместе с причиной пишутся
+    в CSV-файл рядом с исходным.
+    """
+
+    def __init__(self, table, chunk_size=5000, progress=None, cancelled=None):
+        if table not in IMPORT_COLUMNS:
+            raise ValueError(f"Импорт в таблицу {table} не поддерживается")
+        self.table = table
+        self.columns = IMPORT_COLUMNS[table]
+        self.chunk_size = chunk_size
+        self.progress = progress  # progress(загружено, отклонено, строк в секунду)
+        self.cancelled = cancelled  # cancelled() -> True, если импорт нужно прервать
+        self.loaded = 0
+        self.rejected = 0
+        self.rejected_path = None
+        self.header = []
+        self._rejected_file = None
+        self._rejected_writer = None
+
+    def normalize(self, record):
+        """Проверяет и нормализует строку файла (словарь колонка -> значение)."""
+        row = [normalize_import_date(record.get("date")), normalize_import_shift(record.get("shift"))]
+        if self.table == "journal":
+            row.append(normalize_import_time(record.get("time")))
+            row.extend(str(record.get(column) or "").strip() for column in ("content", "note"))
+        else:
+            name = " ".join(str(record.get("name") or "").split())
+            if not name or len(name) > 255:
+                raise ValueError("пустое или слишком длинное имя инженера")
+            row.append(name)
+        return row
+
+    def run(self, cursor, path, rejected_path=None, encoding="utf-8-sig"):
+        """Загружает файл; возвращает статистику импорта."""
+        self.rejected_path = rejected_path or os.path.splitext(path)[0] + ".rejected.csv"
+        started = monotonic()
+        cancelled = False
+        rows = read_import_rows(path, encoding)
+        try:
+            # Заголовок читается внутри try: при ошибке в нем файл тоже закрывается
+            self.header = next(rows, None) or []
+            columns = [IMPORT_HEADER_ALIASES.get(str(name or "").strip().lower(), str(name or "").strip().lower())
+                       for name in self.header]
+            missing = [column for column in self.columns if column not in columns and column != "note"]
+            if missing:
+                raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+
+            chunk = []
+            for line_number, values in enumerate(rows, start=2):
+                if not any(value not in (None, "") for value in values):
+                    continue  # Пустые строки в выгрузках Excel
+                try:
+                    chunk.append(self.normalize(dict(zip(columns, values))))
+                except ValueError as e:
+                    self.reject(line_number, str(e), values)
+                    continue
+
+                if len(chunk) >= self.chunk_size:
+                    self.load_chunk(cursor, chunk)
+                    chunk = []
+                    self.report(started)
+                    if self.cancelled and self.cancelled():
+                        cancelled = True
+                        break
+            if chunk and not cancelled:
+                self.load_chunk(cursor, chunk)
+                self.report(started)
+        finally:
+            rows.close()
+            if self._rejected_file is not None:
+                self._rejected_file.close()
+                self._rejected_file = self._rejected_writer = None
+
+        # Одно уведомление вместо построчных: открытые окна перечитают смену целиком
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            (CHANGES_CHANNEL, json.dumps({"table": self.table, "op": "IMPORT", "rows": self.loaded}))
+        )
+        cursor.connection.commit()
+
+        elapsed = monotonic() - started
+        stats = {
+            "loaded": self.loaded,
+            "rejected": self.rejected,
+            "rejected_path": self.rejected_path if self.rejected else None,
+            "seconds": elapsed,
+            "rows_per_second": self.loaded / elapsed if elapsed else 0.0,
+            "cancelled": cancelled,
+        }
+        logging.info(f"Импорт {path} в {self.table} завершен: {stats}")
+        return stats
+
+    def load_chunk(self, cursor, chunk):
+        """Загружает порцию строк одним COPY в отдельной транзакции."""
+        try:
+            self._copy(cursor, chunk)
+        except psycopg2.DataError:
+            # Строку, не прошедшую проверку сервера, ищем загрузкой порции по одной строке
+            cursor.connection.rollback()
+            for row in chunk:
+                try:
+                    self._copy(cursor, [row])
+                except psycopg2.DataError as e:
+                    cursor.connection.rollback()
+                    self.reject(None, str(e).strip(), row)
+                else:
+                    self.loaded += 1
+            return
+        self.loaded += len(chunk)
+
+    def _copy(self, cursor, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(copy_text(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.execute("SET LOCAL shift_journal.bulk_import = 'on'")
+        cursor.copy_expert(f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN", buffer)
+        cursor.connection.commit()
+
+    def reject(self, line_number, reason, values):
+        """Записывает отклоненную строку с причиной в файл отклоненных строк."""
+        self.rejected += 1
+        if self._rejected_writer is None:
+            self._rejected_file = open(self.rejected_path, "w", newline="", encoding="utf-8-sig")
+            self._rejected_writer = csv.writer(self._rejected_file)
+            self._rejected_writer.writerow(["Строка", "Причина"] + list(self.header))
+        self._rejected_writer.writerow([line_number or "", reason] + list(values))
+
+    def report(self, started):
+        elapsed = monotonic() - started
+        if self.progress:
+            self.progress(self.loaded, self.rejected, self.loaded / elapsed if elapsed else 0.0)
+
+
+def import_cli(argv):
+    """Импорт журналов из командной строки: python journal.py import <файл> [параметры]."""
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    credentials = config["Credentials"] if "Credentials" in config else {}
+
+    parser = argparse.ArgumentParser(
+        prog="journal.py import", description="Массовая загрузка журналов смен из CSV/XLSX через COPY."
+    )
+    parser.add_argument("path", help="Файл CSV или XLSX, первая строка - заголовок")
+    parser.add_argument("--table", choices=sorted(IMPORT_COLUMNS), default="journal",
+                        help="Записи журнала (journal) или составы смен (engineers)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Строк в одном COPY")
+    parser.add_argument("--rejected", help="Файл отклоненных строк (по умолчанию <файл>.rejected.csv)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Кодировка CSV")
+    parser.add_argument("--host", default=credentials.get("host", "localhost"))
+    parser.add_argument("--user", default=credentials.get("username", "postgres"))
+    parser.add_argument("--password", default=credentials.get("password", ""))
+    parser.add_argument("--dbname", default="shift_journal_db")
+    args = parser.parse_args(argv)
+
+    def progress(loaded, rejected, rate):
+        print(f"\rЗагружено: {loaded}, отклонено: {rejected}, {rate:.0f} строк/с", end="", flush=True)
+
+    try:
+        connection = psycopg2.connect(host=args.host, user=args.user, password=args.password, dbname=args.dbname)
+    except psycopg2.OperationalError as e:
+        print(f"Не удалось подключиться к базе данных: {e}", file=sys.stderr)
+        return 1
+    try:
+        with connection.cursor() as cursor:
+            apply_migrations(cursor)
+            connection.commit()
+            importer = BulkImporter(args.table, args.chunk_size, progress)
+            stats = importer.run(cursor, args.path, args.rejected, args.encoding)
+    except (OSError, ValueError, RuntimeError, psycopg2.Error) as e:
+        print(f"\nОшибка импорта: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    print()
+    print(f"Загружено строк: {stats['loaded']} за {stats['seconds']:.1f} с ({stats['rows_per_second']:.0f} строк/с)")
+    if stats["rejected"]:
+        print(f"Отклонено строк: {stats['rejected']}, см. {stats['rejected_path']}")
+    return 0
+
+
+class ImportSignals(QObject):
+    """Сигналы хода импорта из потока пула запросов в GUI-поток."""
+    progress = pyqtSignal(int, int, float)
+
+
+EXPORT_BATCH_SIZE = 2000  # Строк, читаемых серверным курсором за один раз
+
+# Отчет одной смены: entries - итератор (time, content, note), читается по мере обхода
+ShiftReport = namedtuple("ShiftReport", "date shift engineers entries")
+
+
+def iter_shift_reports(connection, date_from, date_to, shift=None, batch_size=EXPORT_BATCH_SIZE):
+    """Потоково отдает отчеты смен за период (или одной смены каждого дня) в порядке даты и смены.
+
+    Инженеры и записи журнала читаются двумя именованными (серверными)
+    курсорами порциями по batch_size и сливаются по ключу (дата, смена),
+    поэтому память не зависит от длины периода. Записи смены нужно прочитать
+    до перехода к следующей: как и в itertools.groupby, непрочитанный
+    остаток пропускается. Соединение должно быть в транзакции (не autocommit).
+    """
+    condition = "date BETWEEN %s AND %s"
+    params = [date_from, date_to]
+    if shift:
+        condition += " AND shift = %s"
+        params.append(shift)
+
+    suffix = uuid.uuid4().hex
+    with connection.cursor(name=f"export_engineers_{suffix}") as engineers_cursor, \
+            connection.cursor(name=f"export_journal_{suffix}") as journal_cursor:
+        engineers_cursor.itersize = batch_size
+        engineers_cursor.execute(
+            f"SELECT date, shift, name FROM engineers WHERE {condition} ORDER BY date, shift, id",
+            params
+        )
+        journal_cursor.itersize = batch_size
+        journal_cursor.execute(
+            f"SELECT date, shift, time, content, note FROM journal WHERE {condition} ORDER BY date, shift, event_ts, id",
+            params
+        )
+
+        def shift_key(row):
+            return row[0], row[1]
+
+        engineers_groups = itertools.groupby(engineers_cursor, key=shift_key)
+        journal_groups = itertools.groupby(journal_cursor, key=shift_key)
+        engineers_group = next(engineers_groups, None)
+        journal_group = next(journal_groups, None)
+        while engineers_group or journal_group:
+            key = min(group[0] for group in (engineers_group, journal_group) if group)
+
+            engineers = []
+            if engineers_group and engineers_group[0] == key:
+                engineers = [row[2] for row in engineers_group[1]]
+                engineers_group = next(engineers_groups, None)
+
+            if journal_group and journal_group[0] == key:
+                yield ShiftReport(key[0], key[1], engineers, (row[2:] for row in journal_group[1]))
+                journal_group = next(journal_groups, None)
+            else:
+                yield ShiftReport(key[0], key[1], engineers, iter(()))
+
+
+def format_report_time(value):
+    return value.strftime("%H:%M") if value else ""
+
+
+def report_rows(entries):
+    """Приводит записи отчета (time, content, note) к строкам таблицы Word."""
+    for time, content, note in entries:
+        yield format_report_time(time), content or "", note or ""
+
+
+def build_report_document(title, engineers, rows):
+    """Создает документ Word отчета смены средствами python-docx.
+
+    Эталон оформления отчета: из него же собирается шаблон DocxReportWriter.
+    """
+    doc = Document()
+    title_paragraph = doc.add_heading(title, level=1)
+    title_run = title_paragraph.runs[0]
+    title_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
+
+    # Добавляем раздел с инженерами на смене
+    engineers_heading = doc.add_heading("Инженеры на смене:", level=2)
+    engineers_heading_run = engineers_heading.runs[0]
+    engineers_heading_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
+
+    for engineer in engineers:
+        doc.add_paragraph(engineer, style="List Bullet")
+
+    # Создаем таблицу для записей журнала
+    records_heading = doc.add_heading("Записи журнала:", level=2)
+    records_heading_run = records_heading.runs[0]
+    records_heading_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
+
+    table = doc.add_table(rows=1, cols=3)
+    table.style = "Table Grid"
+
+    # Заголовок таблицы
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Время"
+    hdr_cells[1].text = "Содержание"
+    hdr_cells[2].text = "Примечание"
+
+    # Применяем стиль заголовков таблицы
+    for cell in hdr_cells:
+        for paragraph in cell.paragraphs:
+            run = paragraph.runs[0]
+            run.bold = True
+            run.font.size = Pt(11)
+            run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовков
+
+    # Добавляем записи журнала в таблицу
+    for time, content, note in rows:
+        row_cells = table.add_row().cells
+        row_cells[0].text = time
+        row_cells[1].text = content
+        row_cells[2].text = note
+
+    return doc
+
+
+class ReportTemplate:
+    """Шаблон отчета из именованных разделов с подстановками вида {поле} или {поле:формат}.
+
+    Разделы разбираются один раз - на неизменяемые куски текста и имена полей,
+    при выводе остается только склеить куски с экранированными значениями.
+    Раздел (начало документа, смена, строка таблицы, ...) выводится отдельно,
+    поэтому отчет пишется в поток по мере чтения записей. Фигурные скобки в
+    тексте шаблона удваиваются, как в str.format.
+    """
+
+    def __init__(self, sections, escape):
+        self.escape = escape
+        self.sections = {name: self.compile(text) for name, text in sections.items()}
+
+    @staticmethod
+    def compile(text):
+        """Разбирает текст раздела на [(текст, поле, формат), ...]."""
+        return [(literal, field, spec or "") for literal, field, spec, _ in string.Formatter().parse(text)]
+
+    def render(self, section, **values):
+        parts = []
+        for literal, field, spec in self.sections[section]:
+            parts.append(literal)
+            if field is not None:
+                parts.append(self.escape(format(values[field], spec)))
+        return "".join(parts)
+
+    def write(self, out, section, **values):
+        out.write(self.render(section, **values))
+
+
+class DocxReportWriter:
+    """Быстрая запись отчета смены в .docx без построения дерева python-docx.
+
+    Один раз в процессе python-docx собирает эталонный документ с маркерами
+    вместо заголовка, инженера и строки таблицы. Его document.xml делится на
+    неизменяемые куски, и при записи отчета XML строк таблицы пишется потоком
+    прямо в ZIP-пакет, остальные части пакета копируются из шаблона. Время и
+    память не зависят от размера таблицы так, как при table.add_row(), а
+    оформление совпадает с build_report_document. Несколько смен пишутся в
+    один документ повторением раздела (заголовок, инженеры, таблица).
+    """
+
+    TITLE_MARKER = "\ue020"
+    ENGINEER_MARKER = "\ue021"
+    TIME_MARKER = "\ue022"
+    CONTENT_MARKER = "\ue023"
+    NOTE_MARKER = "\ue024"
+    DOCUMENT_PART = "word/document.xml"
+    FLUSH_ROWS = 500  # Строк таблицы в одной порции записи в архив
+
+    _INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+    def __init__(self):
+        package = io.BytesIO()
+        build_report_document(
+            self.TITLE_MARKER, [self.ENGINEER_MARKER], [(self.TIME_MARKER, self.CONTENT_MARKER, self.NOTE_MARKER)]
+        ).save(package)
+        with zipfile.ZipFile(package) as template:
+            self.parts = [(info, template.read(info.filename)) for info in template.infolist()]
+        document = dict((info.filename, data) for info, data in self.parts)[self.DOCUMENT_PART].decode("utf-8")
+
+        # Раздел смены повторяется, внутри него - абзацы инженеров и строки таблицы
+        body_start = document.index("<w:body>") + len("<w:body>")
+        engineer_start, engineer_end = self._element_bounds(document, "w:p", self.ENGINEER_MARKER)
+        row_start, row_end = self._element_bounds(document, "w:tr", self.TIME_MARKER)
+        table_end = document.index("</w:tbl>", row_end) + len("</w:tbl>")
+        self.template = ReportTemplate({
+            "prologue": self._placeholders(document[:body_start], {}),
+            "head": self._placeholders(document[body_start:engineer_start], {self.TITLE_MARKER: "title"}),
+            "engineer": self._placeholders(document[engineer_start:engineer_end], {self.ENGINEER_MARKER: "name"}),
+            "middle": self._placeholders(document[engineer_end:row_start], {}),
+            "row": self._placeholders(document[row_start:row_end], {
+                self.TIME_MARKER: "time", self.CONTENT_MARKER: "content", self.NOTE_MARKER: "note",
+            }),
+            "table_end": self._placeholders(document[row_end:table_end], {}),
+            "epilogue": self._placeholders(document[table_end:], {}),
+        }, self.text)
+
+    @staticmethod
+    def _element_bounds(document, tag, marker):
+        """Границы элемента tag, содержащего маркер."""
+        position = document.index(marker)
+        start = max(document.rfind(f"<{tag}>", 0, position), document.rfind(f"<{tag} ", 0, position))
+        end = document.index(f"</{tag}>", position) + len(f"</{tag}>")
+        return start, end
+
+    @staticmethod
+    def _placeholders(xml, fields):
+        """Заменяет элементы <w:t> с маркерами на поля шаблона {имя}; fields - маркер -> имя."""
+        xml = xml.replace("{", "{{").replace("}", "}}")
+        for marker, name in fields.items():
+            xml, count = re.subn(f"<w:t(?: [^>]*)?>{marker}</w:t>", f"{{{name}}}", xml)
+            if count != 1:
+                raise ValueError("Шаблон отчета Word не соответствует ожидаемой структуре")
+        return xml
+
+    def text(self, value):
+        """XML текста run: переводы строк и табуляции - как у python-docx (w:br, w:tab)."""
+        value = self._INVALID_XML_CHARS.sub("", str(value).replace("\r\n", "\n").replace("\r", "\n"))
+        value = xml_escape(value).replace("\t", '</w:t><w:tab/><w:t xml:space="preserve">')
+        return '<w:t xml:space="preserve">' + value.replace("\n", '</w:t><w:br/><w:t xml:space="preserve">') + "</w:t>"
+
+    def write(self, path, title, engineers, rows):
+        """Пишет отчет одной смены в файл; rows - итератор строк таблицы. Возвращает их число."""
+        exporter = DocxExporter(path, self)
+        exporter.begin()
+        count = 0
+        try:
+            exporter.begin_section(title, engineers)
+            for row in rows:
+                exporter.write_row(row)
+                count += 1
+            exporter.end_shift()
+        except BaseException:
+            exporter.abort()
+            raise
+        exporter.finish()
+        return count
+
+
+_docx_report_writer = None
+_docx_report_writer_lock = threading.Lock()
+
+
+def docx_report_writer():
+    """Возвращает общий для процесса DocxReportWriter (шаблон собирается один раз)."""
+    global _docx_report_writer
+    with _docx_report_writer_lock:
+        if _docx_report_writer is None:
+            _docx_report_writer = DocxReportWriter()
+        return _docx_report_writer
+
+
+# Разделы HTML-отчета: письмо со сводкой и экспорт в HTML
+HTML_REPORT_SECTIONS = {
+    "begin": """<html>
+<head>
+    <meta charset="utf-8">
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+        }}
+        h2 {{
+            color: #0056b3;
+            border-bottom: 2px solid #0056b3;
+            padding-bottom: 5px;
+        }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            margin-top: 10px;
+        }}
+        th, td {{
+            padding: 8px;
+            border: 1px solid #ddd;
+        }}
+        th {{
+            background-color: #0056b3;
+            color: white;
+        }}
+    </style>
+</head>
+<body>
+""",
+    "shift_start": "<h2>Смена: {shift}, Дата: {date:%d-%m-%Y}</h2>\n<h3>Инженеры на смене:</h3>\n<ul>\n",
+    "engineer": "<li>{name}</li>\n",
+    "table_start": (
+        "</ul>\n<h3>Записи журнала:</h3>\n<table>\n"
+        "<tr><th>Время</th><th>Содержание</th><th>Примечание</th></tr>\n"
+    ),
+    "row": "<tr><td>{time}</td><td>{content}</td><td>{note}</td></tr>\n",
+    "shift_end": "</table>\n",
+    "end": "</body>\n</html>\n",
+}
+
+_report_templates = {}
+_report_templates_lock = threading.Lock()
+
+
+def report_template(name):
+    """Возвращает скомпилированный шаблон отчета ("html" или "docx"); каждый собирается один раз."""
+    with _report_templates_lock:
+        if name not in _report_templates:
+            if name == "html":
+                _report_templates[name] = ReportTemplate(HTML_REPORT_SECTIONS, html.escape)
+            elif name == "docx":
+                _report_templates[name] = docx_report_writer().template
+            else:
+                raise KeyError(f"Неизвестный шаблон отчета: {name}")
+        return _report_templates[name]
+
+
+def write_html_shift_start(out, template, date, shift, engineers):
+    template.write(out, "shift_start", shift=shift, date=date)
+    for name in engineers:
+        template.write(out, "engineer", name=name)
+    template.write(out, "table_start")
+
+
+def write_shift_html(out, report):
+    """Пишет раздел смены в HTML-отчет по мере чтения записей; возвращает число записей."""
+    template = report_template("html")
+    write_html_shift_start(out, template, report.date, report.shift, report.engineers)
+    count = 0
+    for time, content, note in report_rows(report.entries):
+        template.write(out, "row", time=time, content=content, note=note)
+        count += 1
+    template.write(out, "shift_end")
+    return count
+
+
+class ReportExporter:
+    """Экспортер отчета журнала в один формат.
+
+    Получает данные построчно: begin, затем для каждой смены begin_shift,
+    write_row для каждой записи и end_shift, в конце finish (или abort при
+    отмене и ошибке). Так один проход по серверному курсору питает сразу
+    несколько экспортеров. Файл пишется во временный и появляется под своим
+    именем только после finish.
+    """
+    extension = None
+    description = None
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + ".part"
+
+    def begin(self):
+        pass
+
+    def begin_shift(self, date, shift, engineers):
+        pass
+
+    def write_row(self, row):
+        """Пишет строку (время, содержание, примечание) в виде текста."""
+        raise NotImplementedError
+
+    def end_shift(self):
+        pass
+
+    def close(self):
+        """Закрывает временный файл."""
+
+    def finish(self):
+        self.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        try:
+            self.close()
+        except Exception as e:
+            logging.error(f"Ошибка при закрытии файла экспорта {self.temp_path}: {e}")
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class DocxExporter(ReportExporter):
+    """Word: XML таблицы пишется потоком в пакет-шаблон DocxReportWriter."""
+    extension = "docx"
+    description = "Word"
+
+    def __init__(self, path, writer=None):
+        super().__init__(path)
+        self.writer = writer
+        self.package = None
+        self.part = None
+
+    def begin(self):
+        self.writer = self.writer or docx_report_writer()
+        self.package = zipfile.ZipFile(self.temp_path, "w", zipfile.ZIP_DEFLATED)
+        # Части пакета до document.xml копируются сразу, после него - в close()
+        self.remaining_parts = list(self.writer.parts)
+        while self.remaining_parts[0][0].filename != self.writer.DOCUMENT_PART:
+            info, data = self.remaining_parts.pop(0)
+            self.package.writestr(info, data)
+        info, _ = self.remaining_parts.pop(0)
+        document_info = zipfile.ZipInfo(self.writer.DOCUMENT_PART, date_time=info.date_time)
+        document_info.compress_type = zipfile.ZIP_DEFLATED
+        self.part = self.package.open(document_info, "w", force_zip64=True)
+        self.template = self.writer.template
+        self.buffer = [self.template.render("prologue")]
+
+    def begin_shift(self, date, shift, engineers):
+        self.begin_section(shift_document_title(shift, date), engineers)
+
+    def begin_section(self, title, engineers):
+        self.buffer.append(self.template.render("head", title=title))
+        self.buffer.extend(self.template.render("engineer", name=engineer) for engineer in engineers)
+        self.buffer.append(self.template.render("middle"))
+
+    def write_row(self, row):
+        time, content, note = row
+        self.buffer.append(self.template.render("row", time=time, content=content, note=note))
+        if len(self.buffer) >= self.writer.FLUSH_ROWS:
+            self.flush()
+
+    def end_shift(self):
+        self.buffer.append(self.template.render("table_end"))
+
+    def flush(self):
+        self.part.write("".join(self.buffer).encode("utf-8"))
+        self.buffer = []
+
+    def close(self):
+        if self.part is not None:
+            self.buffer.append(self.template.render("epilogue"))
+            self.flush()
+            self.part.close()
+            self.part = None
+            for info, data in self.remaining_parts:
+                self.package.writestr(info, data)
+        if self.package is not None:
+            self.package.close()
+            self.package = None
+
+
+class CsvExporter(ReportExporter):
+    """CSV в формате, который принимает импорт журналов (заголовки Дата;Смена;Время;...)."""
+    extension = "csv"
+    description = "CSV"
+
+    def begin(self):
+        self.file = open(self.temp_path, "w", newline="", encoding="utf-8-sig")
+        self.csv_writer = csv.writer(self.file, delimiter=";")
+        self.csv_writer.writerow(["Дата", "Смена", "Время", "Содержание", "Примечание"])
+
+    def begin_shift(self, date, shift, engineers):
+        self.shift_columns = [date.isoformat(), shift]
+
+    def write_row(self, row):
+        self.csv_writer.writerow(self.shift_columns + list(row))
+
+    def close(self):
+        if getattr(self, "file", None) and not self.file.closed:
+            self.file.close()
+
+
+class XlsxExporter(ReportExporter):
+    """Excel через write-only режим openpyxl: строки не накапливаются в памяти."""
+    extension = "xlsx"
+    description = "Excel"
+
+    def begin(self):
+        if openpyxl is None:
+            raise RuntimeError("Для экспорта в XLSX установите пакет openpyxl")
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.journal_sheet = self.workbook.create_sheet("Журнал")
+        self.journal_sheet.append(["Дата", "Смена", "Время", "Содержание", "Примечание"])
+        self.engineers_sheet = self.workbook.create_sheet("Инженеры")
+        self.engineers_sheet.append(["Дата", "Смена", "Инженер"])
+
+    def begin_shift(self, date, shift, engineers):
+        self.shift_columns = [date, shift]
+        for engineer in engineers:
+            self.engineers_sheet.append([date, shift, engineer])
+
+    def write_row(self, row):
+        self.journal_sheet.append(self.shift_columns + list(row))
+
+    def close(self):
+        if getattr(self, "workbook", None) is not None:
+            self.workbook.save(self.temp_path)
+            self.workbook = None
+
+
+class HtmlExporter(ReportExporter):
+    """Самостоятельная HTML-страница с тем же оформлением, что и письмо со сводкой."""
+    extension = "html"
+    description = "HTML"
+
+    def begin(self):
+        self.template = report_template("html")
+        self.file = open(self.temp_path, "w", encoding="utf-8")
+        self.template.write(self.file, "begin")
+
+    def begin_shift(self, date, shift, engineers):
+        write_html_shift_start(self.file, self.template, date, shift, engineers)
+
+    def write_row(self, row):
+        time, content, note = row
+        self.template.write(self.file, "row", time=time, content=content, note=note)
+
+    def end_shift(self):
+        self.template.write(self.file, "shift_end")
+
+    def close(self):
+        if getattr(self, "file", None) and not self.file.closed:
+            self.template.write(self.file, "end")
+            self.file.close()
+
+
+class PdfExporter(ReportExporter):
+    """PDF через QPdfWriter: страницы рисуются по мере поступления строк, шапка таблицы повторяется."""
+    extension = "pdf"
+    description = "PDF"
+
+    COLUMN_WIDTHS = (0.12, 0.55, 0.33)  # Доли ширины страницы: время, содержание, примечание
+    PADDING = 20  # В точках устройства (1/300 дюйма)
+    ACCENT = QColor(0, 85, 179)
+
+    def begin(self):
+        self.pdf = QPdfWriter(self.temp_path)
+        self.pdf.setResolution(300)
+        self.pdf.setPageSize(QPageSize(QPageSize.A4))
+        self.pdf.setPageMargins(QMarginsF(15, 15, 15, 15), QPageLayout.Millimeter)
+        self.painter = QPainter(self.pdf)
+        self.width = self.pdf.width()
+        self.height = self.pdf.height()
+        self.y = 0
+        self.title_font = QFont("Arial", 14, QFont.Bold)
+        self.heading_font = QFont("Arial", 12, QFont.Bold)
+        self.header_font = QFont("Arial", 11, QFont.Bold)
+        self.text_font = QFont("Arial", 10)
+
+    def new_page(self):
+        self.pdf.newPage()
+        self.y = 0
+
+    def paragraph(self, text, font, color=None, space_after=40):
+        self.painter.setFont(font)
+        rect = self.painter.boundingRect(QRectF(0, 0, self.width, self.height), Qt.TextWordWrap, text)
+        if self.y + rect.height() > self.height:
+            self.new_page()
+        self.painter.setPen(color or QColor(0, 0, 0))
+        self.painter.drawText(QRectF(0, self.y, self.width, rect.height()), Qt.TextWordWrap, text)
+        self.y += rect.height() + space_after
+
+    def table_row(self, values, font, color=None, repeat_header=True):
+        self.painter.setFont(font)
+        widths = [self.width * share for share in self.COLUMN_WIDTHS]
+        heights = [
+            self.painter.boundingRect(
+                QRectF(0, 0, width - 2 * self.PADDING, self.height), Qt.TextWordWrap, value
+            ).height()
+            for width, value in zip(widths, values)
+        ]
+        row_height = max(heights) + 2 * self.PADDING
+        if self.y + row_height > self.height:
+            self.new_page()
+            if repeat_header:
+                self.table_header()
+            self.painter.setFont(font)
+        x = 0
+        for width, value in zip(widths, values):
+            self.painter.setPen(QPen(QColor(0, 0, 0), 2))
+            self.painter.drawRect(QRectF(x, self.y, width, row_height))
+            self.painter.setPen(color or QColor(0, 0, 0))
+            self.painter.drawText(
+                QRectF(x + self.PADDING, self.y + self.PADDING, width - 2 * self.PADDING, row_height),
+                Qt.TextWordWrap, value
+            )
+            x += width
+        self.y += row_height
+
+    def table_header(self):
+        self.table_row(("Время", "Содержание", "Примечание"), self.header_font, self.ACCENT, repeat_header=False)
+
+    def begin_shift(self, date, shift, engineers):
+        if self.y:
+            self.y += 80
+        self.paragraph(shift_document_title(shift, date), self.title_font, self.ACCENT)
+        self.paragraph("Инженеры на смене:", self.heading_font, self.ACCENT)
+        for engineer in engineers:
+            self.paragraph(f"\u2022 {engineer}", self.text_font, space_after=10)
+        self.paragraph("Записи журнала:", self.heading_font, self.ACCENT)
+        self.table_header()
+
+    def write_row(self, row):
+        self.table_row(row, self.text_font)
+
+    def close(self):
+        if getattr(self, "painter", None) is not None:
+            self.painter.end()
+            self.painter = None
+            self.pdf = None
+
+
+# Доступные форматы экспорта: расширение файла -> экспортер
+EXPORTERS = {exporter.extension: exporter for exporter in (DocxExporter, CsvExporter, XlsxExporter, HtmlExporter, PdfExporter)}
+
+
+def export_reports(reports, exporters, progress=None, cancelled=None):
+    """Один проход по отчетам смен с записью сразу во все экспортеры.
+
+    При отмене или ошибке частично записанные файлы удаляются.
+    """
+    stats = {"shifts": 0, "entries": 0, "cancelled": False}
+    started = []
+    try:
+        for exporter in exporters:
+            exporter.begin()
+            started.append(exporter)
+        for report in reports:
+            if cancelled and cancelled():
+                stats["cancelled"] = True
+                break
+            for exporter in exporters:
+                exporter.begin_shift(report.date, report.shift, report.engineers)
+            for row in report_rows(report.entries):
+                for exporter in exporters:
+                    exporter.write_row(row)
+                stats["entries"] += 1
+            for exporter in exporters:
+                exporter.end_shift()
+            stats["shifts"] += 1
+            if progress:
+                progress(stats["shifts"], stats["entries"])
+        if not stats["cancelled"]:
+            for exporter in exporters:
+                exporter.finish()
+    except BaseException:
+        for exporter in started:
+            exporter.abort()
+        raise
+    if stats["cancelled"]:
+        for exporter in started:
+            exporter.abort()
+    return stats
+
+
+def export_range(connection, date_from, date_to, exporters, progress=None, cancelled=None):
+    """Экспортирует журнал за период во все заданные форматы за один проход по базе данных."""
+    reports = iter_shift_reports(connection, date_from, date_to)
+    try:
+        stats = export_reports(reports, exporters, progress, cancelled)
+    finally:
+        reports.close()
+    logging.info(f"Экспорт журнала за {date_from} - {date_to} в {[exporter.path for exporter in exporters]}: {stats}")
+    return stats
+
+
+BATCH_EXPORT_WORKERS = min(4, os.cpu_count() or 1)  # Каждый процесс держит свое соединение с базой данных
+_batch_worker_connection = None
+
+
+def shift_document_title(shift, date):
+    return f"Журнал смены: {shift}, Дата: {date.strftime('%d %B %Y')}"
+
+
+def batch_export_jobs(date_from, date_to, per_week, directory):
+    """Задания пакетного экспорта: (путь, начало, конец, смена) на каждую смену или неделю периода."""
+    jobs = []
+    days = [date_from + datetime.timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    if per_week:
+        for (year, week), week_days in itertools.groupby(days, key=lambda day: day.isocalendar()[:2]):
+            week_days = list(week_days)
+            path = os.path.join(directory, f"Журнал_{year}-W{week:02d}.docx")
+            jobs.append((path, week_days[0], week_days[-1], None))
+    else:
+        for day in days:
+            for shift in ("1-я смена", "2-я смена"):
+                path = os.path.join(directory, f"Журнал_{shift}_{day.strftime('%d %B %Y')}.docx")
+                jobs.append((path, day, day, shift))
+    return jobs
+
+
+def export_batch_file(dsn, path, date_from, date_to, shift=None):
+    """Формирует один файл пакетного экспорта в процессе-обработчике.
+
+    Обработчик сам читает свои смены через собственное соединение. Возвращает
+    (путь, смен, записей) или None, если за период нет ни записей, ни инженеров.
+    """
+    global _batch_worker_connection
+    if _batch_worker_connection is None or _batch_worker_connection.closed:
+        _batch_worker_connection = psycopg2.connect(**dsn)
+        _batch_worker_connection.set_session(readonly=True)
+    connection = _batch_worker_connection
+
+    try:
+        reports = iter_shift_reports(connection, date_from, date_to, shift)
+        try:
+            first = next(reports, None)
+            if first is None:
+                return None
+            stats = export_reports(itertools.chain([first], reports), [DocxExporter(path)])
+        finally:
+            reports.close()
+    finally:
+        connection.rollback()
+    return path, stats["shifts"], stats["entries"]
+
+
+class BatchExportSignals(QObject):
+    """Завершение задания пакетного экспорта (из потока ProcessPoolExecutor в GUI-поток)."""
+    done = pyqtSignal(object)
+
+
+class ExportSignals(QObject):
+    """Сигналы хода экспорта из потока пула запросов в GUI-поток."""
+    progress = pyqtSignal(int, int)
+
+
+def load_mail_settings(path="config.ini"):
+    """Читает раздел [Mail] из config.ini; возвращает None, если почта не настроена."""
+    config = configparser.ConfigParser()
+    config.read(path)
+    if "Mail" not in config or not config["Mail"].get("host"):
+        return None
+    section = config["Mail"]
+
+    def addresses(value):
+        return [address.strip() for address in value.split(",") if address.strip()]
+
+    security = section.get("security", "starttls").lower()
+    return {
+        "host": section["host"],
+        "port": section.getint("port", 465 if security == "ssl" else 587),
+        "security": security,  # starttls, ssl или none
+        "username": section.get("username", ""),
+        "password": section.get("password", ""),
+        "sender": section.get("sender", section.get("username", "")),
+        "to": addresses(section.get("to", "")),
+        "cc": addresses(section.get("cc", "")),
+        "timeout": section.getfloat("timeout", 30),
+        "auto_reports": section.getboolean("auto_reports", True),
+    }
+
+
+class SmtpSender:
+    """Отправка писем через SMTP с одним повторно используемым соединением.
+
+    Соединение открывается при первой отправке и держится открытым; после
+    простоя оно проверяется командой NOOP, а если сервер успел его закрыть,
+    письмо отправляется повторно через новое соединение.
+    """
+
+    IDLE_CHECK = 60  # с
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.smtp = None
+        self.last_used = 0.0
+
+    def connect(self):
+        settings = self.settings
+        if settings["security"] == "ssl":
+            smtp = smtplib.SMTP_SSL(
+                settings["host"], settings["port"], timeout=settings["timeout"], context=ssl.create_default_context()
+            )
+        else:
+            smtp = smtplib.SMTP(settings["host"], settings["port"], timeout=settings["timeout"])
+            if settings["security"] == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+        if settings["username"]:
+            smtp.login(settings["username"], settings["password"])
+        logging.info(f"Открыто SMTP-соединение с {settings['host']}:{settings['port']}")
+        return smtp
+
+    def connection(self):
+        if self.smtp is not None and monotonic() - self.last_used > self.IDLE_CHECK:
+            try:
+                if self.smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.smtp = None
+        if self.smtp is None:
+            self.smtp = self.connect()
+        return self.smtp
+
+    def send(self, message):
+        try:
+            self.connection().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрыл простаивавшее соединение - одна попытка через новое
+            self.smtp = None
+            self.connection().send_message(message)
+        self.last_used = monotonic()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+
+class MailQueue:
+    """Очередь исходящих писем в SQLite с отправкой в фоновом потоке.
+
+    Письма переживают перезапуск приложения. Временные ошибки (сеть,
+    ответы 4xx) повторяются с экспоненциально растущей задержкой, постоянные
+    (5xx, отказ адресатов), письма, которые не удается разобрать или
+    отправить по другой причине, и исчерпание попыток помечают письмо как
+    неотправленное. О результате сообщают колбэки on_sent и on_failed,
+    вызываемые из фонового потока. Непредвиденная ошибка (например, SQLite)
+    не останавливает поток: она журналируется, и итерация повторяется через
+    BASE_DELAY.
+    """
+
+    BASE_DELAY = 10  # с, задержка перед первой повторной попыткой
+    MAX_DELAY = 900  # с
+    MAX_ATTEMPTS = 8
+    SENT_RETENTION_DAYS = 30  # Сколько хранятся ключи отправленных писем
+
+    def __init__(self, path, sender, on_sent=None, on_failed=None):
+        self.path = path
+        self.sender = sender
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        with closing(open_sqlite(self.path)) as db, db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    subject TEXT NOT NULL,
+                    message BLOB NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            columns = [row[1] for row in db.execute("PRAGMA table_info(outbox)")]
+            if "dedupe_key" not in columns:  # Очередь, созданная до появления ключей
+                db.execute("ALTER TABLE outbox ADD COLUMN dedupe_key TEXT")
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS outbox_dedupe_key_idx ON outbox (dedupe_key)")
+            db.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND created_at < datetime('now', ?)",
+                (f"-{self.SENT_RETENTION_DAYS} days",)
+            )
+
+    @staticmethod
+    def now():
+        return datetime.datetime.now().timestamp()
+
+    def enqueue(self, message, key=None):
+        """Ставит письмо (EmailMessage) в очередь и будит поток отправки.
+
+        Письмо с ключом key ставится один раз: если письмо с тем же ключом уже
+        в очереди или отправлено, возвращается False.
+        """
+        with closing(open_sqlite(self.path)) as db, db:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO outbox (subject, message, next_attempt, dedupe_key) VALUES (?, ?, ?, ?)",
+                (str(message["Subject"]), message.as_bytes(policy=email.policy.SMTP), self.now(), key)
+            )
+        if not cursor.rowcount:
+            logging.info(f"Письмо '{message['Subject']}' уже поставлено в очередь ({key}).")
+            return False
+        self._wake.set()
+        return True
+
+    def pending_count(self):
+        with closing(open_sqlite(self.path)) as db:
+            return db.execute("SELECT count(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="mail-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.sender.close()
+
+    def run(self):
+        while not self._stopping:
+            try:
+                self.process_next()
+            except Exception:
+                logging.exception("Сбой очереди отправки писем, повтор позже")
+                self._wake.wait(self.BASE_DELAY)
+                self._wake.clear()
+
+    def process_next(self):
+        """Отправляет очередное письмо, если подошел его срок, иначе ждет; одна итерация run."""
+        with closing(open_sqlite(self.path)) as db:
+            row = db.execute(
+                "SELECT id, subject, message, attempts, next_attempt FROM outbox "
+                "WHERE status = 'pending' ORDER BY next_attempt, id LIMIT 1"
+            ).fetchone()
+        if row is None:
+            self._wake.wait()
+            self._wake.clear()
+            return
+        message_id, subject, data, attempts, next_attempt = row
+        delay = next_attempt - self.now()
+        if delay > 0:
+            self._wake.wait(delay)
+            self._wake.clear()
+            return
+        self.deliver(message_id, subject, data, attempts)
+
+    def deliver(self, message_id, subject, data, attempts):
+        try:
+            message = email.message_from_bytes(data, policy=email.policy.SMTP)
+        except Exception as e:
+            self.mark_failed(message_id, subject, attempts, f"письмо не удалось разобрать: {e}")
+            return
+        try:
+            self.sender.send(message)
+        except (smtplib.SMTPException, OSError) as e:
+            self.sender.close()
+            attempts += 1
+            permanent = (
+                isinstance(e, smtplib.SMTPRecipientsRefused)
+                or (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500)
+            )
+            if permanent or attempts >= self.MAX_ATTEMPTS:
+                self.mark_failed(message_id, subject, attempts, str(e))
+                return
+            delay = min(self.BASE_DELAY * 2 ** (attempts - 1), self.MAX_DELAY)
+            with closing(open_sqlite(self.path)) as db, db:
+                db.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                    (attempts, self.now() + delay, str(e), message_id)
+                )
+            logging.warning(f"Ошибка отправки письма '{subject}' (попытка {attempts}), повтор позже: {e}")
+            return
+        except Exception as e:
+            # Например, заголовки, которые не удается разобрать: повтор не поможет
+            self.sender.close()
+            self.mark_failed(message_id, subject, attempts + 1, str(e))
+            return
+
+        with closing(open_sqlite(self.path)) as db, db:
+            # Ключ отправленного письма остается, чтобы повторная постановка не отправила его еще раз
+            db.execute("UPDATE outbox SET status = 'sent', message = x'' WHERE id = ? AND dedupe_key IS NOT NULL",
+                       (message_id,))
+            db.execute("DELETE FROM outbox WHERE id = ? AND dedupe_key IS NULL", (message_id,))
+        logging.info(f"Письмо '{subject}' отправлено.")
+        self.notify(self.on_sent, subject)
+
+    def mark_failed(self, message_id, subject, attempts, error):
+        """Помечает письмо как неотправленное и сообщает об этом on_failed."""
+        with closing(open_sqlite(self.path)) as db, db:
+            db.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, message_id)
+            )
+        logging.error(f"Письмо '{subject}' не отправлено после {attempts} попыток: {error}")
+        self.notify(self.on_failed, subject, error)
+
+    @staticmethod
+    def notify(callback, *args):
+        """Вызывает колбэк результата; его ошибка не прерывает отправку остальных писем."""
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            logging.exception("Ошибка обработчика результата отправки письма")
+
+
+class MailSignals(QObject):
+    """Результаты фоновой отправки писем для GUI-потока."""
+    sent = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def build_report_message(settings, date, shift, html_body, attachment=None):
+    """Собирает письмо со сводкой смены; attachment - (имя файла, байты документа Word)."""
+    date_for_message = date.strftime("%d-%m-%Y")
+    message = EmailMessage()
+    message["Subject"] = f"Сводка - {shift} от {date_for_message}"
+    message["From"] = settings["sender"]
+    message["To"] = ", ".join(settings["to"])
+    if settings["cc"]:
+        message["Cc"] = ", ".join(settings["cc"])
+    message.set_content(f"Сводка по смене {shift} от {date_for_message} - в HTML-версии письма.")
+    message.add_alternative(html_body, subtype="html")
+    if attachment:
+        filename, data = attachment
+        maintype, subtype = DOCX_MIME_TYPE.split("/")
+        message.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return message
+
+
+# Окончания смен: (время, какая смена заканчивается, сдвиг даты ее начала в днях)
+SHIFT_ENDS = (
+    (datetime.time(8, 30), "2-я смена", -1),
+    (datetime.time(20, 30), "1-я смена", 0),
+)
+
+
+def shift_at(moment):
+    """Возвращает (смена, дата начала смены) для момента времени."""
+    if SHIFT_ENDS[0][0] <= moment.time() < SHIFT_ENDS[1][0]:
+        return "1-я смена", moment.date()
+    if moment.time() < SHIFT_ENDS[0][0]:
+        # Вторая смена после полуночи началась накануне
+        return "2-я смена", moment.date() - datetime.timedelta(days=1)
+    return "2-я смена", moment.date()
+
+
+def finished_shifts(since, until):
+    """Смены (дата, смена), закончившиеся в промежутке (since, until], в порядке окончания."""
+    shifts = []
+    day = since.date()
+    while day <= until.date():
+        for end, shift, offset in SHIFT_ENDS:
+            if since < datetime.datetime.combine(day, end) <= until:
+                shifts.append((day + datetime.timedelta(days=offset), shift))
+        day += datetime.timedelta(days=1)
+    return shifts
+
+
+def shift_end(date, shift):
+    """Момент окончания смены, начавшейся в date."""
+    for end, ending_shift, offset in SHIFT_ENDS:
+        if ending_shift == shift:
+            return datetime.datetime.combine(date - datetime.timedelta(days=offset), end)
+    raise ValueError(f"неизвестная смена '{shift}'")
+
+
+def next_shift_end(moment):
+    """Ближайшее окончание смены строго после moment."""
+    for day in (moment.date(), moment.date() + datetime.timedelta(days=1)):
+        for end, _, _ in SHIFT_ENDS:
+            boundary = datetime.datetime.combine(day, end)
+            if boundary > moment:
+                return boundary
+
+
+def fetch_shift_report(cursor, date, shift):
+    """Читает состав и записи одной смены одним запросом и возвращает ShiftReport."""
+    cursor.execute(
+        '''
+        SELECT e.names, j.id, j.time, j.content, j.note
+        FROM (
+            SELECT coalesce(array_agg(name::text ORDER BY id), ARRAY[]::text[]) AS names
+            FROM engineers WHERE date = %(date)s AND shift = %(shift)s
+        ) e
+        LEFT JOIN journal j ON j.date = %(date)s AND j.shift = %(shift)s
+        ORDER BY j.event_ts, j.id
+        ''',
+        {"date": date, "shift": shift}
+    )
+    rows = cursor.fetchall()
+    entries = [row[2:] for row in rows if row[1] is not None]
+    return ShiftReport(date, shift, rows[0][0], entries)
+
+
+def render_shift_report(report):
+    """Готовит HTML-текст и документ Word сводки смены; возвращает (html, (имя файла, байты))."""
+    body = io.StringIO()
+    report_template("html").write(body, "begin")
+    write_shift_html(body, report)
+    report_template("html").write(body, "end")
+
+    filename = f"Журнал_{report.date.isoformat()}_{report.shift}.docx"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, filename)
+        docx_report_writer().write(
+            path, shift_document_title(report.shift, report.date), report.engineers, report_rows(report.entries)
+        )
+        with open(path, "rb") as f:
+            document = f.read()
+    return body.getvalue(), (filename, document)
+
+
+class ShiftReportScheduler(QObject):
+    """Автоматически отправляет сводку каждой закончившейся смены.
+
+    Срабатывает через GRACE после пересменки (08:30 и 20:30), чтобы успели
+    лечь последние записи, а также при запуске и восстановлении связи с
+    сервером - тогда досылаются смены, пропущенные за время простоя, но не
+    старше CATCHUP; более старые отмечаются пропущенными и попадают в
+    журнал одним предупреждением. Сводку смены отправляет ровно одно рабочее
+    место: смена забирается вставкой в shift_reports, отметка фиксируется, и
+    только затем письмо ставится в очередь с ключом (дата, смена). Смену
+    забирает процесс (claim_id - имя компьютера и случайный идентификатор
+    запуска), а не компьютер: два экземпляра программы на одном компьютере
+    не считают чужие отметки своими. Если процесс прервется между этими
+    шагами, его отметку через CLAIM_TIMEOUT заберет процесс того же
+    компьютера и поставит письмо повторно; очередь у них общая и по ключу не
+    продублирует уже поставленное.
+    """
+
+    GRACE = datetime.timedelta(minutes=15)
+    CATCHUP = datetime.timedelta(days=1)
+    CLAIM_TIMEOUT = datetime.timedelta(minutes=10)  # Срок, после которого отметку прерванного процесса забирают
+    MAX_SLEEP = 15 * 60  # с, не спим дольше на случай перевода часов или сна компьютера
+
+    def __init__(self, executor, mail_queue, settings, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.mail_queue = mail_queue
+        self.settings = settings
+        self.host = socket.gethostname()
+        self.claim_id = f"{self.host}/{uuid.uuid4()}"
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+
+    def run(self):
+        self.executor.submit("shift_reports", self.send_due_reports, self.on_reports_sent, self.on_reports_failed)
+        self.schedule()
+
+    def schedule(self):
+        now = datetime.datetime.now()
+        due = next_shift_end(now - self.GRACE) + self.GRACE
+        delay = min((due - now).total_seconds(), self.MAX_SLEEP)
+        self.timer.start(max(1000, int(delay * 1000)))
+
+    def send_due_reports(self, cursor):
+        """Ставит в очередь сводки закончившихся смен, взятых этим рабочим местом.
+
+        Возвращает (поставленные (дата, смена, записей), пропущенные (дата, смена)).
+        """
+        until = datetime.datetime.now() - self.GRACE
+        missed = self.mark_missed(cursor, self.claim_id, until - self.CATCHUP)
+        for date, shift in finished_shifts(until - self.CATCHUP, until):
+            cursor.execute(
+                "INSERT INTO shift_reports (date, shift, claimed_by) VALUES (%s, %s, %s) "
+                "ON CONFLICT (date, shift) DO NOTHING",
+                (date, shift, self.claim_id)
+            )
+        # Отметки прерванных процессов этого компьютера (до перехода на claim_id - просто имя компьютера)
+        cursor.execute(
+            "UPDATE shift_reports SET claimed_by = %s, claimed_at = now() "
+            "WHERE queued_at IS NULL AND NOT skipped AND claimed_by <> %s "
+            "AND split_part(claimed_by, '/', 1) = %s AND claimed_at < now() - %s",
+            (self.claim_id, self.claim_id, self.host, self.CLAIM_TIMEOUT)
+        )
+        cursor.connection.commit()
+
+        # Смены, взятые этим процессом и еще не поставленные в очередь, в том числе прерванные в прошлый раз
+        cursor.execute(
+            "SELECT date, shift FROM shift_reports "
+            "WHERE claimed_by = %s AND queued_at IS NULL AND NOT skipped ORDER BY date, shift",
+            (self.claim_id,)
+        )
+        sent = []
+        for date, shift in cursor.fetchall():
+            report = fetch_shift_report(cursor, date, shift)
+            html_body, attachment = render_shift_report(report)
+            self.mail_queue.enqueue(
+                build_report_message(self.settings, date, shift, html_body, attachment),
+                key=f"shift_report:{date.isoformat()}:{shift}"
+            )
+            cursor.execute(
+                "UPDATE shift_reports SET entries = %s, queued_at = now() WHERE date = %s AND shift = %s",
+                (len(report.entries), date, shift)
+            )
+            cursor.connection.commit()
+            sent.append((date, shift, len(report.entries)))
+        return sent, missed
+
+    @staticmethod
+    def mark_missed(cursor, claim_id, before):
+        """Отмечает пропущенными смены, закончившиеся после последней отметки, но до before."""
+        # "2-я смена" сортируется после "1-я смена" и заканчивается позже
+        cursor.execute("SELECT date, shift FROM shift_reports ORDER BY date DESC, shift DESC LIMIT 1")
+        last = cursor.fetchone()
+        if last is None:
+            return []
+        missed = []
+        for date, shift in finished_shifts(shift_end(*last), before):
+            cursor.execute(
+                "INSERT INTO shift_reports (date, shift, claimed_by, skipped) VALUES (%s, %s, %s, true) "
+                "ON CONFLICT (date, shift) DO NOTHING RETURNING date",
+                (date, shift, claim_id)
+            )
+            if cursor.fetchone() is not None:
+                missed.append((date, shift))
+        cursor.connection.commit()
+        return missed
+
+    def on_reports_sent(self, result):
+        sent, missed = result
+        for date, shift, entries in sent:
+            logging.info(f"Сводка смены {shift} за {date} ({entries} записей) поставлена в очередь отправки.")
+        if missed:
+            shifts = ", ".join(f"{shift} за {date}" for date, shift in missed)
+            logging.warning(f"Сводки смен, закончившихся раньше чем {self.CATCHUP} назад, не отправлены: {shifts}")
+
+    def on_reports_failed(self, error):
+        logging.warning(f"Не удалось подготовить сводки смен, повтор при следующей проверке: {error}")
+
+
 class LoginWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -109,14 +2676,14 @@ class LoginWindow(QWidget):
 
         logging.info("Попытка подключения к базе данных")
         try:
-            self.connection = psycopg2.connect(
+            self.pool = ConnectionPool(
                 host=host,
                 user=user,
                 password=password,
                 dbname="shift_journal_db"
             )
             logging.info("Подключение к базе данных установлено")
-            self.create_tables()
+            self.migrate_schema()
             QMessageBox.information(self, "Успешно", "Подключение к базе данных установлено")
             self.open_main_window()
 
@@ -125,46 +2692,25 @@ class LoginWindow(QWidget):
         except psycopg2.OperationalError as e:
             logging.error(f"Ошибка подключения к базе данных: {e}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось подключиться к базе данных:\n{e}")
+        except psycopg2.Error as e:
+            logging.error(f"Ошибка обновления схемы базы данных: {e}")
+            QMessageBox.critical(self, "Ошибка", f"Не удалось обновить схему базы данных:\n{e}")
 
     def cancel(self):
         logging.info("Нажата кнопка 'Отмена', закрытие окна")
         self.close()
 
-    def create_tables(self):
-        cursor = self.connection.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS journal (
-                id SERIAL PRIMARY KEY,
-                date DATE,
-                shift VARCHAR(50),
-                time TIME,
-                content TEXT,
-                note TEXT
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS engineers (
-                id SERIAL PRIMARY KEY,
-                shift VARCHAR(50),
-                date DATE,
-                name VARCHAR(255)
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS engineers_info (
-                id SERIAL PRIMARY KEY,
-                full_name VARCHAR(255) NOT NULL,
-                tab_number VARCHAR(50) NOT NULL
-            )
-        ''')
-
-        self.connection.commit()
+    def migrate_schema(self):
+        """Приводит схему базы данных к текущей версии."""
+        with self.pool.cursor() as cursor:
+            applied = apply_migrations(cursor)
+        if applied:
+            logging.info(f"Применено миграций схемы: {applied}, версия схемы: {SCHEMA_VERSION}")
+        else:
+            logging.info(f"Схема базы данных актуальна (версия {SCHEMA_VERSION})")
 
     def open_main_window(self):
-        self.main_window = MainWindow(self.connection)
+        self.main_window = MainWindow(self.pool)
         self.main_window.show()
         self.close()
 
@@ -172,45 +2718,90 @@ class LoginWindow(QWidget):
         self.close()
 
 class MainWindow(QWidget):
-    def __init__(self, connection):
+    def __init__(self, pool):
         super().__init__()
-        self.connection = connection
+        self.pool = pool
+        self.executor = QueryExecutor(pool, self)  # Запросы выполняются вне GUI-потока
+        self.executor.loading_changed.connect(self.set_loading)
+        self.engineer_directory = EngineerDirectory()  # Кэш справочника инженеров
+        self.shown_directory = None  # Список, которым заполнен engineer_select_combo
+        # Локальная очередь записей: переживает обрыв связи и перезапуск приложения
+        self.write_queue = OfflineWriteQueue(os.path.join(current_dir, "pending_writes.db"))
+        self.flush_in_progress = False
+        # Локальная реплика последних смен: смена показывается с диска до ответа сервера
+        self.mirror = LocalMirror(os.path.join(current_dir, "local_mirror.db"))
+        # Исходящая почта: очередь на диске, отправка по SMTP в фоновом потоке
+        self.mail_settings = load_mail_settings()
+        self.mail_signals = MailSignals(self)
+        self.mail_signals.sent.connect(self.on_mail_sent)
+        self.mail_signals.failed.connect(self.on_mail_failed)
+        self.mail_queue = None
+        if self.mail_settings:
+            self.mail_queue = MailQueue(
+                os.path.join(current_dir, "outbox.db"), SmtpSender(self.mail_settings),
+                self.mail_signals.sent.emit, self.mail_signals.failed.emit
+            )
+            self.mail_queue.start()
+        # Автоматическая отправка сводки по окончании каждой смены
+        self.report_scheduler = None
+        if self.mail_queue and self.mail_settings["to"] and self.mail_settings["auto_reports"]:
+            self.report_scheduler = ShiftReportScheduler(self.executor, self.mail_queue, self.mail_settings, self)
         self.filters = {}  # Хранит текущие фильтры
         self.initUI()
-                # Добавляем метод для проверки и восстановления соединения
-        self.reconnect_if_needed()
 
-        # Настройка таймера для периодической проверки соединения
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.reconnect_if_needed)
-        self.timer.start(300000)  # Проверять соединение каждые 5 минут
-
-    def reconnect_if_needed(self):
-        try:
-            # Проверка состояния соединения
-            self.connection.poll()
-        except (psycopg2.InterfaceError, psycopg2.OperationalError):
-            # Если соединение закрыто, создаем новое
-            self.connection = psycopg2.connect(
-                host=self.host_input.text(),
-                user=self.user_input.text(),
-                password=self.password_input.text(),
-                dbname="shift_journal_db"
-            )
-            logging.info("Соединение с базой данных восстановлено.")
-        # Подключаем обновление таблицы и списка инженеров к изменению смены и даты
-        self.shift_combo.currentIndexChanged.connect(self.update_engineers_and_journal)
-        self.date_edit.dateChanged.connect(self.update_engineers_and_journal)
         # Устанавливаем текущую смену и дату
         self.set_current_shift_and_date()
-        
+
         # Подключаем обновление таблицы и списка инженеров к изменению смены и даты
         self.shift_combo.currentIndexChanged.connect(self.update_engineers_and_journal)
         self.date_edit.dateChanged.connect(self.update_engineers_and_journal)
-        
+
         # Загружаем данные для текущей смены и даты
         self.update_engineers_and_journal()
-        self.load_engineers()
+
+        # Изменения с других рабочих мест применяются по мере поступления уведомлений
+        self.pending_record_ids = set()
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.timeout.connect(self.fetch_changed_records)
+        self.listener = ChangeListener(pool.dsn, self.executor.thread_pool, self)
+        self.listener.changed.connect(self.apply_change)
+        self.listener.reconnected.connect(self.update_engineers_and_journal)
+        self.listener.reconnected.connect(self.flush_writes)
+
+        # Повторная отправка локальной очереди, пока сервер недоступен
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush_writes)
+        self.flush_timer.start(15000)
+        self.update_pending_label()
+        self.flush_writes()
+
+        # Фоновая синхронизация локальной реплики
+        self.mirror_timer = QTimer(self)
+        self.mirror_timer.timeout.connect(self.sync_mirror)
+        self.mirror_timer.start(60000)
+        self.listener.reconnected.connect(self.sync_mirror)
+        self.sync_mirror()
+
+        # Досылаем сводки смен, закончившихся, пока программа не работала или не было связи
+        if self.report_scheduler:
+            self.listener.reconnected.connect(self.report_scheduler.run)
+            self.report_scheduler.run()
+
+        # Настройка таймера для периодической проверки соединений пула
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.reconnect_if_needed)
+        self.timer.start(300000)  # Проверять соединение каждые 5 минут
+
+    def reconnect_if_needed(self):
+        """Проверяет доступность базы данных; неработоспособные соединения пул заменяет сам."""
+        try:
+            with self.pool.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except (psycopg2.InterfaceError, psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+            logging.error(f"База данных недоступна: {e}")
+        logging.info(f"Пул соединений: {self.pool.metrics()}")
+        logging.info(f"Кэш справочника инженеров: {self.engineer_directory.stats()}")
 
     def set_current_shift_and_date(self):
         """Устанавливает текущую смену и дату в shift_combo и date_edit."""
@@ -242,7 +2833,16 @@ class MainWindow(QWidget):
         self.send_email_action.triggered.connect(self.send_email)
         file_menu.addAction(self.engineers_list_action)
         file_menu.addAction(self.export_to_word_action)
+        self.export_range_action = QAction("Экспорт за период...", self)
+        self.export_range_action.triggered.connect(self.export_range)
+        file_menu.addAction(self.export_range_action)
+        self.batch_export_action = QAction("Пакетный экспорт в Word...", self)
+        self.batch_export_action.triggered.connect(self.batch_export)
+        file_menu.addAction(self.batch_export_action)
         file_menu.addAction(self.send_email_action)
+        self.import_action = QAction("Импорт журналов...", self)
+        self.import_action.triggered.connect(self.import_journals)
+        file_menu.addAction(self.import_action)
 
         # Меню "Справка"
         help_menu = self.menu_bar.addMenu("Справка")
@@ -408,7 +3008,24 @@ class MainWindow(QWidget):
         # Настройка политики размера для расширения таблицы
         self.table.setSizePolicy(self.table.sizePolicy().Expanding, self.table.sizePolicy().Expanding)
 
-        content_layout.addWidget(self.table)
+        # Подключаем обработчики событий
+        self.table.cellDoubleClicked.connect(self.enable_editing)
+        self.table.cellChanged.connect(self.update_record)
+
+        # Индикатор загрузки над таблицей
+        self.loading_label = QLabel("Загрузка данных...")
+        self.loading_label.hide()
+
+        # Количество записей, еще не отправленных на сервер
+        self.pending_label = QLabel()
+        self.pending_label.setStyleSheet("color: #b00020;")
+        self.pending_label.hide()
+
+        right_layout = QVBoxLayout()
+        right_layout.addWidget(self.loading_label)
+        right_layout.addWidget(self.table)
+        right_layout.addWidget(self.pending_label)
+        content_layout.addLayout(right_layout)
         main_layout.addLayout(content_layout)
         self.setLayout(main_layout)
 
@@ -421,6 +3038,12 @@ class MainWindow(QWidget):
         about_dialog = AboutDialog()
         about_dialog.exec_()
 
+    def set_loading(self, channel, loading):
+        """Показывает состояние загрузки таблицы журнала."""
+        if channel == "journal":
+            self.loading_label.setVisible(loading)
+            self.table.setEnabled(not loading)
+
     def auto_insert_colon(self):
             """Автоматически добавляет двоеточие после ввода двух символов."""
             text = self.time_edit.text()
@@ -460,101 +3083,49 @@ class MainWindow(QWidget):
 
     
     def send_email(self):
-        """Отправляет записи журнала текущей смены на указанный адрес в Outlook с улучшенным форматированием."""
+        """Отправляет записи журнала текущей смены адресатам из раздела [Mail] config.ini."""
+        if not self.mail_settings or not self.mail_settings["to"]:
+            QMessageBox.warning(
+                self, "Отправка", "Почта не настроена: укажите сервер и адресатов в разделе [Mail] файла config.ini."
+            )
+            return
         
             # Преобразуем дату из виджета
         raw_date = self.date_edit.date().toPyDate()  # Получаем объект типа `date`
 
-        # Формат для базы данных (yyyy-MM-dd)
-        date_for_db = raw_date.strftime("%Y-%m-%d")
-
         # Формат для сообщения (dd-MM-yyyy)
         date_for_message = raw_date.strftime("%d-%m-%Y")
 
-        try:
-            shift = self.shift_combo.currentText()
-            logging.info(f"Отправка отчета по смене {shift} за дату {date_for_message} начата.")
+        shift = self.shift_combo.currentText()
+        logging.info(f"Отправка отчета по смене {shift} за дату {date_for_message} начата.")
+        mail_settings = self.mail_settings
+        mail_queue = self.mail_queue
 
-            # Загружаем инженеров на смене
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT name FROM engineers WHERE date = %s AND shift = %s", (date_for_db, shift))
-            engineers = cursor.fetchall()
-            logging.info(f"Загружены инженеры на смене: {[engineer[0] for engineer in engineers]}")
+        def prepare(cursor):
+            # Формируем HTML-письмо по мере чтения записей смены серверным курсором
+            body = io.StringIO()
+            report_template("html").write(body, "begin")
+            reports = iter_shift_reports(cursor.connection, raw_date, raw_date, shift)
+            report = next(reports, None) or ShiftReport(raw_date, shift, [], iter(()))
+            logging.info(f"Загружены инженеры на смене: {report.engineers}")
+            entries_count = write_shift_html(body, report)
+            reports.close()
+            report_template("html").write(body, "end")
+            logging.info(f"Загружены записи журнала: {entries_count} записей.")
 
-            # Загружаем записи журнала с учетом сортировки времени для второй смены
-            cursor.execute(
-                """
-                SELECT time, content, note 
-                FROM journal 
-                WHERE date = %s AND shift = %s 
-                ORDER BY 
-                    CASE 
-                        WHEN shift = '2-я смена' AND time >= '00:00' AND time < '08:30' THEN date + INTERVAL '1 day'
-                        ELSE date
-                    END ASC,
-                    time ASC
-                """, 
-                (date_for_db, shift)
-            )
-            journal_entries = cursor.fetchall()
-            logging.info(f"Загружены записи журнала: {len(journal_entries)} записей.")
-
-            # Формируем HTML-таблицу с датой для сообщения
-            html_body = f"""
-            <html>
-            <head>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                    }}
-                    h2 {{
-                        color: #0056b3;
-                        border-bottom: 2px solid #0056b3;
-                        padding-bottom: 5px;
-                    }}
-                    table {{
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin-top: 10px;
-                    }}
-                    th, td {{
-                        padding: 8px;
-                        border: 1px solid #ddd;
-                    }}
-                    th {{
-                        background-color: #0056b3;
-                        color: white;
-                    }}
-                </style>
-            </head>
-            <body>
-                <h2>Смена: {shift}, Дата: {date_for_message}</h2>
-                <h3>Инженеры на смене:</h3>
-                <ul>
-                    {''.join(f'<li>{engineer[0]}</li>' for engineer in engineers)}
-                </ul>
-                <h3>Записи журнала:</h3>
-                <table>
-                    <tr><th>Время</th><th>Содержание</th><th>Примечание</th></tr>
-                    {''.join(f'<tr><td>{entry[0]}</td><td>{entry[1]}</td><td>{entry[2]}</td></tr>' for entry in journal_entries)}
-                </table>
-            </body>
-            </html>
-            """
-
-            # Отправляем письмо
-            outlook = win32.Dispatch("Outlook.Application")
-            mail = outlook.CreateItem(0)
-            mail.Subject = f"Сводка - {shift} от {date_for_message}"
-            mail.HTMLBody = html_body
-            mail.To = "v.ustimenko@bogatyr.kz"  # Замените на нужный адрес
-            mail.CC = "asutp01@bogatyr.kz"  # Добавьте адрес в копию
-            mail.Display()
-            logging.info("Письмо успешно создано и открыто в Outlook.")
+            # Письмо ставится в очередь и отправляется в фоне, интерфейс не ждет SMTP-сервер
+            mail_queue.enqueue(build_report_message(mail_settings, raw_date, shift, body.getvalue()))
+            return entries_count
 
-        except Exception as e:
-            logging.error(f"Ошибка при отправке письма: {e}")
-            QMessageBox.critical(self, "Ошибка отправки", f"Не удалось отправить сообщение: {e}")
+        self.executor.submit(None, prepare, self.on_email_queued, self.on_email_failed)
+
+    def on_email_queued(self, entries_count):
+        logging.info("Письмо поставлено в очередь отправки.")
+        QMessageBox.information(self, "Отправка", "Письмо поставлено в очередь отправки.")
+
+    def on_email_failed(self, error):
+        logging.error(f"Ошибка при отправке письма: {error}")
+        QMessageBox.critical(self, "Ошибка отправки", f"Не удалось отправить сообщение: {error}")
 
 
     def format_journal_data(self):
@@ -569,6 +3140,137 @@ class MainWindow(QWidget):
             data += f"Дата: {date}, Смена: {shift}, Время: {time}\nСодержание: {content}\nПримечание: {note}\n\n"
         return data
     
+    def on_mail_sent(self, subject):
+        logging.info(f"Отправлено письмо: {subject}")
+
+    def on_mail_failed(self, subject, error):
+        QMessageBox.warning(self, "Ошибка отправки", f"Не удалось отправить письмо '{subject}':\n{error}")
+
+    def export_range(self):
+        """Экспортирует журнал за произвольный период (месяц, год) в выбранные форматы в фоне."""
+        dialog = DateRangeDialog(self, formats=EXPORTERS)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        date_from, date_to = dialog.period()
+        directory = QFileDialog.getExistingDirectory(self, "Папка для файлов журнала")
+        if not directory:
+            logging.info("Экспорт за период отменен пользователем.")
+            return
+        base_name = os.path.join(directory, f"Журнал_{date_from:%d.%m.%Y}-{date_to:%d.%m.%Y}")
+        exporters = [EXPORTERS[extension](f"{base_name}.{extension}") for extension in dialog.selected_formats()]
+        file_paths = [exporter.path for exporter in exporters]
+
+        self.export_progress = QProgressDialog("Экспорт...", "Прервать", 0, 0, self)
+        self.export_progress.setWindowTitle("Экспорт за период")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+        cancel_event = threading.Event()
+        self.export_progress.canceled.connect(cancel_event.set)
+
+        signals = ExportSignals(self)
+        signals.progress.connect(
+            lambda shifts, entries: self.export_progress.setLabelText(f"Смен: {shifts}, записей: {entries}")
+        )
+        logging.info(f"Экспорт журнала за {date_from} - {date_to} в {file_paths}")
+        self.executor.submit(
+            None,
+            lambda cursor: export_range(
+                cursor.connection, date_from, date_to, exporters, signals.progress.emit, cancel_event.is_set
+            ),
+            lambda stats: self.on_range_exported(stats, file_paths),
+            self.on_range_export_failed
+        )
+
+    def on_range_exported(self, stats, file_paths):
+        self.export_progress.close()
+        if stats["cancelled"]:
+            QMessageBox.information(self, "Экспорт прерван", "Экспорт за период прерван, файлы не сохранены.")
+            return
+        QMessageBox.information(
+            self, "Экспорт завершен",
+            f"Экспортировано смен: {stats['shifts']}, записей: {stats['entries']}.\nФайлы:\n" + "\n".join(file_paths)
+        )
+
+    def on_range_export_failed(self, error):
+        self.export_progress.close()
+        logging.error(f"Ошибка при экспорте за период: {error}")
+        QMessageBox.critical(self, "Ошибка экспорта", f"Не удалось выполнить экспорт: {error}")
+
+    def batch_export(self):
+        """Экспортирует период в Word по файлу на смену или на неделю в пуле процессов."""
+        if getattr(self, "batch_executor", None):
+            QMessageBox.warning(self, "Пакетный экспорт", "Пакетный экспорт уже выполняется.")
+            return
+        dialog = DateRangeDialog(self, "Пакетный экспорт в Word", ["На каждую смену", "На каждую неделю"])
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        date_from, date_to = dialog.period()
+        directory = QFileDialog.getExistingDirectory(self, "Папка для файлов журнала")
+        if not directory:
+            logging.info("Пакетный экспорт отменен пользователем.")
+            return
+
+        jobs = batch_export_jobs(date_from, date_to, dialog.mode() == 1, directory)
+        logging.info(f"Пакетный экспорт за {date_from} - {date_to}: {len(jobs)} заданий в {directory}")
+        self.batch_results = []
+        self.batch_errors = []
+        self.batch_done = 0
+        self.batch_cancelled = False
+
+        self.batch_progress = QProgressDialog("Экспорт...", "Прервать", 0, len(jobs), self)
+        self.batch_progress.setWindowTitle("Пакетный экспорт в Word")
+        self.batch_progress.setWindowModality(Qt.WindowModal)
+        self.batch_progress.setMinimumDuration(0)
+        self.batch_progress.setAutoClose(False)
+        self.batch_progress.setAutoReset(False)
+        self.batch_progress.canceled.connect(self.cancel_batch_export)
+
+        # Рендеринг идет в отдельных процессах; о завершении задания сообщает сигнал
+        signals = BatchExportSignals(self)
+        signals.done.connect(self.on_batch_file_done)
+        self.batch_executor = concurrent.futures.ProcessPoolExecutor(max_workers=BATCH_EXPORT_WORKERS)
+        self.batch_futures = []
+        for job in jobs:
+            future = self.batch_executor.submit(export_batch_file, self.pool.dsn, *job)
+            future.add_done_callback(signals.done.emit)
+            self.batch_futures.append(future)
+
+    def on_batch_file_done(self, future):
+        self.batch_done += 1
+        if not future.cancelled():
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Ошибка пакетного экспорта: {e}")
+                self.batch_errors.append(str(e))
+            else:
+                if result:
+                    self.batch_results.append(result)
+        self.batch_progress.setValue(self.batch_done)
+        self.batch_progress.setLabelText(f"Файлов: {len(self.batch_results)}, обработано заданий: {self.batch_done}")
+        if self.batch_done == len(self.batch_futures):
+            self.finish_batch_export()
+
+    def cancel_batch_export(self):
+        """Отменяет задания, которые еще не начали выполняться; текущие файлы дописываются."""
+        self.batch_cancelled = True
+        self.batch_progress.setLabelText("Отмена, дожидаемся текущих файлов...")
+        for future in self.batch_futures:
+            future.cancel()
+
+    def finish_batch_export(self):
+        self.batch_executor.shutdown(wait=False)
+        self.batch_executor = None
+        self.batch_progress.close()
+        entries = sum(result[2] for result in self.batch_results)
+        message = f"Создано файлов: {len(self.batch_results)}, записей: {entries}."
+        if self.batch_cancelled:
+            message = "Пакетный экспорт прерван. " + message
+        if self.batch_errors:
+            message += f"\nОшибок: {len(self.batch_errors)}, первая: {self.batch_errors[0]}"
+        logging.info(message)
+        QMessageBox.information(self, "Пакетный экспорт", message)
+
     def export_to_word(self):
         """Экспортирует журнал и список инженеров в файл Word с оформлением."""
 
@@ -578,140 +3280,171 @@ class MainWindow(QWidget):
         shift = self.shift_combo.currentText()
         logging.info(f"Начат экспорт журнала для смены: {shift} на дату: {formatted_date}")
 
-        try:
-            # Запрашиваем инженеров на смене
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT name FROM engineers WHERE date = %s AND shift = %s", (date, shift))
-            engineers = cursor.fetchall()
-            logging.info(f"Загружены инженеры на смене: {[engineer[0] for engineer in engineers]}")
-
-            # Запрашиваем записи журнала
-            cursor.execute("SELECT time, content, note FROM journal WHERE date = %s AND shift = %s", (date, shift))
-            journal_entries = cursor.fetchall()
-            logging.info(f"Загружены записи журнала: {len(journal_entries)} записей.")
-
-            # Создаем новый документ Word
-            doc = Document()
-            title = doc.add_heading(f"Журнал смены: {shift}, Дата: {formatted_date}", level=1)
-            title_run = title.runs[0]
-            title_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
-
-            # Добавляем раздел с инженерами на смене
-            engineers_heading = doc.add_heading("Инженеры на смене:", level=2)
-            engineers_heading_run = engineers_heading.runs[0]
-            engineers_heading_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
-
-            for engineer in engineers:
-                doc.add_paragraph(engineer[0], style="List Bullet")
-
-            # Создаем таблицу для записей журнала
-            records_heading = doc.add_heading("Записи журнала:", level=2)
-            records_heading_run = records_heading.runs[0]
-            records_heading_run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовка
-
-            table = doc.add_table(rows=1, cols=3)
-            table.style = "Table Grid"
-
-            # Заголовок таблицы
-            hdr_cells = table.rows[0].cells
-            hdr_cells[0].text = "Время"
-            hdr_cells[1].text = "Содержание"
-            hdr_cells[2].text = "Примечание"
-
-            # Применяем стиль заголовков таблицы
-            for cell in hdr_cells:
-                for paragraph in cell.paragraphs:
-                    run = paragraph.runs[0]
-                    run.bold = True
-                    run.font.size = Pt(11)
-                    run.font.color.rgb = RGBColor(0, 85, 179)  # Синий цвет заголовков
-
-            # Добавляем записи журнала в таблицу
-            for entry in journal_entries:
-                row_cells = table.add_row().cells
-                row_cells[0].text = entry[0].strftime("%H:%M")  # Время
-                row_cells[1].text = entry[1]  # Содержание
-                row_cells[2].text = entry[2]  # Примечание
-
-            # Открываем диалоговое окно для сохранения файла
-            options = QFileDialog.Options()
-            file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить журнал как", f"Журнал_{shift}_{formatted_date}.docx", "Word Files (*.docx)", options=options)
-
-            # Сохраняем файл
-            if file_path:
-                try:
-                    doc.save(file_path)
-                    QMessageBox.information(self, "Экспорт завершен", f"Журнал успешно экспортирован в файл {file_path}.")
-                    logging.info(f"Журнал успешно экспортирован в файл: {file_path}")
-                except Exception as e:
-                    logging.error(f"Ошибка при сохранении файла: {e}")
-                    QMessageBox.critical(self, "Ошибка экспорта", f"Не удалось сохранить файл: {e}")
-            else:
-                logging.info("Экспорт отменен пользователем.")
+        # Открываем диалоговое окно для сохранения файла
+        options = QFileDialog.Options()
+        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить журнал как", f"Журнал_{shift}_{formatted_date}.docx", "Word Files (*.docx)", options=options)
+        if not file_path:
+            logging.info("Экспорт отменен пользователем.")
+            return
 
-        except Exception as e:
-            logging.error(f"Ошибка при экспорте журнала: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при экспорте: {e}")
+        def export(cursor):
+            # Записи смены читаются серверным курсором и сразу пишутся в документ
+            reports = iter_shift_reports(cursor.connection, date, date, shift)
+            report = next(reports, None) or ShiftReport(date, shift, [], iter(()))
+            logging.info(f"Загружены инженеры на смене: {report.engineers}")
+            entries_count = docx_report_writer().write(
+                file_path, shift_document_title(shift, date), report.engineers, report_rows(report.entries)
+            )
+            reports.close()
+            logging.info(f"Загружены записи журнала: {entries_count} записей.")
+            return entries_count
+
+        self.executor.submit(
+            None, export, lambda entries_count: self.on_word_exported(file_path), self.on_word_export_failed
+        )
+
+    def on_word_exported(self, file_path):
+        QMessageBox.information(self, "Экспорт завершен", f"Журнал успешно экспортирован в файл {file_path}.")
+        logging.info(f"Журнал успешно экспортирован в файл: {file_path}")
+
+    def on_word_export_failed(self, error):
+        logging.error(f"Ошибка при экспорте журнала: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при экспорте: {error}")
+
+
+
+
+    def import_journals(self):
+        """Загружает исторические журналы или составы смен из CSV/XLSX в фоне."""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Импорт журналов", "", "Журналы (*.csv *.xlsx);;CSV (*.csv);;Excel (*.xlsx)"
+        )
+        if not file_path:
+            return
+        tables = {"Записи журнала": "journal", "Инженеры смен": "engineers"}
+        table_name, ok = QInputDialog.getItem(self, "Импорт журналов", "Что содержит файл:", list(tables), 0, False)
+        if not ok:
+            return
 
+        self.import_progress = QProgressDialog("Импорт...", "Прервать", 0, 0, self)
+        self.import_progress.setWindowTitle("Импорт журналов")
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        cancel_event = threading.Event()
+        self.import_progress.canceled.connect(cancel_event.set)
+
+        signals = ImportSignals(self)
+        signals.progress.connect(
+            lambda loaded, rejected, rate: self.import_progress.setLabelText(
+                f"Загружено: {loaded}, отклонено: {rejected}\n{rate:.0f} строк/с"
+            )
+        )
+        importer = BulkImporter(tables[table_name], progress=signals.progress.emit, cancelled=cancel_event.is_set)
+        logging.info(f"Импорт {file_path} в {tables[table_name]}")
+        self.executor.submit(
+            None, lambda cursor: importer.run(cursor, file_path), self.on_import_finished, self.on_import_failed
+        )
 
+    def on_import_finished(self, stats):
+        self.import_progress.close()
+        message = (
+            f"Загружено строк: {stats['loaded']} за {stats['seconds']:.1f} с "
+            f"({stats['rows_per_second']:.0f} строк/с)."
+        )
+        if stats["cancelled"]:
+            message += "\nИмпорт прерван, загруженные порции сохранены."
+        if stats["rejected"]:
+            message += f"\nОтклонено строк: {stats['rejected']}, см. {stats['rejected_path']}"
+        QMessageBox.information(self, "Импорт завершен", message)
+        self.update_engineers_and_journal()
 
+    def on_import_failed(self, error):
+        self.import_progress.close()
+        logging.error(f"Ошибка импорта: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить импорт: {error}")
 
     def open_engineers_list(self):
         """Открывает окно списка инженеров."""
         logging.info("Открытие окна списка инженеров.")
         try:
-            self.engineers_list_window = EngineersListWindow(self.connection, self)
+            self.engineers_list_window = EngineersListWindow(self.pool, self)
             self.engineers_list_window.exec_()
             logging.info("Окно списка инженеров открыто.")
         except Exception as e:
             logging.error(f"Ошибка при открытии окна списка инженеров: {e}")
 
-        # Подключаем обновление таблицы и списка инженеров к изменению смены и даты
-        self.shift_combo.currentIndexChanged.connect(self.update_engineers_and_journal)
-        self.date_edit.dateChanged.connect(self.update_engineers_and_journal)
-
     def update_engineers_and_journal(self):
         """Обновляет список инженеров и журнал."""
         logging.info("Обновление инженеров и журнала.")
         try:
+            self.show_cached_shift()  # Сразу с диска, затем перепроверка на сервере
             self.load_engineers()
             self.load_journal_data()
             logging.info("Инженеры и журнал успешно обновлены.")
         except Exception as e:
             logging.error(f"Ошибка при обновлении инженеров и журнала: {e}")
 
+    def show_cached_shift(self):
+        """Показывает выбранную смену из локальной реплики, если она там есть."""
+        date = self.date_edit.date().toString("yyyy-MM-dd")
+        shift = self.shift_combo.currentText()
+        try:
+            cached = self.mirror.load_shift(date, shift)
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка чтения локальной реплики: {e}")
+            return
+        if cached is None:
+            return
+        records, engineers, directory = cached
+        self.fill_journal_table(records)
+        self.fill_engineers((directory, engineers))
+
+    def sync_mirror(self):
+        """Запускает фоновую синхронизацию локальной реплики."""
+        self.executor.submit("mirror", self.mirror.sync, on_error=self.on_mirror_sync_failed)
+
+    def on_mirror_sync_failed(self, error):
+        logging.warning(f"Не удалось синхронизировать локальную реплику, повтор позже: {error}")
+
     def load_engineers(self):
-        """Загружает список инженеров в ComboBox и обновляет QListWidget для выбранной смены и даты."""
+        """Запрашивает в фоне список инженеров и инженеров выбранной смены и даты."""
         logging.info("Загрузка списка инженеров.")
-        try:
-            self.engineer_select_combo.clear()
-            self.engineer_list.clear()
 
-            # Получаем выбранную дату и смену
-            date = self.date_edit.date().toString("yyyy-MM-dd")
-            shift = self.shift_combo.currentText()
-            logging.info(f"Дата: {date}, Смена: {shift}")
-
-            cursor = self.connection.cursor()
+        # Получаем выбранную дату и смену
+        date = self.date_edit.date().toString("yyyy-MM-dd")
+        shift = self.shift_combo.currentText()
+        logging.info(f"Дата: {date}, Смена: {shift}")
 
-            # Загружаем всех инженеров для добавления в смену
-            cursor.execute("SELECT full_name FROM engineers_info")
-            all_engineers = cursor.fetchall()
-            for engineer in all_engineers:
-                self.engineer_select_combo.addItem(engineer[0])
-            logging.info("Все инженеры успешно загружены в ComboBox.")
+        def query(cursor):
+            # Все инженеры для добавления в смену (из кэша, если справочник не менялся)
+            all_engineers = self.engineer_directory.get(cursor)
 
-            # Загружаем инженеров, уже добавленных на текущую смену и дату
+            # Инженеры, уже добавленные на выбранную смену и дату
             cursor.execute(
                 "SELECT name FROM engineers WHERE date = %s AND shift = %s",
                 (date, shift)
             )
-            engineers = cursor.fetchall()
-            for engineer in engineers:
-                self.engineer_list.addItem(engineer[0])
-            logging.info("Инженеры для текущей смены и даты успешно загружены.")
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке списка инженеров: {e}")
+            return all_engineers, cursor.fetchall()
+
+        self.executor.submit("engineers", query, self.fill_engineers)
+
+    def fill_engineers(self, result):
+        """Заполняет ComboBox и QListWidget результатом load_engineers."""
+        all_engineers, engineers = result
+        self.engineer_list.clear()
+
+        # ComboBox перестраивается, только если справочник изменился: реплика и кэш
+        # EngineerDirectory отдают разные экземпляры списка с одинаковым содержимым
+        if all_engineers != self.shown_directory:
+            self.engineer_select_combo.clear()
+            for engineer in all_engineers:
+                self.engineer_select_combo.addItem(engineer[0])
+            self.shown_directory = all_engineers
+            logging.info("Все инженеры успешно загружены в ComboBox.")
+
+        for engineer in engineers:
+            self.engineer_list.addItem(engineer[0])
+        logging.info("Инженеры для текущей смены и даты успешно загружены.")
 
 
     def add_engineer(self):
@@ -730,12 +3463,11 @@ class MainWindow(QWidget):
             self.engineer_list.addItem(engineer)
             
             try:
-                cursor = self.connection.cursor()
-                cursor.execute(
-                    "INSERT INTO engineers (shift, date, name) VALUES (%s, %s, %s)",
-                    (current_shift, shift_date, engineer)
-                )
-                self.connection.commit()
+                with self.pool.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO engineers (shift, date, name) VALUES (%s, %s, %s)",
+                        (current_shift, shift_date, engineer)
+                    )
                 logging.info(f"Инженер {engineer} успешно добавлен в смену {current_shift} на дату {shift_date}.")
             except Exception as e:
                 logging.error(f"Ошибка при добавлении инженера {engineer} в базу данных: {e}")
@@ -761,12 +3493,11 @@ class MainWindow(QWidget):
 
             try:
                 # Удаляем инженера из базы данных только для текущей смены и даты
-                cursor = self.connection.cursor()
-                cursor.execute(
-                    "DELETE FROM engineers WHERE shift=%s AND date=%s AND name=%s",
-                    (current_shift, shift_date, engineer)
-                )
-                self.connection.commit()
+                with self.pool.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM engineers WHERE shift=%s AND date=%s AND name=%s",
+                        (current_shift, shift_date, engineer)
+                    )
                 logging.info(f"Инженер {engineer} успешно удален из базы данных.")
                 
                 # Удаляем инженера из QListWidget
@@ -779,25 +3510,10 @@ class MainWindow(QWidget):
 
     def get_current_shift_and_date(self):
         """Определяет текущую смену и соответствующую ей дату."""
-        current_time = QTime.currentTime()
-        current_date = QDate.currentDate()
-
-        shift_start_1 = QTime(8, 30)
-        shift_end_1 = QTime(20, 30)
-        shift_start_2 = QTime(20, 30)
-        shift_end_2 = QTime(8, 30)
-
-        # Определяем смену и дату начала смены
-        if shift_start_1 <= current_time < shift_end_1:
-            return "1-я смена", current_date.toString("yyyy-MM-dd")
-        elif current_time >= shift_start_2 or current_time < shift_end_2:
-            # Вторая смена, для времени после полуночи - дата предыдущего дня
-            shift_date = current_date.addDays(-1) if current_time < shift_end_2 else current_date
-            return "2-я смена", shift_date.toString("yyyy-MM-dd")
-        return None, None
+        shift, shift_date = shift_at(datetime.datetime.now())
+        return shift, shift_date.isoformat()
 
     def add_record(self):
-        self.reconnect_if_needed()  # Проверка соединения перед добавлением записи
         """Добавляет запись в журнал только за текущую смену и дату начала этой смены."""
 
         logging.info("Начало выполнения add_record")
@@ -834,29 +3550,75 @@ class MainWindow(QWidget):
 
         logging.info(f"Дата: {date}, Смена: {shift}, Время: {time}, Контент: {content}, Примечание: {note}")
 
-        # Вставка записи в базу данных
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "INSERT INTO journal (date, shift, time, content, note) VALUES (%s, %s, %s, %s, %s)",
-                (date, shift, time, content, note)
-            )
-            self.connection.commit()
-            logging.info("Запись успешно добавлена в базу данных.")
-        except Exception as e:
-            self.connection.rollback()  # Выполняем откат транзакции при ошибке
-            logging.error(f"Ошибка при добавлении записи в базу данных: {e}")
-            QMessageBox.warning(self, "Ошибка", f"Не удалось добавить запись: {e}")
-            return
+        # Запись сначала сохраняется в локальной очереди и сразу показывается в таблице,
+        # на сервер она отправляется в фоне (повторно, если сервер недоступен)
+        client_uuid = str(uuid.uuid4())
+        self.enqueue_write("insert", client_uuid, {
+            "date": date, "shift": shift, "time": time, "content": content, "note": note
+        })
+        self.upsert_journal_row(
+            (None, date, shift, time, content, note, event_timestamp(date, shift, time), client_uuid)
+        )
 
-        # Обновляем данные в таблице и очищаем поля
-        self.load_journal_data()
         self.clear_input_fields()  # Очистка полей ввода
         QMessageBox.information(self, "Успешно", "Запись добавлена!")
         logging.info("Функция add_record завершена успешно.")
 
+    def enqueue_write(self, op, client_uuid, payload=None):
+        """Сохраняет операцию в локальной очереди и запускает отправку на сервер."""
+        self.write_queue.enqueue(op, client_uuid, payload or {})
+        self.update_pending_label()
+        self.flush_writes()
+
+    def flush_writes(self):
+        """Отправляет локальную очередь на сервер в фоне, если она не пуста."""
+        if self.flush_in_progress or not self.write_queue.count():
+            return
+        self.flush_in_progress = True
+        self.executor.submit(None, self.write_queue.flush, self.on_writes_flushed, self.on_writes_flush_failed)
+
+    def on_writes_flushed(self, result):
+        """Применяет к таблице записи, сохраненные сервером."""
+        self.flush_in_progress = False
+        for record in result["upserted"]:
+            self.upsert_journal_row(record)
+        if result["rejected"]:
+            # Отклоненные сервером записи убираем из таблицы, остальное восстановит перезагрузка
+            self.load_journal_data()
+            QMessageBox.warning(
+                self, "Ошибка",
+                f"Сервер отклонил операций: {len(result['rejected'])}. Подробности в журнале приложения."
+            )
+        self.update_pending_label()
+        self.flush_writes()  # Следующая пачка, если очередь еще не пуста
+
+    def on_writes_flush_failed(self, error):
+        self.flush_in_progress = False
+        logging.warning(f"Не удалось отправить локальную очередь, повтор позже: {error}")
+        self.update_pending_label()
+
+    def update_pending_label(self):
+        count = self.write_queue.count()
+        self.pending_label.setText(f"Не отправлено на сервер операций: {count}")
+        self.pending_label.setVisible(count > 0)
+
+    def apply_pending_writes(self):
+        """Накладывает на таблицу операции, которые еще не дошли до сервера."""
+        self.table.blockSignals(True)
+        for _, op, client_uuid, payload in self.write_queue.pending():
+            row = self.find_journal_row_by_uuid(client_uuid)
+            if op == "insert" and row == -1:
+                self.upsert_journal_row((
+                    None, payload["date"], payload["shift"], payload["time"], payload["content"], payload["note"],
+                    event_timestamp(payload["date"], payload["shift"], payload["time"]), client_uuid
+                ))
+            elif op == "update" and row != -1:
+                column = {"time": 2, "content": 3, "note": 4}[payload["field"]]
+                self.table.item(row, column).setText(payload["value"])
+            elif op == "delete" and row != -1:
+                self.table.removeRow(row)
+        self.table.blockSignals(False)
 
-    
     def clear_input_fields(self):
         """Очищает поля ввода времени, содержания и примечания."""
         self.time_edit.clear()
@@ -864,7 +3626,32 @@ class MainWindow(QWidget):
         self.note_edit.clear()
 
     def load_journal_data(self):
-        """Загружает данные из таблицы journal и разрешает редактирование полей 'Время', 'Содержание' и 'Примечание' только для текущей смены и даты при двойном нажатии."""
+        """Запрашивает в фоне записи журнала выбранной смены и даты.
+
+        Пока запрос выполняется, таблица находится в состоянии загрузки. Если
+        дата или смена изменятся до прихода ответа, устаревший результат будет
+        отброшен исполнителем запросов.
+        """
+        # Получаем выбранную дату и смену
+        date = self.date_edit.date().toString("yyyy-MM-dd")
+        shift = self.shift_combo.currentText()
+
+        def query(cursor):
+            cursor.execute(
+                """
+                SELECT id, date, shift, time, content, note, event_ts, client_uuid
+                FROM journal 
+                WHERE date = %s AND shift = %s 
+                ORDER BY event_ts, id
+                """,
+                (date, shift)
+            )
+            return cursor.fetchall()
+
+        self.executor.submit("journal", query, self.fill_journal_table)
+
+    def fill_journal_table(self, records):
+        """Заполняет таблицу записями журнала и разрешает редактирование полей 'Время', 'Содержание' и 'Примечание' только для текущей смены и даты при двойном нажатии."""
 
         # Отключаем обработчик изменений временно, чтобы избежать случайного сохранения при загрузке
         self.table.blockSignals(True)
@@ -873,27 +3660,6 @@ class MainWindow(QWidget):
         # Получаем текущую смену и её дату
         current_shift, current_date = self.get_current_shift_and_date()
 
-        # Получаем выбранную дату и смену
-        date = self.date_edit.date().toString("yyyy-MM-dd")
-        shift = self.shift_combo.currentText()
-
-        cursor = self.connection.cursor()
-        cursor.execute(
-            """
-            SELECT id, date, shift, time, content, note 
-            FROM journal 
-            WHERE date = %s AND shift = %s 
-            ORDER BY 
-                CASE 
-                    WHEN shift = '2-я смена' AND time >= '00:00' AND time < '08:30' THEN date + INTERVAL '1 day'
-                    ELSE date
-                END ASC,
-                time ASC
-            """,
-            (date, shift)
-        )
-        records = cursor.fetchall()
-
         # Устанавливаем количество строк в таблице
         self.table.setRowCount(len(records))
         self.table.setColumnCount(5)
@@ -901,28 +3667,97 @@ class MainWindow(QWidget):
 
         # Заполняем таблицу данными
         for row_index, row_data in enumerate(records):
-            record_id, record_date, record_shift, record_time, record_content, record_note = row_data
+            self.set_journal_row(row_index, row_data, current_shift, current_date)
 
-            # Устанавливаем данные в ячейки и добавляем ID записи как пользовательские данные
-            for column_index, item in enumerate([record_date, record_shift, record_time, record_content, record_note]):
-                cell = QTableWidgetItem(str(item))
-                if column_index == 0:
-                    cell.setData(Qt.UserRole, record_id)  # Сохраняем ID записи в ячейке даты
-                self.table.setItem(row_index, column_index, cell)
+        # Включаем обработчик изменений
+        self.table.blockSignals(False)
 
-                # Разрешаем редактирование только для текущей смены и даты, и для полей "Время", "Содержание", "Примечание"
-                if record_date == current_date and record_shift == current_shift and column_index in [2, 3, 4]:
-                    cell.setFlags(cell.flags() | Qt.ItemIsEditable)  # Разрешаем редактирование
-                else:
-                    cell.setFlags(cell.flags() & ~Qt.ItemIsEditable)  # Остальные ячейки только для чтения
+        # Операции из локальной очереди, еще не отправленные на сервер
+        self.apply_pending_writes()
+
+    def set_journal_row(self, row_index, record, current_shift, current_date):
+        """Заполняет строку таблицы записью в порядке JOURNAL_RECORD_COLUMNS.
+
+        Запись с id None еще не отправлена на сервер и выделяется курсивом.
+        """
+        (record_id, record_date, record_shift, record_time, record_content, record_note,
+         record_event_ts, record_uuid) = record
+
+        # Устанавливаем данные в ячейки и добавляем ID записи как пользовательские данные
+        for column_index, item in enumerate([record_date, record_shift, record_time, record_content, record_note]):
+            cell = QTableWidgetItem(str(item))
+            if column_index == 0:
+                cell.setData(Qt.UserRole, record_id)  # Сохраняем ID записи в ячейке даты
+                # Ключ сортировки строки для вставки новых записей на свое место
+                cell.setData(Qt.UserRole + 1, record_event_ts.isoformat() if record_event_ts else "")
+                cell.setData(Qt.UserRole + 2, str(record_uuid))  # Идентификатор для локальной очереди
+            if record_id is None:
+                font = cell.font()
+                font.setItalic(True)
+                cell.setFont(font)
+                cell.setToolTip("Запись еще не отправлена на сервер")
+            self.table.setItem(row_index, column_index, cell)
+
+            # Разрешаем редактирование только для текущей смены и даты, и для полей "Время", "Содержание", "Примечание"
+            if str(record_date) == current_date and record_shift == current_shift and column_index in [2, 3, 4]:
+                cell.setFlags(cell.flags() | Qt.ItemIsEditable)  # Разрешаем редактирование
+            else:
+                cell.setFlags(cell.flags() & ~Qt.ItemIsEditable)  # Остальные ячейки только для чтения
 
-        # Подключаем обработчики событий
-        self.table.cellDoubleClicked.connect(self.enable_editing)
-        self.table.cellChanged.connect(self.update_record)
+    def journal_row_key(self, row):
+        """Ключ сортировки строки таблицы: (event_ts, id)."""
+        item = self.table.item(row, 0)
+        return (item.data(Qt.UserRole + 1), item.data(Qt.UserRole) or 0)
 
-        # Включаем обработчик изменений
+    def find_journal_row(self, record_id):
+        """Возвращает номер строки записи с указанным ID или -1."""
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.UserRole) == record_id:
+                return row
+        return -1
+
+    def find_journal_row_by_uuid(self, client_uuid):
+        """Возвращает номер строки записи с указанным client_uuid или -1."""
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.UserRole + 2) == str(client_uuid):
+                return row
+        return -1
+
+    def upsert_journal_row(self, record):
+        """Вставляет или заменяет строку записи на ее месте по (event_ts, id) без перезагрузки таблицы."""
+        record_date, record_shift = str(record[1]), record[2]
+        if (record_date != self.date_edit.date().toString("yyyy-MM-dd")
+                or record_shift != self.shift_combo.currentText()):
+            return  # Запись не относится к отображаемой смене
+
+        self.table.blockSignals(True)
+        # Ищем по client_uuid: так находится и строка, еще не отправленная на сервер
+        existing_row = self.find_journal_row_by_uuid(record[7])
+        if existing_row != -1:
+            self.table.removeRow(existing_row)
+
+        # Двоичный поиск позиции среди уже отсортированных строк
+        key = (record[6].isoformat() if record[6] else "", record[0] or 0)
+        low, high = 0, self.table.rowCount()
+        while low < high:
+            middle = (low + high) // 2
+            if self.journal_row_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        current_shift, current_date = self.get_current_shift_and_date()
+        self.table.insertRow(low)
+        self.set_journal_row(low, record, current_shift, current_date)
         self.table.blockSignals(False)
 
+    def remove_journal_row(self, record_id):
+        """Удаляет строку записи из таблицы без перезагрузки."""
+        row = self.find_journal_row(record_id)
+        if row != -1:
+            self.table.removeRow(row)
 
     def enable_editing(self, row, column):
         """Разрешает редактирование ячейки только при двойном клике, если это текущая смена и дата."""
@@ -952,9 +3787,9 @@ class MainWindow(QWidget):
         if record_date != current_date or record_shift != current_shift:
             return
 
-        # Получаем ID записи
-        record_id = self.table.item(row, 0).data(Qt.UserRole)
-        if not record_id:
+        # Получаем идентификатор записи для локальной очереди
+        client_uuid = self.table.item(row, 0).data(Qt.UserRole + 2)
+        if not client_uuid:
             return
 
         # Получаем новое значение ячейки
@@ -967,10 +3802,9 @@ class MainWindow(QWidget):
         if not field:
             return
 
-        # Обновляем запись в базе данных
-        cursor = self.connection.cursor()
-        cursor.execute(f"UPDATE journal SET {field} = %s WHERE id = %s", (new_value, record_id))
-        self.connection.commit()
+        # Изменение проходит через локальную очередь; сохраненная сервером запись
+        # займет свое место в таблице, если изменилось время
+        self.enqueue_write("update", client_uuid, {"field": field, "value": new_value})
 
 
 
@@ -998,6 +3832,7 @@ class MainWindow(QWidget):
 
         # Получаем ID записи, дату, смену и время
         record_id = self.table.item(selected_row, 0).data(Qt.UserRole)  # ID записи сохранен в UserRole
+        client_uuid = self.table.item(selected_row, 0).data(Qt.UserRole + 2)
         date = self.table.item(selected_row, 0).text()
         shift = self.table.item(selected_row, 1).text()
         time = self.table.item(selected_row, 2).text()
@@ -1026,29 +3861,78 @@ class MainWindow(QWidget):
             logging.info("Удаление записи отменено пользователем.")
             return
 
-        # Удаление записи из базы данных с использованием ID
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute("DELETE FROM journal WHERE id = %s", (record_id,))
-            self.connection.commit()
-            logging.info("Запись успешно удалена из базы данных.")
-        except Exception as e:
-            logging.error(f"Ошибка при удалении записи из базы данных: {e}")
-            QMessageBox.warning(self, "Ошибка", f"Не удалось удалить запись: {e}")
-            return
-
-        # Обновляем данные таблицы после удаления
-        self.load_journal_data()
+        # Удаление проходит через локальную очередь, строка убирается сразу
+        self.enqueue_write("delete", client_uuid)
+        self.table.blockSignals(True)
+        self.table.removeRow(selected_row)
+        self.table.blockSignals(False)
         QMessageBox.information(self, "Успешно", "Запись удалена!")
         logging.info("Функция delete_record завершена успешно.")
 
+    def apply_change(self, change):
+        """Применяет уведомление об изменении journal или engineers к отображаемой смене."""
+        if change["table"] == "engineers_info":
+            # Справочник изменен на другом рабочем месте
+            self.engineer_directory.invalidate()
+            self.load_engineers()
+            return
+
+        if change["op"] == "IMPORT":
+            # Массовый импорт присылает одно уведомление без строк
+            self.update_engineers_and_journal()
+            return
+
+        if (change.get("date") != self.date_edit.date().toString("yyyy-MM-dd")
+                or change.get("shift") != self.shift_combo.currentText()):
+            return
 
+        if change["table"] == "journal":
+            if change["op"] == "DELETE":
+                self.pending_record_ids.discard(change["id"])
+                self.table.blockSignals(True)
+                self.remove_journal_row(change["id"])
+                self.table.blockSignals(False)
+            else:
+                # Текст записи в уведомление не входит; близкие по времени изменения читаем одним запросом
+                self.pending_record_ids.add(change["id"])
+                self.change_timer.start(100)
+        elif change["table"] == "engineers":
+            names = [self.engineer_list.item(i).text() for i in range(self.engineer_list.count())]
+            if change["op"] == "DELETE" and change["name"] in names:
+                self.engineer_list.takeItem(names.index(change["name"]))
+            elif change["op"] == "INSERT" and change["name"] not in names:
+                self.engineer_list.addItem(change["name"])
+
+    def fetch_changed_records(self):
+        """Читает записи, о добавлении или изменении которых пришли уведомления."""
+        record_ids = list(self.pending_record_ids)
+        self.pending_record_ids.clear()
+
+        def query(cursor):
+            cursor.execute(
+                f"SELECT {JOURNAL_RECORD_SELECT} FROM journal WHERE id = ANY(%s)",
+                (record_ids,)
+            )
+            return cursor.fetchall()
 
+        self.executor.submit(None, query, self.apply_changed_records)
 
+    def apply_changed_records(self, records):
+        for record in records:
+            self.upsert_journal_row(record)
 
     def closeEvent(self, event):
-        if self.connection:
-            self.connection.close()
+        self.listener.close()
+        if self.mail_queue:
+            self.mail_queue.stop()  # Неотправленные письма останутся в outbox.db
+        if getattr(self, "batch_executor", None):
+            for future in self.batch_futures:
+                future.cancel()
+            self.batch_executor.shutdown(wait=False)
+        # Дожидаемся фоновых запросов, чтобы не закрыть занятые ими соединения
+        self.executor.thread_pool.waitForDone(5000)
+        if self.pool:
+            self.pool.closeall()
     
     def open_voice_recorder(self, target_text_edit):
         """Открывает окно для записи голоса и преобразования в текст."""
@@ -1056,9 +3940,9 @@ class MainWindow(QWidget):
         self.voice_recorder_dialog.exec_()
 
 class EngineersListWindow(QDialog):
-    def __init__(self, connection, main_window):
+    def __init__(self, pool, main_window):
         super().__init__()
-        self.connection = connection
+        self.pool = pool
         self.main_window = main_window  # Сохраняем ссылку на главное окно
         self.initUI()
 
@@ -1101,9 +3985,13 @@ class EngineersListWindow(QDialog):
         self.load_engineers_data()
 
     def load_engineers_data(self):
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT full_name, tab_number FROM engineers_info")
-        records = cursor.fetchall()
+        try:
+            with self.pool.cursor() as cursor:
+                records = self.main_window.engineer_directory.get(cursor)
+        except psycopg2.Error as e:
+            logging.error(f"Ошибка при загрузке списка инженеров: {e}")
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список инженеров: {e}")
+            return
 
         # Обновляем таблицу
         self.engineers_table.setRowCount(len(records))
@@ -1121,18 +4009,19 @@ class EngineersListWindow(QDialog):
 
         if full_name and tab_number:
             try:
-                cursor = self.connection.cursor()
-                cursor.execute(
-                    "INSERT INTO engineers_info (full_name, tab_number) VALUES (%s, %s)",
-                    (full_name, tab_number)
-                )
-                self.connection.commit()
+                with self.pool.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO engineers_info (full_name, tab_number) VALUES (%s, %s)",
+                        (full_name, tab_number)
+                    )
                 logging.info(f"Инженер {full_name} с табельным номером {tab_number} добавлен в базу данных.")
             except Exception as e:
                 logging.error(f"Ошибка при добавлении инженера в базу данных: {e}")
                 QMessageBox.warning(self, "Ошибка", f"Не удалось добавить инженера: {e}")
                 return
 
+            self.main_window.engineer_directory.invalidate()
+
             # Очистить поля ввода
             self.full_name_input.clear()
             self.tab_number_input.clear()
@@ -1168,23 +4057,90 @@ class EngineersListWindow(QDialog):
 
         # Удаление записи из базы данных
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "DELETE FROM engineers_info WHERE full_name=%s AND tab_number=%s",
-                (full_name, tab_number)
-            )
-            self.connection.commit()
+            with self.pool.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM engineers_info WHERE full_name=%s AND tab_number=%s",
+                    (full_name, tab_number)
+                )
             logging.info(f"Инженер {full_name} с табельным номером {tab_number} удален из базы данных.")
         except Exception as e:
             logging.error(f"Ошибка при удалении инженера из базы данных: {e}")
             QMessageBox.warning(self, "Ошибка", f"Не удалось удалить инженера: {e}")
             return
 
+        self.main_window.engineer_directory.invalidate()
+
         # Обновление данных инженеров после удаления
         self.load_engineers_data()
         logging.info("Таблица с данными инженеров обновлена после удаления.")
+
+        # Обновление ComboBox в основном окне
+        self.main_window.load_engineers()
         logging.info("Функция delete_engineer завершена успешно.")
 
+class DateRangeDialog(QDialog):
+    """Выбор периода для экспорта журнала и, если заданы, варианта (modes) и форматов (formats)."""
+
+    def __init__(self, parent=None, title="Экспорт за период", modes=None, formats=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+
+        form_layout = QFormLayout()
+        self.date_from_edit = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_from_edit.setCalendarPopup(True)
+        form_layout.addRow("С:", self.date_from_edit)
+        self.date_to_edit = QDateEdit(QDate.currentDate())
+        self.date_to_edit.setCalendarPopup(True)
+        form_layout.addRow("По:", self.date_to_edit)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(modes or [])
+        if modes:
+            form_layout.addRow("Файлы:", self.mode_combo)
+
+        # Флажки форматов: все выбранные форматы пишутся за один проход по базе данных
+        self.format_checkboxes = {}
+        for extension, exporter in (formats or {}).items():
+            checkbox = QCheckBox(f"{exporter.description} (.{extension})")
+            checkbox.setChecked(extension == "docx")
+            if extension == "xlsx" and openpyxl is None:
+                checkbox.setChecked(False)
+                checkbox.setEnabled(False)
+                checkbox.setToolTip("Установите пакет openpyxl")
+            self.format_checkboxes[extension] = checkbox
+            form_layout.addRow("Формат:" if len(self.format_checkboxes) == 1 else "", checkbox)
+
+        button_layout = QHBoxLayout()
+        ok_button = QPushButton("Экспорт")
+        ok_button.clicked.connect(self.accept)
+        button_layout.addWidget(ok_button)
+        cancel_button = QPushButton("Отмена")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form_layout)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def accept(self):
+        if self.date_from_edit.date() > self.date_to_edit.date():
+            QMessageBox.warning(self, "Ошибка", "Начало периода не может быть позже его окончания.")
+            return
+        if self.format_checkboxes and not self.selected_formats():
+            QMessageBox.warning(self, "Ошибка", "Выберите хотя бы один формат.")
+            return
+        super().accept()
+
+    def period(self):
+        return self.date_from_edit.date().toPyDate(), self.date_to_edit.date().toPyDate()
+
+    def mode(self):
+        return self.mode_combo.currentIndex()
+
+    def selected_formats(self):
+        return [extension for extension, checkbox in self.format_checkboxes.items() if checkbox.isChecked()]
+
+
 class AboutDialog(QDialog):
     def __init__(self):
         super().__init__()
@@ -1219,17 +4175,163 @@ class AboutDialog(QDialog):
         
         self.setLayout(layout)
 
+TRIGRAM_MIN_LENGTH = 3  # Более короткие подстроки триграммный индекс не ускоряет
+
+
+def escape_like(text):
+    """Экранирует спецсимволы LIKE, чтобы ключевое слово искалось буквально."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def keyset_branches(after_key=None, before_key=None):
+    """Условия страницы по ключу (event_ts, id) с учетом записей без event_ts.
+
+    event_ts пуст, если время записи не разобрано. При сортировке по
+    возрастанию такие записи идут последними (NULLS LAST), а сравнение
+    строк с NULL дает NULL, поэтому хвост без event_ts выбирается отдельной
+    ветвью. Каждая ветвь - (условие, параметры) и читается по индексу
+    (event_ts, id); страница - объединение ветвей.
+    """
+    if after_key:
+        event_ts, record_id = after_key
+        if event_ts is None:
+            return [("event_ts IS NULL AND id > %s", [record_id])]
+        return [("(event_ts, id) > (%s, %s)", [event_ts, record_id]), ("event_ts IS NULL", [])]
+    if before_key:
+        event_ts, record_id = before_key
+        if event_ts is None:
+            return [("event_ts IS NULL AND id < %s", [record_id]), ("event_ts IS NOT NULL", [])]
+        return [("(event_ts, id) < (%s, %s)", [event_ts, record_id])]
+    return [("TRUE", [])]
+
+
+def build_filter_query(content_filter, note_filter, after_key=None, before_key=None, limit=100):
+    """Строит запрос страницы фильтра журнала и возвращает (query, params).
+
+    after_key/before_key - ключ (event_ts, id), после или до которого читается
+    страница. Если есть ключевое слово не короче TRIGRAM_MIN_LENGTH, совпадения
+    сначала отбираются по триграммным индексам в материализованном CTE, и лишь
+    затем сортируются. Иначе планировщик может выбрать упорядоченный проход по
+    индексу (event_ts, id) с фильтрацией, который для редкого слова читает
+    всю таблицу.
+    """
+    conditions = []
+    params = []
+
+    if content_filter:
+        conditions.append("content ILIKE %s")
+        params.append(f"%{escape_like(content_filter)}%")
+
+    if note_filter:
+        conditions.append("note ILIKE %s")
+        params.append(f"%{escape_like(note_filter)}%")
+
+    # По убыванию NULL идут первыми - обратный порядок к возрастанию с NULLS LAST
+    order = "DESC" if before_key and not after_key else "ASC"
+    order_by = f"event_ts {order}, id {order}"
+    columns = "id, date, shift, time, content, note, event_ts"
+    branches = keyset_branches(after_key, before_key)
+
+    def page(source, page_columns, where, where_params):
+        selects = []
+        page_params = []
+        for condition, key_params in branches:
+            selects.append(
+                f"SELECT {page_columns} FROM {source} WHERE {where} AND {condition} ORDER BY {order_by} LIMIT %s"
+            )
+            page_params += where_params + key_params + [limit]
+        if len(selects) == 1:
+            return selects[0], page_params
+        union = " UNION ALL ".join(f"({select})" for select in selects)
+        return f"SELECT * FROM ({union}) page ORDER BY {order_by} LIMIT %s", page_params + [limit]
+
+    where = " AND ".join(conditions) or "TRUE"
+    if max(len(content_filter), len(note_filter)) >= TRIGRAM_MIN_LENGTH:
+        page_ids, page_params = page("matches", "id, event_ts", "TRUE", [])
+        query = f"""
+            WITH matches AS MATERIALIZED (
+                SELECT id, event_ts FROM journal WHERE {where}
+            )
+            SELECT {columns} FROM journal
+            WHERE id IN (SELECT id FROM ({page_ids}) page_ids)
+            ORDER BY {order_by}
+        """
+        return query, params + page_params
+    return page("journal", columns, where, params)
+
+
+# Маркеры подсветки ts_headline: символы из области частного использования Unicode,
+# которые не встречаются в тексте записей и заменяются на HTML после экранирования
+HEADLINE_START = "\ue000"
+HEADLINE_STOP = "\ue001"
+HEADLINE_OPTIONS = (
+    f'StartSel="{HEADLINE_START}", StopSel="{HEADLINE_STOP}", '
+    'MaxFragments=3, MaxWords=30, MinWords=10, FragmentDelimiter=" … "'
+)
+
+
+def build_fulltext_query(search_text, after_key=None, before_key=None, limit=100):
+    """Строит запрос страницы полнотекстового поиска и возвращает (query, params).
+
+    Совпадения ищутся по индексу search_tsv и упорядочиваются по ts_rank.
+    after_key/before_key - ключ (rank, id) последней или первой записи страницы.
+    Фрагменты с подсветкой (ts_headline) строятся только для записей страницы.
+    """
+    condition = "TRUE"
+    order = "DESC"
+    params = [search_text]
+    if after_key:
+        condition = "(rank, id) < (%s::real, %s)"
+        params.extend(after_key)
+    elif before_key:
+        condition = "(rank, id) > (%s::real, %s)"
+        params.extend(before_key)
+        order = "ASC"
+    params.extend([limit, HEADLINE_OPTIONS, HEADLINE_OPTIONS])
+
+    query = f"""
+        WITH search AS (
+            SELECT websearch_to_tsquery('russian', %s) AS q
+        ), ranked AS MATERIALIZED (
+            SELECT journal.id, ts_rank(journal.search_tsv, search.q) AS rank
+            FROM journal, search
+            WHERE journal.search_tsv @@ search.q
+        ), page AS (
+            SELECT id, rank FROM ranked
+            WHERE {condition}
+            ORDER BY rank {order}, id {order}
+            LIMIT %s
+        )
+        SELECT j.id, j.date, j.shift, j.time,
+               ts_headline('russian', coalesce(j.content, ''), search.q, %s),
+               ts_headline('russian', coalesce(j.note, ''), search.q, %s),
+               page.rank
+        FROM page JOIN journal j ON j.id = page.id, search
+        ORDER BY page.rank {order}, page.id {order}
+    """
+    return query, params
+
+
+def headline_to_html(text):
+    """Преобразует фрагмент ts_headline в безопасный HTML с подсветкой совпадений."""
+    text = html.escape(text).replace("\n", "<br>")
+    return (text.replace(HEADLINE_START, '<span style="background-color: #fff59d; font-weight: bold;">')
+                .replace(HEADLINE_STOP, "</span>"))
+
+
 class FilterDialog(QDialog):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
-        self.page = 0  # Текущая страница
+        self.page = 0  # Номер текущей страницы (только для отображения кнопок)
         self.page_size = 100  # Количество записей на странице
+        self.has_next_page = False
         self.filter_timer = QTimer(self)  # Таймер для дебаунсинга
         self.filter_timer.setSingleShot(True)  # Таймер однократного срабатывания
         self.filter_timer.timeout.connect(self.load_filtered_data)  # Связь с фильтрацией
 
-        self.data_cache = []  # Кэш данных текущей страницы
+        # Кэш данных текущей страницы: (id, date, shift, time, content, note, event_ts или rank)
+        self.data_cache = []
 
         self.initUI()
 
@@ -1239,10 +4341,18 @@ class FilterDialog(QDialog):
 
         layout = QVBoxLayout()
 
+        # Режим поиска: подстрока или полнотекстовый поиск с учетом словоформ
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Поиск подстроки", "Полнотекстовый поиск"])
+        self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        layout.addWidget(QLabel("Режим поиска:"))
+        layout.addWidget(self.mode_combo)
+
         # Поля для ввода содержания и примечания
         self.content_input = QLineEdit()
         self.content_input.textChanged.connect(self.on_filter_text_changed)
-        layout.addWidget(QLabel("Содержание (ключевое слово):"))
+        self.content_label = QLabel("Содержание (ключевое слово):")
+        layout.addWidget(self.content_label)
         layout.addWidget(self.content_input)
 
         self.note_input = QLineEdit()
@@ -1276,38 +4386,100 @@ class FilterDialog(QDialog):
         """Запускает таймер для дебаунсинга фильтрации."""
         self.filter_timer.start(300)
 
-    def load_filtered_data(self):
-        """Загружает данные с учетом фильтров и текущей страницы."""
-        content_filter = self.content_input.text().strip()
-        note_filter = self.note_input.text().strip()
+    def is_fulltext_mode(self):
+        return self.mode_combo.currentIndex() == 1
+
+    def on_mode_changed(self):
+        """Переключает подписи полей и перезапускает поиск в выбранном режиме."""
+        if self.is_fulltext_mode():
+            # Запрос ищется сразу в содержании и примечании
+            self.content_label.setText("Запрос (содержание и примечание, с учетом словоформ):")
+            self.note_input.setEnabled(False)
+        else:
+            self.content_label.setText("Содержание (ключевое слово):")
+            self.note_input.setEnabled(True)
+        self.load_filtered_data()
 
-        query = "SELECT date, shift, time, content, note FROM journal WHERE 1=1"
-        params = []
+    def load_filtered_data(self, direction=None):
+        """Загружает страницу с учетом фильтров.
 
-        if content_filter:
-            query += " AND content ILIKE %s"
-            params.append(f"%{content_filter}%")
+        Страницы выбираются по ключу (event_ts, id) относительно первой или
+        последней записи текущей страницы, поэтому время перехода не зависит
+        от номера страницы. direction: None - первая страница, "next" или "prev".
+        """
+        content_filter = self.content_input.text().strip()
+        note_filter = self.note_input.text().strip()
+        fulltext = self.is_fulltext_mode()
 
-        if note_filter:
-            query += " AND note ILIKE %s"
-            params.append(f"%{note_filter}%")
+        if fulltext and not content_filter:
+            # Пустой полнотекстовый запрос ничего не находит
+            self.page = 0
+            self.has_next_page = False
+            self.data_cache = []
+            self.update_table()
+            return
 
-        query += " ORDER BY date, time LIMIT %s OFFSET %s"
-        params.extend([self.page_size, self.page * self.page_size])
+        after_key = before_key = None
+        if direction == "next":
+            after_key = self.page_key(self.data_cache[-1])
+        elif direction == "prev":
+            # Читаем назад от начала страницы и разворачиваем результат
+            before_key = self.page_key(self.data_cache[0])
+
+        # Лишняя запись показывает, есть ли страница дальше в направлении чтения
+        if fulltext:
+            query, params = build_fulltext_query(
+                content_filter, after_key, before_key, limit=self.page_size + 1
+            )
+        else:
+            query, params = build_filter_query(
+                content_filter, note_filter, after_key, before_key, limit=self.page_size + 1
+            )
 
         try:
-            cursor = self.parent.connection.cursor()
-            cursor.execute(query, params)
-            self.data_cache = cursor.fetchall()  # Загружаем текущую страницу данных
-            self.update_table()
+            with self.parent.pool.cursor() as cursor:
+                cursor.execute(query, params)
+                records = cursor.fetchall()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить данные: {e}")
+            return
+
+        has_more = len(records) > self.page_size
+        records = records[:self.page_size]
+        if direction and not records:
+            return  # Записи в этом направлении закончились, остаемся на текущей странице
+
+        if direction == "prev":
+            records.reverse()
+            self.page = 0 if not has_more else self.page - 1
+            self.has_next_page = True
+        else:
+            self.page = self.page + 1 if direction == "next" else 0
+            self.has_next_page = has_more
+
+        self.data_cache = records  # Загружаем текущую страницу данных
+        self.update_table()
+
+    @staticmethod
+    def page_key(row):
+        """Ключ постраничной выборки записи: (event_ts, id) или (rank, id) при полнотекстовом поиске."""
+        return (row[6], row[0])
 
     def update_table(self):
         """Обновляет таблицу с данными текущей страницы."""
+        fulltext = self.is_fulltext_mode()
+        self.result_table.setRowCount(0)  # Удаляем и виджеты ячеек с подсветкой предыдущей выборки
         self.result_table.setRowCount(len(self.data_cache))
         for row_index, row_data in enumerate(self.data_cache):
-            for column_index, item in enumerate(row_data):
+            for column_index, item in enumerate(row_data[1:6]):  # ID и ключ сортировки не отображаются
+                if fulltext and column_index in (3, 4):
+                    # Фрагменты с подсветкой совпадений выводим как rich text
+                    label = QLabel(headline_to_html(item))
+                    label.setTextFormat(Qt.RichText)
+                    label.setWordWrap(True)
+                    label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+                    self.result_table.setCellWidget(row_index, column_index, label)
+                    continue
                 cell = QTableWidgetItem(str(item))
                 cell.setTextAlignment(Qt.AlignLeft | Qt.AlignTop)  # Выравнивание по левому верхнему углу
                 cell.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Только для чтения
@@ -1321,7 +4493,7 @@ class FilterDialog(QDialog):
 
         # Управляем состоянием кнопок пагинации
         self.prev_button.setEnabled(self.page > 0)  # Включаем кнопку "Назад", если это не первая страница
-        self.next_button.setEnabled(len(self.data_cache) == self.page_size)  # Включаем "Далее", если есть ещё данные
+        self.next_button.setEnabled(self.has_next_page)  # Включаем "Далее", если есть ещё данные
 
 
     def set_column_widths(self):
@@ -1349,17 +4521,479 @@ class FilterDialog(QDialog):
 
     def next_page(self):
         """Переход к следующей странице."""
-        self.page += 1
-        self.load_filtered_data()
+        if self.data_cache:
+            self.load_filtered_data("next")
 
     def previous_page(self):
         """Переход к предыдущей странице."""
-        if self.page > 0:  # Проверяем, что текущая страница не первая
-            self.page -= 1  # Переход на предыдущую страницу
-            self.load_filtered_data()
+        if self.page > 0 and self.data_cache:  # Проверяем, что текущая страница не первая
+            self.load_filtered_data("prev")
         else:
             self.prev_button.setEnabled(False)  # Отключаем кнопку "Назад", если это первая страница
 
+def load_speech_settings(path="config.ini"):
+    """Читает раздел [Speech] из config.ini: движок распознавания и его параметры."""
+    config = configparser.ConfigParser()
+    config.read(path)
+    section = config["Speech"] if "Speech" in config else {}
+    model_path = section.get("model_path", "models/vosk-model-small-ru-0.22")
+    return {
+        "engine": section.get("engine", "vosk").lower(),
+        "model_path": model_path if os.path.isabs(model_path) else os.path.join(current_dir, model_path),
+        "language": section.get("language", "ru-RU"),
+    }
+
+
+RecognitionResult = namedtuple("RecognitionResult", "text engine latency rtf")
+
+
+class SpeechEngine:
+    """Движок распознавания речи.
+
+    Подклассы реализуют transcribe(audio_data) -> текст; recognize() замеряет
+    задержку и коэффициент реального времени (RTF - время распознавания,
+    деленное на длительность записи; меньше 1 - быстрее реального времени).
+    """
+    name = None
+
+    def transcribe(self, audio_data):
+        raise NotImplementedError
+
+    CHUNK_FRAMES = 4000  # Порция записи при распознавании через open_stream
+
+    def open_stream(self, sample_rate):
+        """Потоковое распознавание (объект с feed и finish) или None, если движок его не поддерживает."""
+        return None
+
+    @property
+    def streaming(self):
+        return type(self).open_stream is not SpeechEngine.open_stream
+
+    def transcribe_stream(self, audio_data, progress=None, cancelled=None):
+        """Распознает запись порциями через open_stream; возвращает None, если cancelled() сработал."""
+        stream = self.open_stream(audio_data.sample_rate)
+        data = memoryview(audio_data.get_raw_data(convert_width=AUDIO_SAMPLE_WIDTH))
+        chunk = self.CHUNK_FRAMES * AUDIO_SAMPLE_WIDTH
+        for start in range(0, len(data), chunk):
+            if cancelled and cancelled():
+                return None
+            stream.feed(bytes(data[start:start + chunk]))
+            if progress:
+                progress(min(start + chunk, len(data)), len(data))
+        return stream.finish()
+
+    def recognize(self, audio_data, progress=None, cancelled=None):
+        """Распознает запись и замеряет показатели; None - если распознавание отменено.
+
+        progress(done, total) и отмена работают для движков с open_stream,
+        остальные распознают запись одним вызовом.
+        """
+        duration = len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+        started = monotonic()
+        if self.streaming:
+            text = self.transcribe_stream(audio_data, progress, cancelled)
+            if text is None:
+                return None
+        else:
+            text = self.transcribe(audio_data)
+        latency = monotonic() - started
+        rtf = latency / duration if duration else None
+        logging.info(
+            f"Распознавание ({self.name}): {duration:.1f} с записи за {latency:.2f} с"
+            + (f", RTF {rtf:.2f}" if rtf is not None else "")
+        )
+        return RecognitionResult(text, self.name, latency, rtf)
+
+
+class VoskEngine(SpeechEngine):
+    """Офлайн-распознавание Vosk (Kaldi) на процессоре, без доступа в интернет."""
+    name = "vosk"
+
+    _models = {}  # Путь -> модель: загрузка занимает секунды, делается один раз
+    _models_lock = threading.Lock()
+
+    def __init__(self, settings):
+        if vosk is None:
+            raise RuntimeError("Библиотека vosk не установлена (pip install vosk).")
+        self.model_path = settings["model_path"]
+        if not os.path.isdir(self.model_path):
+            raise RuntimeError(f"Не найдена модель распознавания речи: {self.model_path}")
+
+    def model(self):
+        with self._models_lock:
+            if self.model_path not in self._models:
+                vosk.SetLogLevel(-1)
+                logging.info(f"Загрузка модели распознавания речи {self.model_path}")
+                self._models[self.model_path] = vosk.Model(self.model_path)
+            return self._models[self.model_path]
+
+    def open_stream(self, sample_rate):
+        return VoskStream(self.model(), sample_rate)
+
+    def transcribe(self, audio_data):
+        return self.transcribe_stream(audio_data)
+
+
+class VoskStream:
+    """Потоковое распознавание Vosk: отсчеты подаются порциями по мере записи.
+
+    feed() возвращает текущую гипотезу - законченные фразы и частичный
+    результат последней, finish() - окончательный текст.
+    """
+
+    def __init__(self, model, sample_rate):
+        self.recognizer = vosk.KaldiRecognizer(model, sample_rate)
+        self.phrases = []
+
+    def text(self, partial=""):
+        return " ".join(phrase for phrase in self.phrases + [partial] if phrase)
+
+    def feed(self, data):
+        if self.recognizer.AcceptWaveform(data):
+            # Фраза закончилась (пауза в речи) - ее текст больше не меняется
+            self.phrases.append(json.loads(self.recognizer.Result()).get("text", ""))
+            return self.text()
+        return self.text(json.loads(self.recognizer.PartialResult()).get("partial", ""))
+
+    def finish(self):
+        self.phrases.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        return self.text()
+
+
+class GoogleEngine(SpeechEngine):
+    """Облачное распознавание Google Web Speech API; нужен доступ в интернет."""
+    name = "google"
+
+    def __init__(self, settings):
+        self.language = settings["language"]
+
+    def transcribe(self, audio_data):
+        try:
+            return sr.Recognizer().recognize_google(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            return ""  # Речь не распознана - как пустой результат Vosk
+
+
+SPEECH_ENGINES = {engine.name: engine for engine in (VoskEngine, GoogleEngine)}
+
+
+class StreamingTranscriber(QObject):
+    """Распознает речь по ходу записи в отдельном потоке.
+
+    GUI-поток передает порции записи через feed(), поток распознавания подает
+    их движку и сообщает текущую гипотезу сигналом partial. После finish()
+    дораспознается остаток и приходит finished с RecognitionResult: latency -
+    время от конца записи до окончательного текста, rtf - суммарное время
+    распознавания, деленное на длительность записи. Сигналы несут номер
+    сеанса session, чтобы получатель мог отличить запоздавший результат
+    прежнего сеанса от текущего.
+    """
+    partial = pyqtSignal(int, str)  # Номер сеанса, текущая гипотеза
+    finished = pyqtSignal(int, object)  # Номер сеанса, RecognitionResult
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, engine, sample_rate, session=0, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.session = session
+        self.chunks = queue.Queue()
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, name="speech-stream", daemon=True)
+        self.thread.start()
+
+    def feed(self, data):
+        self.chunks.put(data)
+
+    def finish(self):
+        self.chunks.put(None)
+
+    def cancel(self):
+        self.cancelled = True
+        self.chunks.put(None)
+
+    def run(self):
+        try:
+            stream = self.engine.open_stream(self.sample_rate)  # Модель загружается здесь, не в GUI-потоке
+            busy = 0.0
+            frames = 0
+            hypothesis = ""
+            while True:
+                data = self.chunks.get()
+                if data is None or self.cancelled:
+                    break
+                started = monotonic()
+                text = stream.feed(data)
+                busy += monotonic() - started
+                frames += len(data) // AUDIO_SAMPLE_WIDTH
+                if text != hypothesis:
+                    hypothesis = text
+                    self.partial.emit(self.session, text)
+            if self.cancelled:
+                return
+            started = monotonic()
+            text = stream.finish()
+            latency = monotonic() - started
+            busy += latency
+            duration = frames / self.sample_rate
+            rtf = busy / duration if duration else None
+            logging.info(
+                f"Потоковое распознавание ({self.engine.name}): {duration:.1f} с записи, "
+                f"окончательный текст через {latency:.2f} с после остановки"
+                + (f", RTF {rtf:.2f}" if rtf is not None else "")
+            )
+            self.finished.emit(self.session, RecognitionResult(text, self.engine.name, latency, rtf))
+        except Exception as e:
+            logging.error(f"Ошибка потокового распознавания речи: {e}")
+            self.failed.emit(self.session, str(e))
+
+
+def create_speech_engine(settings):
+    """Создает движок распознавания, выбранный в [Speech] engine."""
+    if settings["engine"] not in SPEECH_ENGINES:
+        raise RuntimeError(f"Неизвестный движок распознавания речи: {settings['engine']}")
+    return SPEECH_ENGINES[settings["engine"]](settings)
+
+
+class RecognitionQueue(QObject):
+    """Очередь распознавания записей целиком в отдельном потоке.
+
+    Записи распознаются по одной в порядке постановки, пока интерфейс
+    продолжает работать и можно записывать следующую. Задания можно
+    отменить - и стоящие в очереди, и текущее (для движков с open_stream
+    отмена срабатывает между порциями записи). engine_factory вызывается в
+    потоке очереди на каждое задание, поэтому изменения [Speech] в
+    config.ini подхватываются без перезапуска.
+    """
+    started = pyqtSignal(int, int)  # Номер задания, заданий в очереди за ним
+    progress = pyqtSignal(int, int)  # Номер задания, процент
+    finished = pyqtSignal(int, object)  # Номер задания, RecognitionResult
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+    def __init__(self, engine_factory, parent=None):
+        super().__init__(parent)
+        self.engine_factory = engine_factory
+        self.jobs = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._pending = set()  # Поставленные и еще не завершенные задания, включая текущее
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self.current = None
+        self.thread = threading.Thread(target=self.run, name="speech-queue", daemon=True)
+        self.thread.start()
+
+    def submit(self, audio_data):
+        """Ставит запись в очередь и возвращает номер задания."""
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._pending.add(job_id)
+        self.jobs.put((job_id, audio_data))
+        return job_id
+
+    def pending_count(self):
+        """Задания в очереди, включая выполняемое; завершенное не учитывается уже в его сигнале."""
+        with self._lock:
+            return len(self._pending)
+
+    def cancel(self, job_id):
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def cancel_all(self):
+        with self._lock:
+            self._cancelled.update(self._pending)
+
+    def is_cancelled(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    def stop(self):
+        self.cancel_all()
+        self.jobs.put((None, None))
+
+    def _complete(self, job_id):
+        """Снимает задание с учета до сигнала о нем, чтобы обработчик видел оставшиеся."""
+        with self._lock:
+            cancelled = job_id in self._cancelled
+            self.current = None
+            self._pending.discard(job_id)
+            self._cancelled.discard(job_id)
+        return cancelled
+
+    def run(self):
+        while True:
+            job_id, audio_data = self.jobs.get()
+            if job_id is None:
+                return
+            with self._lock:
+                cancelled = job_id in self._cancelled
+                if not cancelled:
+                    self.current = job_id
+            if cancelled:
+                self._complete(job_id)
+                self.cancelled.emit(job_id)
+                continue
+            self.started.emit(job_id, self.pending_count() - 1)
+            try:
+                result = self.engine_factory().recognize(
+                    audio_data,
+                    progress=lambda done, total: self.progress.emit(job_id, 100 * done // total),
+                    cancelled=lambda: self.is_cancelled(job_id),
+                )
+            except Exception as e:
+                self._complete(job_id)
+                logging.error(f"Ошибка распознавания речи (задание {job_id}): {e}")
+                self.failed.emit(job_id, str(e))
+                continue
+            if self._complete(job_id) or result is None:
+                logging.info(f"Распознавание записи (задание {job_id}) отменено.")
+                self.cancelled.emit(job_id)
+            else:
+                self.finished.emit(job_id, result)
+
+
+AUDIO_RATE = 16000  # Гц, моно, 16 бит
+AUDIO_SAMPLE_WIDTH = 2  # байт на отсчет (paInt16)
+AUDIO_FRAMES_PER_BUFFER = 1024
+
+
+class AudioRingBuffer:
+    """Кольцевой буфер отсчетов int16 для одного писателя и одного читателя без блокировок.
+
+    Писатель (поток захвата звука) копирует данные в массив и только после
+    этого увеличивает счетчик written - присваивание целого числа атомарно,
+    поэтому читатель видит лишь полностью записанные отсчеты. Если читатель
+    отстал больше чем на емкость буфера или писатель обогнал его во время
+    копирования, затертые отсчеты отбрасываются и учитываются в dropped.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.written = 0  # Всего записано отсчетов (меняет только писатель)
+        self.read_pos = 0  # Всего прочитано и пропущено (меняет только читатель)
+        self.dropped = 0
+
+    def write(self, samples):
+        skipped = max(0, len(samples) - self.capacity)  # Не помещающееся в буфер начало сразу теряется
+        samples = samples[skipped:]
+        start = (self.written + skipped) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.written += skipped + len(samples)
+
+    def _copy(self, start, end):
+        """Копия отсчетов с номерами [start, end) в порядке записи."""
+        first, last = start % self.capacity, end % self.capacity
+        if end - start == 0:
+            return np.empty(0, dtype=np.int16)
+        if first < last:
+            return self.buffer[first:last].copy()
+        return np.concatenate((self.buffer[first:], self.buffer[:last]))
+
+    def read(self):
+        """Забирает все новые отсчеты с момента прошлого чтения."""
+        written = self.written
+        start = max(self.read_pos, written - self.capacity)
+        self.dropped += start - self.read_pos
+        data = self._copy(start, written)
+        # Писатель мог затереть начало диапазона, пока шло копирование
+        overwritten = min(self.written - self.capacity - start, len(data))
+        if overwritten > 0:
+            data = data[overwritten:]
+            self.dropped += overwritten
+        self.read_pos = written
+        return data
+
+    def latest(self, count):
+        """Последние count отсчетов для отображения (не сдвигает позицию чтения)."""
+        written = self.written
+        return self._copy(max(0, written - min(count, self.capacity)), written)
+
+
+class PyAudioInputStream:
+    """Входной поток микрофона PyAudio в режиме обратного вызова."""
+
+    def __init__(self, rate, frames_per_buffer, callback):
+        self.audio = pyaudio.PyAudio()
+        try:
+            self.stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+                                          frames_per_buffer=frames_per_buffer, stream_callback=callback,
+                                          start=False)
+        except Exception:
+            self.audio.terminate()
+            raise
+
+    def start(self):
+        self.stream.start_stream()
+
+    def stop(self):
+        self.stream.stop_stream()
+
+    def close(self):
+        self.stream.close()
+        self.audio.terminate()
+
+
+class AudioCapture:
+    """Захват звука с микрофона в кольцевой буфер вне GUI-потока.
+
+    PortAudio вызывает callback в своем потоке на каждый буфер, callback только
+    копирует отсчеты в AudioRingBuffer. Интерфейс забирает накопленное через
+    read() и берет последние отсчеты для графика через latest(). stream_factory
+    (rate, frames_per_buffer, callback) создает поток с методами start, stop и
+    close; по умолчанию это микрофон PyAudio, для проверок - поддельный поток.
+    """
+
+    def __init__(self, rate=AUDIO_RATE, frames_per_buffer=AUDIO_FRAMES_PER_BUFFER, buffer_seconds=10,
+                 stream_factory=PyAudioInputStream):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.ring = AudioRingBuffer(rate * buffer_seconds)
+        self.stream_factory = stream_factory
+        self.stream = None
+        self.callbacks = 0
+        self.overflows = 0  # Буферы, на которых PortAudio сообщил о переполнении входа
+
+    def callback(self, in_data, frame_count, time_info, status):
+        self.callbacks += 1
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return None, pyaudio.paContinue
+
+    def start(self):
+        self.stream = self.stream_factory(self.rate, self.frames_per_buffer, self.callback)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def read(self):
+        return self.ring.read()
+
+    def latest(self, count):
+        return self.ring.latest(count)
+
+    @property
+    def dropped(self):
+        """Отсчеты, затертые в буфере до того, как их успели прочитать."""
+        return self.ring.dropped
+
+    def stats(self):
+        return {
+            "captured": self.ring.written,
+            "callbacks": self.callbacks,
+            "overflows": self.overflows,
+            "dropped": self.ring.dropped,
+        }
+
+
 class VoiceRecorderDialog(QDialog):
     def __init__(self, target_text_edit):
         super().__init__()
@@ -1412,16 +5046,51 @@ class VoiceRecorderDialog(QDialog):
         self.stop_button.setEnabled(False)
         layout.addWidget(self.stop_button)
 
+        # Запись хранится только в памяти; на диск - лишь по явному желанию пользователя
+        self.save_button = QPushButton("Сохранить запись...")
+        self.save_button.clicked.connect(self.save_recording)
+        self.save_button.setEnabled(False)
+        layout.addWidget(self.save_button)
+
         # Информационный текст
         self.info_label = QLabel("Нажмите 'Начать запись' для записи голоса.")
         layout.addWidget(self.info_label)
 
+        # Ход распознавания записей, стоящих в очереди
+        self.recognition_progress = QProgressBar()
+        self.recognition_progress.setVisible(False)
+        layout.addWidget(self.recognition_progress)
+        self.cancel_recognition_button = QPushButton("Отменить распознавание")
+        self.cancel_recognition_button.clicked.connect(self.cancel_recognition)
+        self.cancel_recognition_button.setVisible(False)
+        layout.addWidget(self.cancel_recognition_button)
+
         self.setLayout(layout)
 
+        # Распознавание записей целиком идет в фоне, запись следующей не ждет его окончания
+        self.recognition = RecognitionQueue(lambda: create_speech_engine(load_speech_settings()), self)
+        self.recognition.started.connect(self.on_recognition_started)
+        self.recognition.progress.connect(self.on_recognition_progress)
+        self.recognition.finished.connect(self.on_recognition_finished)
+        self.recognition.failed.connect(self.on_recognition_failed)
+        self.recognition.cancelled.connect(self.on_recognition_cancelled)
+        # Окончательный текст может прийти после начала следующей записи, поэтому
+        # текст хранится по номерам записей и выводится в порядке записи
+        self.dictated = {}  # Номер записи -> распознанный текст записей, сделанных в этом окне
+        self.partial_text = ""  # Гипотеза распознавания текущей записи
+        self.recording_number = 0  # Номер текущей (последней) записи в этом окне
+        self.pending_audio = {}  # Номер записи -> запись, окончательный текст которой еще не получен
+        self.job_recordings = {}  # Номер задания распознавания -> номер записи
+        self.close_when_done = False  # Пользователь закрыл окно и ждет окончания распознавания
+
         # Переменные для записи
         self.is_recording = False
-        self.audio_file = "voice_recording.wav"
-        self.timer = QTimer()
+        self.pcm = bytearray()  # 16-битные отсчеты текущей записи
+        self.audio_data = None  # Последняя завершенная запись (sr.AudioData поверх self.pcm)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_visualization)
+        self.capture = None
+        self.transcriber = None
         self.volume_multiplier = self.volume_slider.value()  # Начальное увеличение громкости
 
     def update_volume_label(self):
@@ -1431,72 +5100,245 @@ class VoiceRecorderDialog(QDialog):
 
     def start_recording(self):
         self.is_recording = True
+        self.recording_number += 1
+        self.partial_text = ""
         self.record_button.setEnabled(False)
         self.stop_button.setEnabled(True)
         self.info_label.setText("Идет запись...")
 
-        self.audio = pyaudio.PyAudio()
-        self.stream = self.audio.open(format=pyaudio.paInt16,
-                                      channels=1,
-                                      rate=16000,
-                                      input=True,
-                                      frames_per_buffer=1024)
-        self.frames = []
-
-        # Запуск таймера для обновления графика
-        self.timer.timeout.connect(self.update_visualization)
+        # Звук пишется в кольцевой буфер в потоке PortAudio, таймер только забирает его и рисует.
+        # Новый bytearray: на прошлую запись может ссылаться memoryview в sr.AudioData
+        self.pcm = bytearray()
+        self.audio_data = None
+        self.save_button.setEnabled(False)
+        self.capture = AudioCapture()
+        try:
+            self.capture.start()
+        except Exception as e:
+            logging.error(f"Не удалось открыть микрофон: {e}")
+            self.capture = None
+            self.is_recording = False
+            self.record_button.setEnabled(True)
+            self.stop_button.setEnabled(False)
+            self.info_label.setText(f"Не удалось открыть микрофон: {e}")
+            return
+        self.start_transcriber()
         self.timer.start(50)
 
+    def start_transcriber(self):
+        """Запускает распознавание по ходу записи, если движок его поддерживает."""
+        self.transcriber = None
+        try:
+            engine = create_speech_engine(load_speech_settings())
+        except Exception as e:
+            logging.warning(f"Распознавание по ходу записи недоступно: {e}")
+            return  # Ошибку движка покажет распознавание записи целиком после остановки
+        if not engine.streaming:
+            return
+        self.transcriber = StreamingTranscriber(engine, AUDIO_RATE, self.recording_number, self)
+        self.transcriber.partial.connect(self.show_partial)
+        self.transcriber.finished.connect(self.show_result)
+        self.transcriber.failed.connect(self.on_transcription_failed)
+
+    def amplify(self, samples):
+        """Применяет усиление громкости к отсчетам."""
+        return np.clip(samples.astype(np.int32) * self.volume_multiplier, -32768, 32767).astype(np.int16)
+
+    def collect_frames(self):
+        """Переносит накопленные в буфере отсчеты в запись с текущим усилением."""
+        samples = self.capture.read()
+        if len(samples):
+            samples = self.amplify(samples)
+            self.pcm += memoryview(samples)
+            if self.transcriber:
+                self.transcriber.feed(samples.tobytes())
+
     def update_visualization(self):
         if self.is_recording:
-            data = self.stream.read(1024, exception_on_overflow=False)
-            audio_data = np.frombuffer(data, dtype=np.int16)
-
-            # Применяем громкость (увеличиваем амплитуду сигнала)
-            audio_data = np.clip(audio_data * self.volume_multiplier, -32768, 32767).astype(np.int16)
-            self.frames.append(audio_data.tobytes())
-
-            # Обновляем график
-            self.plot_curve.setData(audio_data)
+            self.collect_frames()
+            self.plot_curve.setData(self.amplify(self.capture.latest(AUDIO_FRAMES_PER_BUFFER)))
+            if self.capture.dropped or self.capture.overflows:
+                self.info_label.setText(
+                    f"Идет запись... Потеряно отсчетов: {self.capture.dropped}, "
+                    f"переполнений входа: {self.capture.overflows}"
+                )
 
     def stop_recording(self):
         self.is_recording = False
-        self.record_button.setEnabled(True)
+        self.record_button.setEnabled(True)  # Следующую запись можно начать, не дожидаясь распознавания
         self.stop_button.setEnabled(False)
         self.info_label.setText("Запись завершена. Обработка...")
 
         self.timer.stop()
-        self.stream.stop_stream()
-        self.stream.close()
-        self.audio.terminate()
-
-        # Сохраняем запись
-        with wave.open(self.audio_file, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(16000)
-            wf.writeframes(b''.join(self.frames))
+        self.capture.stop()
+        self.collect_frames()
+        logging.info(f"Запись голоса завершена: {self.capture.stats()}")
+
+        # Запись передается распознаванию без копирования и без временного файла
+        self.audio_data = sr.AudioData(memoryview(self.pcm), AUDIO_RATE, AUDIO_SAMPLE_WIDTH)
+        self.save_button.setEnabled(bool(self.pcm))
+
+        # Текст уже распознавался по ходу записи - остается дождаться окончательного
+        if self.transcriber:
+            self.pending_audio[self.recording_number] = self.audio_data  # На случай сбоя потокового распознавания
+            self.transcriber.finish()
+            return
 
         # Преобразуем запись в текст
-        self.process_audio()
-
-    def process_audio(self):
-        recognizer = sr.Recognizer()
+        self.process_audio(self.audio_data)
+
+    def process_audio(self, audio_data, recording=None):
+        """Ставит запись (по умолчанию текущую) в очередь фонового распознавания."""
+        job_id = self.recognition.submit(audio_data)
+        self.job_recordings[job_id] = self.recording_number if recording is None else recording
+        self.update_recognition_status()
+
+    def update_recognition_status(self):
+        pending = self.recognition.pending_count()
+        self.cancel_recognition_button.setVisible(pending > 0)
+        self.recognition_progress.setVisible(pending > 0)
+        if pending > 1:
+            self.recognition_progress.setFormat(f"%p% (записей в очереди: {pending})")
+        else:
+            self.recognition_progress.setFormat("%p%")
+        self.close_if_done()
+
+    def recognition_pending(self):
+        """Записи, окончательный текст которых еще не получен (в очереди и по ходу записи)."""
+        return self.recognition.pending_count() + len(self.pending_audio)
+
+    def close_if_done(self):
+        """Закрывает окно, отложенное до окончания распознавания."""
+        if self.close_when_done and not self.recognition_pending():
+            self.close()
+
+    def on_recognition_started(self, job_id, queued):
+        # Пока не пришел прогресс (движок без open_stream), показываем бегущий индикатор
+        self.recognition_progress.setRange(0, 0)
+        self.info_label.setText("Распознавание записи...")
+        self.update_recognition_status()
+
+    def on_recognition_progress(self, job_id, percent):
+        self.recognition_progress.setRange(0, 100)
+        self.recognition_progress.setValue(percent)
+
+    def on_recognition_finished(self, job_id, result):
+        self.show_result(self.job_recordings.pop(job_id), result)
+        self.update_recognition_status()
+
+    def on_recognition_failed(self, job_id, error):
+        self.job_recordings.pop(job_id, None)
+        self.info_label.setText(f"Ошибка преобразования: {error}")
+        self.update_recognition_status()
+
+    def on_recognition_cancelled(self, job_id):
+        self.job_recordings.pop(job_id, None)
+        self.info_label.setText("Распознавание отменено.")
+        self.update_recognition_status()
+
+    def cancel_recognition(self):
+        """Отменяет распознавание текущей и всех ожидающих записей."""
+        self.recognition.cancel_all()
+
+    def show_dictation(self):
+        """Выводит текст записей этого окна в порядке записи и гипотезу текущей записи."""
+        texts = [self.dictated[number] for number in sorted(self.dictated)]
+        if self.partial_text:
+            texts.append(self.partial_text)
+        self.target_text_edit.setText(" ".join(texts))
+
+    def show_partial(self, session, text):
+        """Показывает текущую гипотезу вслед за уже распознанными записями."""
+        if session != self.recording_number:
+            return  # Гипотеза прежней записи, уже замененная окончательным текстом или новой записью
+        self.partial_text = text
+        self.show_dictation()
+
+    def show_result(self, recording, result):
+        """Выводит окончательный текст распознавания записи и показатели движка."""
+        self.pending_audio.pop(recording, None)
+        if recording == self.recording_number:
+            self.partial_text = ""
+        if not result.text:
+            self.show_dictation()
+            self.info_label.setText("Речь не распознана.")
+            self.close_if_done()
+            return
+        # Текст каждой следующей записи в этом окне дописывается к предыдущим
+        self.dictated[recording] = result.text
+        self.show_dictation()
+        rtf = f", RTF {result.rtf:.2f}" if result.rtf is not None else ""
+        self.info_label.setText(
+            f"Голос успешно преобразован в текст ({result.engine}: {result.latency:.1f} с{rtf})."
+        )
+        self.close_if_done()
+
+    def on_transcription_failed(self, session, error):
+        # Потоковое распознавание не удалось - распознаем запись целиком
+        if session == self.recording_number:
+            self.transcriber = None
+            self.partial_text = ""
+        audio_data = self.pending_audio.pop(session, None)  # Нет, если запись еще идет
+        if audio_data is not None:
+            self.process_audio(audio_data, session)
+
+    def save_recording(self):
+        """Сохраняет последнюю запись в WAV-файл по выбору пользователя."""
+        if self.audio_data is None:
+            return
+        default_name = f"Запись_{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}.wav"
+        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить запись", default_name, "WAV (*.wav)")
+        if not file_path:
+            return
         try:
-            with sr.AudioFile(self.audio_file) as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data, language="ru-RU")  # Используем русский язык
-                self.target_text_edit.setText(text)
-                self.info_label.setText("Голос успешно преобразован в текст.")
-        except Exception as e:
-            self.info_label.setText(f"Ошибка преобразования: {e}")
+            with wave.open(file_path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(AUDIO_SAMPLE_WIDTH)
+                wf.setframerate(AUDIO_RATE)
+                wf.writeframes(self.audio_data.frame_data)
+            logging.info(f"Запись голоса сохранена в {file_path}")
+        except OSError as e:
+            logging.error(f"Ошибка при сохранении записи голоса: {e}")
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить запись: {e}")
 
     def closeEvent(self, event):
-        """Сохраняем положение ползунка громкости при закрытии окна."""
+        """Сохраняем положение ползунка громкости при закрытии окна.
+
+        Незаконченная запись отбрасывается. Если распознавание остановленных
+        записей еще идет, пользователь выбирает: дождаться текста (окно
+        закроется само) или закрыть окно без него.
+        """
+        if self.is_recording:
+            self.timer.stop()
+            self.capture.stop()
+            self.is_recording = False
+            if self.transcriber:
+                self.transcriber.cancel()
+                self.transcriber = None
+        if self.recognition_pending() and not self.close_when_done:
+            answer = QMessageBox.question(
+                self, "Распознавание записи",
+                "Распознавание записи еще не закончено. Дождаться текста?\n"
+                "Окно закроется, когда текст будет вставлен. 'Нет' - закрыть окно без него.",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+            )
+            if answer == QMessageBox.Yes:
+                self.close_when_done = True
+                self.record_button.setEnabled(False)
+                self.info_label.setText("Окно закроется после окончания распознавания...")
+                event.ignore()
+                return
+        if self.transcriber:
+            self.transcriber.cancel()
+        self.recognition.stop()
         self.settings.setValue("volume", self.volume_slider.value())
         event.accept()  # Закрываем окно
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Процессы пакетного экспорта в собранном .exe
+    if sys.argv[1:2] == ["import"]:
+        sys.exit(import_cli(sys.argv[2:]))
+
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(":/images/bogatyr.ico"))  # Устанавливаем иконку для всего приложения
     window = LoginWindow()
@@ -0,0 +1,95 @@
+"""Общие фикстуры тестов.
+
+Тесты с базой данных выполняются, только если в переменной окружения
+JOURNAL_TEST_DSN задана строка подключения libpq к тестовой базе, например
+"host=localhost dbname=shift_journal_test user=postgres". Таблицы создаются
+заново в отдельной схеме journal_test, которая удаляется после теста, поэтому
+тесты могут фиксировать транзакции, а рабочие таблицы в public не затрагиваются.
+"""
+import os
+import sys
+from time import monotonic
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+import psycopg2.extensions  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QComboBox, QDateEdit, QListWidget, QWidget  # noqa: E402
+
+import journal  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+def wait_until(qapp, condition, timeout=5):
+    """Обрабатывает события Qt, пока condition() не станет истинным или не истечет timeout (с)."""
+    deadline = monotonic() + timeout
+    while not condition() and monotonic() < deadline:
+        qapp.processEvents()
+    return condition()
+
+
+@pytest.fixture
+def dsn():
+    """Параметры подключения к тестовой базе (dict для psycopg2.connect)."""
+    value = os.environ.get("JOURNAL_TEST_DSN")
+    if not value:
+        pytest.skip("JOURNAL_TEST_DSN не задан: тесты с базой данных пропущены")
+    return psycopg2.extensions.parse_dsn(value)
+
+
+@pytest.fixture
+def db_cursor(dsn):
+    """Курсор со схемой журнала последней версии в journal_test; схема удаляется после теста."""
+    connection = psycopg2.connect(**dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DROP SCHEMA IF EXISTS journal_test CASCADE")
+            cursor.execute("CREATE SCHEMA journal_test")
+            cursor.execute("SET search_path TO journal_test, public")
+            journal.apply_migrations(cursor)
+            connection.commit()
+            yield cursor
+    finally:
+        connection.rollback()
+        with connection.cursor() as cursor:
+            cursor.execute("DROP SCHEMA IF EXISTS journal_test CASCADE")
+        connection.commit()
+        connection.close()
+
+
+class EngineerPanel(QWidget):
+    """Виджеты выбора смены и инженеров с методами MainWindow, которые их заполняют."""
+
+    show_cached_shift = journal.MainWindow.show_cached_shift
+    fill_engineers = journal.MainWindow.fill_engineers
+
+    def __init__(self, mirror=None):
+        super().__init__()
+        self.mirror = mirror
+        self.shown_directory = None
+        self.records = None
+        self.date_edit = QDateEdit(self)
+        self.shift_combo = QComboBox(self)
+        self.shift_combo.addItems(["1-я смена", "2-я смена"])
+        self.engineer_select_combo = QComboBox(self)
+        self.engineer_list = QListWidget(self)
+
+    def fill_journal_table(self, records):
+        self.records = records
+
+    def engineer_names(self):
+        return [self.engineer_list.item(row).text() for row in range(self.engineer_list.count())]
+
+
+@pytest.fixture
+def engineer_panel(qapp):
+    panel = EngineerPanel()
+    yield panel
+    panel.deleteLater()
@@ -0,0 +1,126 @@
+"""Кольцевой буфер захвата звука: переход через конец массива и учет потерь."""
+import threading
+from time import sleep
+
+import numpy as np
+import pytest
+
+import journal
+
+
+def samples(start, count):
+    return (np.arange(start, start + count) % 30000).astype(np.int16)
+
+
+def test_reads_in_write_order_across_wraparound():
+    ring = journal.AudioRingBuffer(10)
+    read = []
+    for start in range(0, 42, 7):
+        ring.write(samples(start, 7))
+        read.append(ring.read())
+    assert np.array_equal(np.concatenate(read), samples(0, 42))
+    assert ring.dropped == 0
+    assert len(ring.read()) == 0
+
+
+def test_lagging_reader_drops_overwritten_samples():
+    ring = journal.AudioRingBuffer(10)
+    ring.write(samples(0, 6))
+    ring.write(samples(6, 6))
+    ring.write(samples(12, 6))
+
+    assert np.array_equal(ring.read(), samples(8, 10))
+    assert ring.dropped == 8
+    assert ring.written == ring.read_pos == 18
+
+
+def test_write_larger_than_capacity_keeps_tail():
+    ring = journal.AudioRingBuffer(10)
+    ring.write(samples(0, 3))
+    assert np.array_equal(ring.read(), samples(0, 3))
+
+    ring.write(samples(3, 25))
+
+    assert ring.written == 28
+    assert np.array_equal(ring.read(), samples(18, 10))
+    assert ring.dropped == 15
+
+
+def test_latest_does_not_move_read_position():
+    ring = journal.AudioRingBuffer(10)
+    ring.write(samples(0, 14))
+    assert np.array_equal(ring.latest(4), samples(10, 4))
+    assert np.array_equal(ring.latest(100), samples(4, 10))
+    assert np.array_equal(ring.read(), samples(4, 10))
+    assert ring.dropped == 4
+
+
+class FixedRateStream:
+    """Поддельный входной поток: buffers буферов отсчетов samples() с паузой pause из своего потока."""
+
+    def __init__(self, rate, frames_per_buffer, callback, buffers=200, pause=0.0005, overflow_every=0):
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.buffers = buffers
+        self.pause = pause
+        self.overflow_every = overflow_every
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        for index in range(self.buffers):
+            overflow = self.overflow_every and (index + 1) % self.overflow_every == 0
+            data = samples(index * self.frames_per_buffer, self.frames_per_buffer).tobytes()
+            self.callback(data, self.frames_per_buffer, None, journal.pyaudio.paInputOverflow if overflow else 0)
+            sleep(self.pause)
+        self.done.set()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.thread.join()
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("read_interval, overflow_every", [(0.001, 0), (0.05, 10)])
+def test_capture_accounts_for_every_sample(read_interval, overflow_every):
+    streams = []
+
+    def factory(rate, frames_per_buffer, callback):
+        streams.append(FixedRateStream(rate, frames_per_buffer, callback, overflow_every=overflow_every))
+        return streams[0]
+
+    capture = journal.AudioCapture(rate=1000, frames_per_buffer=50, buffer_seconds=1, stream_factory=factory)
+    capture.start()
+    read = 0
+    while True:
+        finished = streams[0].done.is_set()
+        chunk = capture.read()
+        # Прочитанное - непрерывный отрезок, заканчивающийся последним записанным отсчетом
+        assert np.array_equal(chunk, samples(capture.ring.read_pos - len(chunk), len(chunk)))
+        read += len(chunk)
+        if finished:
+            break
+        sleep(read_interval)
+    capture.stop()
+
+    stats = capture.stats()
+    assert stats["captured"] == 200 * 50
+    assert stats["callbacks"] == 200
+    assert stats["captured"] == read + stats["dropped"]
+    assert stats["overflows"] == (200 // overflow_every if overflow_every else 0)
+
+
+def test_capture_without_reader_keeps_last_buffer_seconds():
+    capture = journal.AudioCapture(
+        rate=1000, frames_per_buffer=50, buffer_seconds=1,
+        stream_factory=lambda rate, frames, callback: FixedRateStream(rate, frames, callback, pause=0),
+    )
+    capture.start()
+    capture.stop()
+
+    assert np.array_equal(capture.read(), samples(200 * 50 - 1000, 1000))
+    assert capture.dropped == 200 * 50 - 1000
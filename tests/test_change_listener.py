@@ -0,0 +1,38 @@
+"""Подписка на изменения журнала: подключение вне GUI-потока и переподключение."""
+import json
+
+import psycopg2
+from PyQt5.QtCore import QThreadPool
+
+import journal
+from conftest import wait_until
+
+
+def test_connects_in_background_and_receives_notifications(qapp, dsn):
+    thread_pool = QThreadPool()
+    listener = journal.ChangeListener(dsn, thread_pool)
+    try:
+        assert listener.connection is None  # Конструктор не ждет подключения
+        assert wait_until(qapp, lambda: listener.connection is not None)
+
+        received = []
+        listener.changed.connect(received.append)
+        sender = psycopg2.connect(**dsn)
+        sender.autocommit = True
+        with sender.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", (journal.CHANGES_CHANNEL, json.dumps({"id": 7})))
+        sender.close()
+        assert wait_until(qapp, lambda: received)
+        assert received == [{"id": 7}]
+    finally:
+        listener.close()
+        thread_pool.waitForDone()
+
+
+def test_close_cancels_scheduled_reconnect(qapp, dsn):
+    thread_pool = QThreadPool()
+    listener = journal.ChangeListener({**dsn, "dbname": "journal_test_missing"}, thread_pool)
+    assert wait_until(qapp, listener.reconnect_timer.isActive)
+    listener.close()
+    assert not listener.reconnect_timer.isActive()
+    thread_pool.waitForDone()
@@ -0,0 +1,41 @@
+import math
+import threading
+
+import psycopg2.pool
+import pytest
+
+import journal
+
+
+@pytest.fixture
+def pool(dsn):
+    pool = journal.ConnectionPool(minconn=1, maxconn=1, acquire_timeout=0.2, **dsn)
+    yield pool
+    pool.closeall()
+
+
+def test_busy_pool_raises_pool_error_after_timeout(pool):
+    with pool.cursor():
+        started = journal.monotonic()
+        with pytest.raises(psycopg2.pool.PoolError):
+            with pool.cursor():
+                pass
+        assert journal.monotonic() - started < 2
+    assert pool.metrics()["in_use"] == 0
+
+
+def test_background_wait_has_no_timeout(pool):
+    results = []
+
+    def background():
+        with pool.cursor(timeout=math.inf) as cursor:
+            cursor.execute("SELECT 1")
+            results.append(cursor.fetchone()[0])
+
+    with pool.cursor():
+        thread = threading.Thread(target=background)
+        thread.start()
+        thread.join(0.5)  # Дольше acquire_timeout: фоновая задача продолжает ждать
+        assert thread.is_alive()
+    thread.join(5)
+    assert results == [1]
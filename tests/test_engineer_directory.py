@@ -0,0 +1,71 @@
+"""Кэш справочника инженеров и ComboBox выбора инженера."""
+import journal
+
+
+def add_engineer(cursor, full_name, tab_number):
+    cursor.execute("INSERT INTO engineers_info (full_name, tab_number) VALUES (%s, %s)", (full_name, tab_number))
+
+
+def test_repeated_get_is_cache_hit(db_cursor):
+    add_engineer(db_cursor, "Иванов И.И.", "101")
+    directory = journal.EngineerDirectory()
+
+    first = directory.get(db_cursor)
+    second = directory.get(db_cursor)
+
+    assert first == [("Иванов И.И.", "101")]
+    assert second is first
+    assert directory.stats()["hits"] == 1
+    assert directory.stats()["misses"] == 1
+
+
+def test_invalidate_forces_reload(db_cursor):
+    add_engineer(db_cursor, "Иванов И.И.", "101")
+    directory = journal.EngineerDirectory()
+    directory.get(db_cursor)
+
+    directory.invalidate()
+    directory.get(db_cursor)
+
+    assert directory.stats()["hits"] == 0
+    assert directory.stats()["misses"] == 2
+
+
+def test_change_counter_move_forces_reload(db_cursor):
+    add_engineer(db_cursor, "Иванов И.И.", "101")
+    directory = journal.EngineerDirectory()
+    directory.get(db_cursor)
+    version = directory.stats()["version"]
+
+    # Изменение с другого рабочего места: кэш не сброшен, но счетчик сдвигается триггером
+    add_engineer(db_cursor, "Петров П.П.", "102")
+    engineers = directory.get(db_cursor)
+
+    assert engineers == [("Иванов И.И.", "101"), ("Петров П.П.", "102")]
+    assert directory.stats()["misses"] == 2
+    assert directory.stats()["version"] > version
+
+
+def test_combo_not_rebuilt_on_cache_hit(db_cursor, engineer_panel):
+    add_engineer(db_cursor, "Иванов И.И.", "101")
+    add_engineer(db_cursor, "Петров П.П.", "102")
+    directory = journal.EngineerDirectory()
+    engineer_panel.fill_engineers((directory.get(db_cursor), [("Иванов И.И.",)]))
+    engineer_panel.engineer_select_combo.setCurrentIndex(1)
+    rebuilds = []
+    engineer_panel.engineer_select_combo.model().rowsRemoved.connect(lambda *args: rebuilds.append(args))
+
+    engineer_panel.fill_engineers((directory.get(db_cursor), [("Петров П.П.",)]))
+
+    assert rebuilds == []
+    assert engineer_panel.engineer_select_combo.currentText() == "Петров П.П."
+    assert engineer_panel.engineer_names() == ["Петров П.П."]
+
+
+def test_combo_rebuilt_when_directory_changes(engineer_panel):
+    engineer_panel.fill_engineers(([("Иванов И.И.", "101")], []))
+
+    engineer_panel.fill_engineers(([("Иванов И.И.", "101"), ("Петров П.П.", "102")], []))
+
+    combo = engineer_panel.engineer_select_combo
+    assert [combo.itemText(index) for index in range(combo.count())] == ["Иванов И.И.", "Петров П.П."]
@@ -0,0 +1,166 @@
+"""Экспорт журнала: чтение отчетов смен из базы данных и запись в файлы."""
+import concurrent.futures
+import csv
+import datetime
+import os
+
+import docx
+import pytest
+
+import journal
+
+DAY = datetime.date(2024, 3, 1)
+
+
+def add_shift_engineer(cursor, date, shift, name):
+    cursor.execute("INSERT INTO engineers (date, shift, name) VALUES (%s, %s, %s)", (date, shift, name))
+
+
+def add_record(cursor, date, shift, time, content, note=""):
+    cursor.execute(
+        "INSERT INTO journal (date, shift, time, content, note) VALUES (%s, %s, %s, %s, %s)",
+        (date, shift, time, content, note)
+    )
+
+
+def read_reports(reports):
+    return [(report.date, report.shift, report.engineers, list(report.entries)) for report in reports]
+
+
+def test_iter_shift_reports_merges_engineers_and_entries(db_cursor):
+    next_day = DAY + datetime.timedelta(days=1)
+    last_day = DAY + datetime.timedelta(days=2)
+    # Первая смена без записей, вторая без инженеров, следующий день пуст
+    add_shift_engineer(db_cursor, DAY, "1-я смена", "Иванов И.И.")
+    add_record(db_cursor, DAY, "2-я смена", datetime.time(21, 0), "пуск насоса")
+    add_record(db_cursor, last_day, "1-я смена", datetime.time(9, 30), "обход")
+    add_record(db_cursor, last_day, "1-я смена", datetime.time(8, 0), "прием смены", "без замечаний")
+    add_shift_engineer(db_cursor, last_day, "1-я смена", "Петров П.П.")
+    add_shift_engineer(db_cursor, last_day, "1-я смена", "Сидоров С.С.")
+
+    reports = read_reports(journal.iter_shift_reports(db_cursor.connection, DAY, last_day, batch_size=1))
+
+    assert reports == [
+        (DAY, "1-я смена", ["Иванов И.И."], []),
+        (DAY, "2-я смена", [], [(datetime.time(21, 0), "пуск насоса", "")]),
+        (last_day, "1-я смена", ["Петров П.П.", "Сидоров С.С."], [
+            (datetime.time(8, 0), "прием смены", "без замечаний"),
+            (datetime.time(9, 30), "обход", ""),
+        ]),
+    ]
+    assert next_day not in [report[0] for report in reports]
+
+
+def test_iter_shift_reports_filters_shift(db_cursor):
+    add_shift_engineer(db_cursor, DAY, "1-я смена", "Иванов И.И.")
+    add_shift_engineer(db_cursor, DAY, "2-я смена", "Петров П.П.")
+
+    reports = read_reports(journal.iter_shift_reports(db_cursor.connection, DAY, DAY, "2-я смена"))
+
+    assert reports == [(DAY, "2-я смена", ["Петров П.П."], [])]
+
+
+def test_iter_shift_reports_empty_period(db_cursor):
+    assert read_reports(journal.iter_shift_reports(db_cursor.connection, DAY, DAY)) == []
+
+
+def docx_text(path):
+    document = docx.Document(path)
+    paragraphs = [paragraph.text for paragraph in document.paragraphs]
+    rows = [[cell.text for cell in row.cells] for table in document.tables for row in table.rows]
+    return paragraphs, rows
+
+
+def test_batch_export_writes_file_per_shift_in_worker_processes(db_cursor, dsn, tmp_path):
+    add_shift_engineer(db_cursor, DAY, "1-я смена", "Иванов И.И.")
+    add_record(db_cursor, DAY, "1-я смена", datetime.time(8, 0), "прием смены")
+    add_record(db_cursor, DAY, "1-я смена", datetime.time(9, 30), "пуск насоса", "<норма>")
+    add_shift_engineer(db_cursor, DAY, "2-я смена", "Петров П.П.")
+    add_record(db_cursor, DAY, "2-я смена", datetime.time(21, 0), "обход")
+    db_cursor.connection.commit()
+    # Обработчики открывают свои соединения: таблицы теста лежат в схеме journal_test
+    worker_dsn = dict(dsn, options="-c search_path=journal_test,public")
+    empty_day = DAY + datetime.timedelta(days=1)
+    jobs = journal.batch_export_jobs(DAY, empty_day, False, str(tmp_path))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        results = [executor.submit(journal.export_batch_file, worker_dsn, *job).result(timeout=60) for job in jobs]
+
+    assert results[2:] == [None, None]
+    assert results[:2] == [(jobs[0][0], 1, 2), (jobs[1][0], 1, 1)]
+    paragraphs, rows = docx_text(jobs[0][0])
+    assert "Иванов И.И." in paragraphs
+    assert rows[1:] == [["08:00", "прием смены", ""], ["09:30", "пуск насоса", "<норма>"]]
+    paragraphs, rows = docx_text(jobs[1][0])
+    assert "Петров П.П." in paragraphs
+    assert rows[1:] == [["21:00", "обход", ""]]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        os.path.basename(path) for path, _, _, _ in jobs[:2]
+    )
+
+
+def sample_reports():
+    return [
+        journal.ShiftReport(DAY, "1-я смена", ["Иванов И.И."], iter([
+            (datetime.time(8, 0), "прием смены", None),
+            (datetime.time(9, 30), "давление <норма>", "a & b"),
+        ])),
+        journal.ShiftReport(DAY, "2-я смена", [], iter([(None, "обход", "")])),
+    ]
+
+
+def test_export_reports_writes_all_formats(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    paths = {extension: str(tmp_path / f"journal.{extension}") for extension in ("csv", "xlsx", "docx", "html")}
+    exporters = [journal.EXPORTERS[extension](path) for extension, path in paths.items()]
+    progress = []
+
+    stats = journal.export_reports(sample_reports(), exporters, progress=lambda *args: progress.append(args))
+
+    assert stats == {"shifts": 2, "entries": 3, "cancelled": False}
+    assert progress == [(1, 2), (2, 3)]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths.values())
+
+    with open(paths["csv"], newline="", encoding="utf-8-sig") as file:
+        assert list(csv.reader(file, delimiter=";")) == [
+            ["Дата", "Смена", "Время", "Содержание", "Примечание"],
+            ["2024-03-01", "1-я смена", "08:00", "прием смены", ""],
+            ["2024-03-01", "1-я смена", "09:30", "давление <норма>", "a & b"],
+            ["2024-03-01", "2-я смена", "", "обход", ""],
+        ]
+
+    workbook = openpyxl.load_workbook(paths["xlsx"], read_only=True)
+    try:
+        journal_rows = [list(row) for row in workbook["Журнал"].iter_rows(min_row=2, values_only=True)]
+        engineer_rows = [list(row) for row in workbook["Инженеры"].iter_rows(min_row=2, values_only=True)]
+    finally:
+        workbook.close()
+    midnight = datetime.datetime.combine(DAY, datetime.time())
+    assert [row[1:] for row in journal_rows] == [
+        ["1-я смена", "08:00", "прием смены", None],
+        ["1-я смена", "09:30", "давление <норма>", "a & b"],
+        ["2-я смена", None, "обход", None],
+    ]
+    assert {row[0] for row in journal_rows} == {midnight}
+    assert engineer_rows == [[midnight, "1-я смена", "Иванов И.И."]]
+
+    paragraphs, rows = docx_text(paths["docx"])
+    assert "Иванов И.И." in paragraphs
+    assert [row for row in rows if row[0] != "Время"] == [
+        ["08:00", "прием смены", ""], ["09:30", "давление <норма>", "a & b"], ["", "обход", ""],
+    ]
+
+    with open(paths["html"], encoding="utf-8") as file:
+        page = file.read()
+    assert "давление &lt;норма&gt;" in page
+    assert "a &amp; b" in page
+    assert "<норма>" not in page
+
+
+def test_export_reports_removes_files_when_cancelled(tmp_path):
+    path = str(tmp_path / "journal.csv")
+
+    stats = journal.export_reports(sample_reports(), [journal.CsvExporter(path)], cancelled=lambda: True)
+
+    assert stats == {"shifts": 0, "entries": 0, "cancelled": True}
+    assert os.listdir(tmp_path) == []
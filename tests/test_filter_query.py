@@ -0,0 +1,87 @@
+"""Постраничная выборка фильтра журнала по ключу (event_ts, id)."""
+import datetime
+
+import pytest
+
+import journal
+
+
+def read_all_pages(cursor, content_filter="", page_size=2):
+    """Листает фильтр вперед до конца, затем назад до начала, как FilterDialog."""
+    def fetch(after_key=None, before_key=None):
+        query, params = journal.build_filter_query(
+            content_filter, "", after_key, before_key, limit=page_size + 1
+        )
+        cursor.execute(query, params)
+        return cursor.fetchall()[:page_size]
+
+    pages = [fetch()]
+    while True:
+        records = fetch(after_key=(pages[-1][-1][6], pages[-1][-1][0]))
+        if not records:
+            break
+        pages.append(records)
+
+    backward = [pages[-1]]
+    while True:
+        records = fetch(before_key=(backward[-1][0][6], backward[-1][0][0]))
+        if not records:
+            break
+        backward.append(list(reversed(records)))
+    return pages, backward
+
+
+@pytest.fixture
+def journal_rows(db_cursor):
+    """Записи с разобранным временем и без него; возвращает id в порядке выборки."""
+    day = datetime.date(2024, 3, 1)
+    rows = [
+        (day, "1-я смена", datetime.time(9, 0), "запись насос 1"),
+        (day, "1-я смена", datetime.time(10, 0), "запись насос 2"),
+        (day, "1-я смена", datetime.time(11, 0), "запись насос 3"),
+        (day, "1-я смена", None, "запись насос без времени 1"),
+        (day, "2-я смена", None, "запись насос без времени 2"),
+        (day, "2-я смена", None, "запись насос без времени 3"),
+    ]
+    ids = []
+    for row in rows:
+        db_cursor.execute(
+            "INSERT INTO journal (date, shift, time, content) VALUES (%s, %s, %s, %s) RETURNING id", row
+        )
+        ids.append(db_cursor.fetchone()[0])
+    return ids
+
+
+def test_keyset_branches_cover_null_tail():
+    moment = datetime.datetime(2024, 3, 1, 9, 0)
+    assert journal.keyset_branches() == [("TRUE", [])]
+    assert journal.keyset_branches(after_key=(moment, 5)) == [
+        ("(event_ts, id) > (%s, %s)", [moment, 5]), ("event_ts IS NULL", [])
+    ]
+    assert journal.keyset_branches(after_key=(None, 5)) == [("event_ts IS NULL AND id > %s", [5])]
+    assert journal.keyset_branches(before_key=(moment, 5)) == [("(event_ts, id) < (%s, %s)", [moment, 5])]
+    assert journal.keyset_branches(before_key=(None, 5)) == [
+        ("event_ts IS NULL AND id < %s", [5]), ("event_ts IS NOT NULL", [])
+    ]
+
+
+@pytest.mark.parametrize("content_filter", ["", "насос"])
+def test_query_params_match_placeholders(content_filter):
+    moment = datetime.datetime(2024, 3, 1, 9, 0)
+    for keys in ({}, {"after_key": (moment, 1)}, {"before_key": (None, 1)}):
+        query, params = journal.build_filter_query(content_filter, "", limit=11, **keys)
+        assert query.count("%s") == len(params)
+
+
+@pytest.mark.parametrize("content_filter", ["", "на", "насос"])
+def test_pages_cross_rows_without_time(db_cursor, journal_rows, content_filter):
+    assert len("насос") >= journal.TRIGRAM_MIN_LENGTH > len("на")
+    pages, backward = read_all_pages(db_cursor, content_filter)
+
+    forward_ids = [row[0] for page in pages for row in page]
+    assert forward_ids == journal_rows
+    # Граница страниц проходит и между записями без времени
+    assert [row[6] for row in pages[1]] == [datetime.datetime(2024, 3, 1, 11, 0), None]
+    assert [[row[0] for row in page] for page in backward] == [
+        [row[0] for row in page] for page in reversed(pages)
+    ]
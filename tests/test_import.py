@@ -0,0 +1,165 @@
+"""Массовый импорт: нормализация значений и обработка строк BulkImporter."""
+import csv
+import datetime
+
+import pytest
+
+import journal
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-03-01", "2024-03-01"),
+    ("01.03.2024", "2024-03-01"),
+    ("01.03.24", "2024-03-01"),
+    (" 01/03/2024 ", "2024-03-01"),
+    (datetime.datetime(2024, 3, 1, 8, 30), "2024-03-01"),
+    (datetime.date(2024, 3, 1), "2024-03-01"),
+])
+def test_normalize_import_date(value, expected):
+    assert journal.normalize_import_date(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", None, "30.02.2024", "2024/03/01", "вчера"])
+def test_normalize_import_date_rejects(value):
+    with pytest.raises(ValueError):
+        journal.normalize_import_date(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1", "1-я смена"),
+    ("2-я смена", "2-я смена"),
+    (" Вторая  смена ", "2-я смена"),
+    ("ночь", "2-я смена"),
+    ("Дневная", "1-я смена"),
+    (2.0, "2-я смена"),
+])
+def test_normalize_import_shift(value, expected):
+    assert journal.normalize_import_shift(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", None, "3", "третья смена", 1.5])
+def test_normalize_import_shift_rejects(value):
+    with pytest.raises(ValueError):
+        journal.normalize_import_shift(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("8:30", "08:30"),
+    ("08.30", "08:30"),
+    ("0830", "08:30"),
+    ("830", "08:30"),
+    ("20:30:15", "20:30"),
+    (datetime.time(20, 30), "20:30"),
+])
+def test_normalize_import_time(value, expected):
+    assert journal.normalize_import_time(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", None, "24:00", "08:60", "8", "восемь"])
+def test_normalize_import_time_rejects(value):
+    with pytest.raises(ValueError):
+        journal.normalize_import_time(value)
+
+
+def test_copy_text_escapes_copy_format():
+    assert journal.copy_text(None) == "\\N"
+    assert journal.copy_text("a\tb\nc\\d\r") == "a\\tb\\nc\\\\d\\r"
+
+
+def test_normalize_engineer_rejects_empty_name():
+    importer = journal.BulkImporter("engineers")
+    assert importer.normalize({"date": "01.03.2024", "shift": "1", "name": " Иванов  И.И. "}) == [
+        "2024-03-01", "1-я смена", "Иванов И.И."
+    ]
+    with pytest.raises(ValueError):
+        importer.normalize({"date": "01.03.2024", "shift": "1", "name": "  "})
+
+
+def test_unknown_table_is_rejected():
+    with pytest.raises(ValueError):
+        journal.BulkImporter("engineers_info")
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        csv.writer(file, delimiter=";").writerows(rows)
+
+
+def test_run_loads_valid_rows_and_writes_rejected(db_cursor, tmp_path):
+    path = tmp_path / "journal.csv"
+    write_csv(path, [
+        ["Дата", "Смена", "Время", "Содержание", "Примечание"],
+        ["01.03.2024", "1", "8:45", "пуск насоса", ""],
+        ["", "", "", "", ""],
+        ["01.03.2024", "5", "9:00", "неизвестная смена", ""],
+        ["01.03.2024", "ночь", "0215", "обход\tс табуляцией", "без замечаний"],
+        ["31.02.2024", "1", "10:00", "некорректная дата", ""],
+        ["02.03.2024", "2", "21:00", "останов насоса", ""],
+    ])
+    progress = []
+    importer = journal.BulkImporter("journal", chunk_size=2, progress=lambda *args: progress.append(args))
+
+    stats = importer.run(db_cursor, str(path))
+
+    assert (stats["loaded"], stats["rejected"], stats["cancelled"]) == (3, 2, False)
+    assert [loaded for loaded, _, _ in progress] == [2, 3]
+    db_cursor.execute("SELECT date::text, shift, time::text, content, note FROM journal ORDER BY id")
+    assert db_cursor.fetchall() == [
+        ("2024-03-01", "1-я смена", "08:45:00", "пуск насоса", ""),
+        ("2024-03-01", "2-я смена", "02:15:00", "обход\tс табуляцией", "без замечаний"),
+        ("2024-03-02", "2-я смена", "21:00:00", "останов насоса", ""),
+    ]
+    with open(stats["rejected_path"], newline="", encoding="utf-8-sig") as file:
+        rejected = list(csv.reader(file))
+    assert [row[0] for row in rejected] == ["Строка", "4", "6"]
+    assert "неизвестная смена" in rejected[1][1]
+
+
+def test_run_requires_mandatory_columns(db_cursor, tmp_path):
+    path = tmp_path / "journal.csv"
+    write_csv(path, [["Дата", "Содержание"], ["01.03.2024", "пуск"]])
+    with pytest.raises(ValueError, match="shift"):
+        journal.BulkImporter("journal").run(db_cursor, str(path))
+
+
+def test_run_closes_file_on_bad_header(tmp_path, monkeypatch):
+    path = tmp_path / "journal.csv"
+    write_csv(path, [["Дата", "Содержание"], ["01.03.2024", "пуск"]])
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(journal, "open", tracking_open, raising=False)
+    # excinfo держит кадр run(): файл должен закрыть finally, а не сборка мусора
+    with pytest.raises(ValueError) as excinfo:
+        journal.BulkImporter("journal").run(None, str(path))
+
+    assert excinfo.traceback
+    assert len(opened) == 1
+    assert opened[0].closed
+
+
+def test_run_stops_after_chunk_when_cancelled(db_cursor, tmp_path):
+    path = tmp_path / "engineers.csv"
+    write_csv(path, [["Дата", "Смена", "ФИО"]] + [["01.03.2024", "1", f"Инженер {i}"] for i in range(5)])
+    importer = journal.BulkImporter("engineers", chunk_size=2, cancelled=lambda: True)
+
+    stats = importer.run(db_cursor, str(path))
+
+    assert (stats["loaded"], stats["cancelled"]) == (2, True)
+
+
+def test_load_chunk_rejects_only_rows_refused_by_server(db_cursor, tmp_path):
+    importer = journal.BulkImporter("journal", chunk_size=10)
+    importer.rejected_path = str(tmp_path / "rejected.csv")
+    importer.load_chunk(db_cursor, [
+        ["2024-03-01", "1-я смена", "08:45", "пуск насоса", ""],
+        ["2024-03-01", "1-я смена", "не время", "ошибка", ""],
+    ])
+    importer._rejected_file.close()
+
+    assert (importer.loaded, importer.rejected) == (1, 1)
+    db_cursor.execute("SELECT content FROM journal")
+    assert db_cursor.fetchall() == [("пуск насоса",)]
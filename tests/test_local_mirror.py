@@ -0,0 +1,122 @@
+"""Локальная реплика смен: синхронизация с сервером и показ смены из реплики."""
+import datetime
+
+import pytest
+from PyQt5.QtCore import QDate
+
+import journal
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    return journal.LocalMirror(str(tmp_path / "mirror.db"))
+
+
+def server_today(cursor):
+    cursor.execute("SELECT current_date")
+    return cursor.fetchone()[0]
+
+
+def add_engineer(cursor, full_name, tab_number):
+    cursor.execute("INSERT INTO engineers_info (full_name, tab_number) VALUES (%s, %s)", (full_name, tab_number))
+
+
+def add_shift_engineer(cursor, date, shift, name):
+    cursor.execute("INSERT INTO engineers (date, shift, name) VALUES (%s, %s, %s)", (date, shift, name))
+
+
+def select_shift(panel, date, shift):
+    panel.date_edit.setDate(QDate(date.year, date.month, date.day))
+    panel.shift_combo.setCurrentText(shift)
+    panel.show_cached_shift()
+
+
+def test_switching_shift_from_warm_mirror_keeps_combo(db_cursor, mirror, engineer_panel):
+    today = server_today(db_cursor)
+    yesterday = today - datetime.timedelta(days=1)
+    add_engineer(db_cursor, "Иванов И.И.", "101")
+    add_engineer(db_cursor, "Петров П.П.", "102")
+    add_shift_engineer(db_cursor, today, "1-я смена", "Иванов И.И.")
+    add_shift_engineer(db_cursor, today, "2-я смена", "Петров П.П.")
+    add_shift_engineer(db_cursor, yesterday, "1-я смена", "Петров П.П.")
+    mirror.sync(db_cursor)
+    engineer_panel.mirror = mirror
+
+    select_shift(engineer_panel, today, "1-я смена")
+    combo = engineer_panel.engineer_select_combo
+    combo.setCurrentIndex(1)
+    rebuilds = []
+    combo.model().rowsRemoved.connect(lambda *args: rebuilds.append(args))
+
+    select_shift(engineer_panel, today, "2-я смена")
+    assert engineer_panel.engineer_names() == ["Петров П.П."]
+    select_shift(engineer_panel, yesterday, "1-я смена")
+    assert engineer_panel.engineer_names() == ["Петров П.П."]
+    # Ответ сервера с тем же справочником после показа из реплики
+    engineer_panel.fill_engineers((journal.EngineerDirectory().get(db_cursor), [("Петров П.П.",)]))
+
+    assert rebuilds == []
+    assert combo.count() == 2
+    assert combo.currentText() == "Петров П.П."
+
+
+def add_record(cursor, date, content, age=datetime.timedelta(hours=1)):
+    """Запись журнала, измененная age назад (триггер обновляет updated_at только при UPDATE)."""
+    cursor.execute(
+        "INSERT INTO journal (date, shift, time, content, note, updated_at) "
+        "VALUES (%s, '1-я смена', '09:00', %s, '', now() - %s) RETURNING id",
+        (date, content, age)
+    )
+    return cursor.fetchone()[0]
+
+
+def shift_contents(mirror, date, shift="1-я смена"):
+    records, _, _ = mirror.load_shift(date.isoformat(), shift)
+    return [record[4] for record in records]
+
+
+def test_load_shift_before_first_sync(mirror):
+    assert mirror.load_shift("2024-03-01", "1-я смена") is None
+
+
+def test_second_sync_pulls_only_changed_rows(db_cursor, mirror):
+    today = server_today(db_cursor)
+    first_id = add_record(db_cursor, today, "пуск насоса")
+    add_record(db_cursor, today, "останов насоса")
+    db_cursor.connection.commit()
+    assert mirror.sync(db_cursor) == 2
+    db_cursor.connection.commit()
+
+    db_cursor.execute("UPDATE journal SET content = 'пуск насоса 1' WHERE id = %s", (first_id,))
+    db_cursor.connection.commit()
+
+    assert mirror.sync(db_cursor) == 1
+    assert shift_contents(mirror, today) == ["пуск насоса 1", "останов насоса"]
+
+
+def test_server_deletion_removes_mirror_row(db_cursor, mirror):
+    today = server_today(db_cursor)
+    deleted_id = add_record(db_cursor, today, "ошибочная запись")
+    add_record(db_cursor, today, "пуск насоса")
+    db_cursor.connection.commit()
+    mirror.sync(db_cursor)
+    db_cursor.connection.commit()
+
+    db_cursor.execute("DELETE FROM journal WHERE id = %s", (deleted_id,))
+    db_cursor.connection.commit()
+
+    assert mirror.sync(db_cursor) == 1
+    assert shift_contents(mirror, today) == ["пуск насоса"]
+
+
+def test_sync_keeps_only_recent_shifts(db_cursor, mirror):
+    today = server_today(db_cursor)
+    oldest_kept = today - datetime.timedelta(days=journal.LocalMirror.KEEP_DAYS)
+    too_old = oldest_kept - datetime.timedelta(days=1)
+    add_record(db_cursor, oldest_kept, "в окне")
+    add_record(db_cursor, too_old, "за окном")
+    db_cursor.connection.commit()
+
+    assert mirror.sync(db_cursor) == 1
+    assert shift_contents(mirror, oldest_kept) == ["в окне"]
+    assert shift_contents(mirror, too_old) == []
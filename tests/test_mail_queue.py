@@ -0,0 +1,180 @@
+"""Очередь писем: отправка через локальный SMTP-сервер, повтор при 4xx и отказ при 5xx."""
+import socket
+import threading
+from contextlib import closing
+from email.message import EmailMessage
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import journal
+
+
+class Handler:
+    """SMTP-сервер отвечает на DATA кодами из responses по очереди, затем 250."""
+
+    def __init__(self):
+        self.responses = []
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.responses:
+            return self.responses.pop(0)
+        self.received.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+class Results:
+    def __init__(self):
+        self.sent = []
+        self.failed = []
+        self.event = threading.Event()
+
+    def on_sent(self, subject):
+        self.sent.append(subject)
+        self.event.set()
+
+    def on_failed(self, subject, error):
+        self.failed.append((subject, error))
+        self.event.set()
+
+    def wait(self, count):
+        for _ in range(50):
+            if len(self.sent) + len(self.failed) >= count:
+                return True
+            self.event.wait(0.1)
+            self.event.clear()
+        return False
+
+
+def make_message(subject, to="shift@example.com"):
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = "journal@example.com"
+    if to:
+        message["To"] = to
+    message.set_content("Сводка смены")
+    return message
+
+
+@pytest.fixture
+def make_queue(tmp_path, smtp_server):
+    queues = []
+
+    def make(results, sender=None):
+        settings = {
+            "host": "127.0.0.1", "port": smtp_server[1], "security": "none", "username": "", "password": "",
+            "timeout": 5,
+        }
+        queue = journal.MailQueue(
+            str(tmp_path / "outbox.db"), sender or journal.SmtpSender(settings), results.on_sent, results.on_failed
+        )
+        queue.BASE_DELAY = 0.05
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def outbox(queue):
+    with closing(journal.open_sqlite(queue.path)) as db:
+        return db.execute("SELECT subject, status, attempts FROM outbox ORDER BY id").fetchall()
+
+
+def test_message_is_sent_and_removed(smtp_server, make_queue):
+    handler, _ = smtp_server
+    results = Results()
+    queue = make_queue(results)
+    queue.enqueue(make_message("Сводка 1"))
+    queue.start()
+
+    assert results.wait(1)
+    assert results.sent == ["Сводка 1"]
+    assert [envelope.rcpt_tos for envelope in handler.received] == [["shift@example.com"]]
+    assert outbox(queue) == []
+
+
+def test_temporary_error_is_retried(smtp_server, make_queue):
+    handler, _ = smtp_server
+    handler.responses = ["451 Try again later", "421 Busy"]
+    results = Results()
+    queue = make_queue(results)
+    queue.enqueue(make_message("Сводка 2"))
+    queue.start()
+
+    assert results.wait(1)
+    assert results.sent == ["Сводка 2"]
+    assert len(handler.received) == 1
+    assert outbox(queue) == []
+
+
+def test_permanent_error_marks_message_failed(smtp_server, make_queue):
+    handler, _ = smtp_server
+    handler.responses = ["550 Mailbox unavailable"]
+    results = Results()
+    queue = make_queue(results)
+    queue.enqueue(make_message("Сводка 3"))
+    queue.start()
+
+    assert results.wait(1)
+    assert [subject for subject, _ in results.failed] == ["Сводка 3"]
+    assert "550" in results.failed[0][1]
+    assert outbox(queue) == [("Сводка 3", "failed", 1)]
+    assert queue.pending_count() == 0
+
+
+def test_unexpected_errors_do_not_stop_the_thread(smtp_server, make_queue):
+    class FailingResults(Results):
+        def on_sent(self, subject):
+            super().on_sent(subject)
+            raise RuntimeError("ошибка обработчика")
+
+    class Sender(journal.SmtpSender):
+        def send(self, message):
+            if message["Subject"] == "Без отправки":
+                raise ValueError("некорректное письмо")
+            super().send(message)
+
+    handler, port = smtp_server
+    results = FailingResults()
+    queue = make_queue(results, Sender({
+        "host": "127.0.0.1", "port": port, "security": "none", "username": "", "password": "", "timeout": 5,
+    }))
+    queue.enqueue(make_message("Без отправки"))
+    queue.enqueue(make_message("Сводка 4"))
+    queue.enqueue(make_message("Сводка 5"))
+    queue.start()
+
+    assert results.wait(3)
+    assert results.sent == ["Сводка 4", "Сводка 5"]
+    assert outbox(queue) == [("Без отправки", "failed", 1)]
+    assert queue._thread.is_alive()
+
+
+def test_keyed_message_is_queued_once(smtp_server, make_queue):
+    handler, _ = smtp_server
+    results = Results()
+    queue = make_queue(results)
+    assert queue.enqueue(make_message("Сводка 6"), key="shift_report:2024-03-01:1-я смена")
+    assert not queue.enqueue(make_message("Сводка 6"), key="shift_report:2024-03-01:1-я смена")
+    queue.start()
+
+    assert results.wait(1)
+    # Отправленное письмо с ключом повторно не ставится
+    assert not queue.enqueue(make_message("Сводка 6"), key="shift_report:2024-03-01:1-я смена")
+    assert len(handler.received) == 1
+    assert outbox(queue) == [("Сводка 6", "sent", 0)]
@@ -0,0 +1,87 @@
+"""Локальная очередь записей: повторная отправка не создает дублей."""
+import uuid
+
+import pytest
+
+import journal
+
+
+def insert_payload(content, time="09:00"):
+    return {"date": "2024-03-01", "shift": "1-я смена", "time": time, "content": content, "note": ""}
+
+
+def journal_rows(cursor):
+    cursor.execute("SELECT client_uuid::text, time::text, content, note FROM journal ORDER BY id")
+    return cursor.fetchall()
+
+
+@pytest.fixture
+def write_queue(tmp_path):
+    return journal.OfflineWriteQueue(str(tmp_path / "pending_writes.db"))
+
+
+def test_flush_removes_sent_writes(db_cursor, write_queue):
+    record_uuid = str(uuid.uuid4())
+    write_queue.enqueue("insert", record_uuid, insert_payload("пуск насоса"))
+
+    result = write_queue.flush(db_cursor)
+
+    assert write_queue.count() == 0
+    assert len(result["upserted"]) == 1
+    assert journal_rows(db_cursor) == [(record_uuid, "09:00:00", "пуск насоса", "")]
+
+
+def test_resending_after_lost_cleanup_is_idempotent(db_cursor, write_queue):
+    """Сбой между commit в PostgreSQL и очисткой очереди: те же операции уходят повторно."""
+    record_uuid = str(uuid.uuid4())
+    writes = [
+        ("insert", record_uuid, insert_payload("пуск насоса")),
+        ("update", record_uuid, {"field": "note", "value": "проверено"}),
+    ]
+    for write in writes:
+        write_queue.enqueue(*write)
+    write_queue.flush(db_cursor)
+
+    for write in writes:
+        write_queue.enqueue(*write)
+    result = write_queue.flush(db_cursor)
+
+    assert result["conflicts"] == 0
+    assert journal_rows(db_cursor) == [(record_uuid, "09:00:00", "пуск насоса", "проверено")]
+
+
+def test_last_update_of_field_in_batch_wins(db_cursor, write_queue):
+    record_uuid = str(uuid.uuid4())
+    write_queue.enqueue("insert", record_uuid, insert_payload("пуск насоса"))
+    write_queue.enqueue("update", record_uuid, {"field": "content", "value": "пуск насоса 1"})
+    write_queue.enqueue("update", record_uuid, {"field": "content", "value": "пуск насоса 2"})
+
+    write_queue.flush(db_cursor)
+
+    assert journal_rows(db_cursor)[0][2] == "пуск насоса 2"
+
+
+def test_repeated_delete_counts_conflict(db_cursor, write_queue):
+    record_uuid = str(uuid.uuid4())
+    write_queue.enqueue("insert", record_uuid, insert_payload("пуск насоса"))
+    write_queue.enqueue("delete", record_uuid, {})
+    write_queue.flush(db_cursor)
+
+    write_queue.enqueue("delete", record_uuid, {})
+    result = write_queue.flush(db_cursor)
+
+    assert result["conflicts"] == 1
+    assert journal_rows(db_cursor) == []
+    assert write_queue.count() == 0
+
+
+def test_rejected_write_does_not_block_batch(db_cursor, write_queue):
+    good_uuid, bad_uuid = str(uuid.uuid4()), str(uuid.uuid4())
+    write_queue.enqueue("insert", good_uuid, insert_payload("пуск насоса"))
+    write_queue.enqueue("insert", bad_uuid, insert_payload("ошибка", time="25:99"))
+
+    result = write_queue.flush(db_cursor)
+
+    assert result["rejected"] == [("insert", bad_uuid)]
+    assert [row[0] for row in journal_rows(db_cursor)] == [good_uuid]
+    assert write_queue.count() == 0
@@ -0,0 +1,92 @@
+"""Шаблоны отчетов: разбор разделов, подстановка полей и экранирование."""
+import datetime
+import html
+import io
+
+import docx
+import pytest
+
+import journal
+
+
+def test_compile_splits_literals_and_fields():
+    assert journal.ReportTemplate.compile("<td>{time}</td><td>{date:%d.%m}</td>") == [
+        ("<td>", "time", ""), ("</td><td>", "date", "%d.%m"), ("</td>", None, ""),
+    ]
+
+
+def test_render_escapes_values_but_not_template_text():
+    template = journal.ReportTemplate({"row": "<td>{content}</td>"}, html.escape)
+    assert template.render("row", content='<b>"насос" & задвижка</b>') == (
+        "<td>&lt;b&gt;&quot;насос&quot; &amp; задвижка&lt;/b&gt;</td>"
+    )
+
+
+def test_format_spec_is_applied_before_escaping():
+    template = journal.ReportTemplate({"title": "{date:%d-%m-%Y} {count:>3}"}, lambda value: value.replace(" ", "_"))
+    assert template.render("title", date=datetime.date(2024, 3, 1), count=7) == "01-03-2024 __7"
+
+
+def test_doubled_braces_are_literal():
+    template = journal.ReportTemplate({"style": "p {{ color: red }} {name}"}, html.escape)
+    assert template.render("style", name="a{b}") == "p { color: red } a{b}"
+
+
+def test_missing_field_raises_key_error():
+    template = journal.ReportTemplate({"row": "{time} {content}"}, html.escape)
+    with pytest.raises(KeyError, match="content"):
+        template.render("row", time="08:30")
+
+
+def test_unknown_section_raises_key_error():
+    template = journal.ReportTemplate({"row": "{time}"}, html.escape)
+    with pytest.raises(KeyError):
+        template.render("header", time="08:30")
+
+
+@pytest.mark.parametrize("text", ["{", "text }", "{name"])
+def test_unbalanced_braces_fail_at_compile_time(text):
+    with pytest.raises(ValueError):
+        journal.ReportTemplate({"broken": text}, html.escape)
+
+
+def test_html_report_escapes_shift_data():
+    report = journal.ShiftReport(
+        datetime.date(2024, 3, 1), "1-я смена", ["Иванов <И.И.>"],
+        [(datetime.time(8, 45), "давление > 5 & растет", None)],
+    )
+    out = io.StringIO()
+    assert journal.write_shift_html(out, report) == 1
+    text = out.getvalue()
+    assert "<h2>Смена: 1-я смена, Дата: 01-03-2024</h2>" in text
+    assert "<li>Иванов &lt;И.И.&gt;</li>" in text
+    assert "давление &gt; 5 &amp; растет" in text
+
+
+def test_docx_text_escapes_xml_and_keeps_line_breaks():
+    writer = journal.docx_report_writer()
+    assert writer.text("a < b\tc\nd\x07") == (
+        '<w:t xml:space="preserve">a &lt; b</w:t><w:tab/><w:t xml:space="preserve">c</w:t>'
+        '<w:br/><w:t xml:space="preserve">d</w:t>'
+    )
+
+
+def test_docx_placeholder_requires_exactly_one_marker():
+    with pytest.raises(ValueError):
+        journal.DocxReportWriter._placeholders("<w:t>no marker</w:t>", {journal.DocxReportWriter.TITLE_MARKER: "title"})
+
+
+def test_docx_report_round_trip(tmp_path):
+    path = str(tmp_path / "report.docx")
+    rows = [("08:45", "давление > 5 & <растет>", "строка 1\nстрока 2"), ("09:00", "{поле}", "")]
+
+    assert journal.docx_report_writer().write(path, "Смена {1}", ["Иванов & Ко"], iter(rows)) == 2
+
+    document = docx.Document(path)
+    texts = [paragraph.text for paragraph in document.paragraphs]
+    assert "Смена {1}" in texts
+    assert "Иванов & Ко" in texts
+    table = document.tables[0]
+    assert [[cell.text for cell in row.cells] for row in table.rows[1:]] == [
+        ["08:45", "давление > 5 & <растет>", "строка 1\nстрока 2"], ["09:00", "{поле}", ""],
+    ]
@@ -0,0 +1,165 @@
+"""Границы смен (08:30 и 20:30) и автоматическая отправка сводок."""
+import datetime
+import logging
+
+import pytest
+
+import journal
+
+FIRST, SECOND = "1-я смена", "2-я смена"
+
+
+def at(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M")
+
+
+def day(text):
+    return datetime.date.fromisoformat(text)
+
+
+@pytest.mark.parametrize("moment, expected", [
+    ("2024-03-01 00:00", (SECOND, "2024-02-29")),
+    ("2024-03-01 08:29", (SECOND, "2024-02-29")),
+    ("2024-03-01 08:30", (FIRST, "2024-03-01")),
+    ("2024-03-01 20:29", (FIRST, "2024-03-01")),
+    ("2024-03-01 20:30", (SECOND, "2024-03-01")),
+    ("2024-03-01 23:59", (SECOND, "2024-03-01")),
+    ("2024-01-01 03:00", (SECOND, "2023-12-31")),
+])
+def test_shift_at(moment, expected):
+    shift, date = expected
+    assert journal.shift_at(at(moment)) == (shift, day(date))
+
+
+@pytest.mark.parametrize("since, until, expected", [
+    # Промежуток (since, until]: окончание в since не входит, в until - входит
+    ("2024-03-01 08:30", "2024-03-01 20:30", [("2024-03-01", FIRST)]),
+    ("2024-03-01 08:29", "2024-03-01 20:29", [("2024-02-29", SECOND)]),
+    ("2024-03-01 08:00", "2024-03-02 09:00", [("2024-02-29", SECOND), ("2024-03-01", FIRST), ("2024-03-01", SECOND)]),
+    ("2023-12-31 20:00", "2024-01-01 09:00", [("2023-12-31", FIRST), ("2023-12-31", SECOND)]),
+    ("2024-03-01 21:00", "2024-03-02 08:00", []),
+])
+def test_finished_shifts(since, until, expected):
+    assert journal.finished_shifts(at(since), at(until)) == [(day(date), shift) for date, shift in expected]
+
+
+@pytest.mark.parametrize("moment, expected", [
+    ("2024-03-01 08:29", "2024-03-01 08:30"),
+    ("2024-03-01 08:30", "2024-03-01 20:30"),
+    ("2024-03-01 20:30", "2024-03-02 08:30"),
+    ("2024-12-31 23:00", "2025-01-01 08:30"),
+])
+def test_next_shift_end(moment, expected):
+    assert journal.next_shift_end(at(moment)) == at(expected)
+
+
+@pytest.mark.parametrize("date, shift, expected", [
+    ("2024-03-01", FIRST, "2024-03-01 20:30"),
+    ("2024-02-29", SECOND, "2024-03-01 08:30"),
+    ("2023-12-31", SECOND, "2024-01-01 08:30"),
+])
+def test_shift_end(date, shift, expected):
+    assert journal.shift_end(day(date), shift) == at(expected)
+    assert journal.shift_at(at(expected) - datetime.timedelta(minutes=1)) == (shift, day(date))
+
+
+@pytest.fixture
+def scheduler(qapp, tmp_path):
+    mail_queue = journal.MailQueue(str(tmp_path / "outbox.db"), sender=None)
+    settings = {"sender": "journal@example.com", "to": ["shift@example.com"], "cc": []}
+    return journal.ShiftReportScheduler(None, mail_queue, settings)
+
+
+def last_due_shift(scheduler):
+    until = datetime.datetime.now() - scheduler.GRACE
+    return journal.finished_shifts(until - scheduler.CATCHUP, until)[-1]
+
+
+def test_migration_marks_finished_shifts(db_cursor, scheduler):
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
+    assert scheduler.mail_queue.pending_count() == 0
+
+
+def test_report_is_queued_once(db_cursor, scheduler):
+    date, shift = last_due_shift(scheduler)
+    db_cursor.execute("DELETE FROM shift_reports WHERE date = %s AND shift = %s", (date, shift))
+    db_cursor.connection.commit()
+
+    assert scheduler.send_due_reports(db_cursor) == ([(date, shift, 0)], [])
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
+
+    # Прерывание между постановкой письма в очередь и отметкой в shift_reports
+    db_cursor.execute("UPDATE shift_reports SET queued_at = NULL WHERE date = %s AND shift = %s", (date, shift))
+    db_cursor.connection.commit()
+    assert scheduler.send_due_reports(db_cursor) == ([(date, shift, 0)], [])
+    assert scheduler.mail_queue.pending_count() == 1
+
+
+def test_report_claimed_by_other_workstation_is_not_queued(db_cursor, scheduler):
+    date, shift = last_due_shift(scheduler)
+    db_cursor.execute(
+        "UPDATE shift_reports SET claimed_by = 'other', queued_at = NULL, skipped = false "
+        "WHERE date = %s AND shift = %s",
+        (date, shift)
+    )
+    db_cursor.connection.commit()
+
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
+
+
+def claim_unqueued(cursor, date, shift, claimed_by, age):
+    cursor.execute(
+        "UPDATE shift_reports SET claimed_by = %s, claimed_at = now() - %s, queued_at = NULL, skipped = false "
+        "WHERE date = %s AND shift = %s",
+        (claimed_by, age, date, shift)
+    )
+    cursor.connection.commit()
+
+
+def test_claim_of_other_process_on_same_host_is_not_queued(db_cursor, scheduler):
+    date, shift = last_due_shift(scheduler)
+    other = journal.ShiftReportScheduler(None, scheduler.mail_queue, scheduler.settings)
+    assert other.claim_id != scheduler.claim_id
+    claim_unqueued(db_cursor, date, shift, other.claim_id, datetime.timedelta(minutes=1))
+
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
+    assert other.send_due_reports(db_cursor) == ([(date, shift, 0)], [])
+
+
+@pytest.mark.parametrize("claimed_by", ["{host}/00000000-0000-0000-0000-000000000000", "{host}"])
+def test_stale_claim_of_interrupted_process_is_taken_over(db_cursor, scheduler, claimed_by):
+    date, shift = last_due_shift(scheduler)
+    stale = scheduler.CLAIM_TIMEOUT + datetime.timedelta(minutes=1)
+    claim_unqueued(db_cursor, date, shift, claimed_by.format(host=scheduler.host), stale)
+
+    assert scheduler.send_due_reports(db_cursor) == ([(date, shift, 0)], [])
+    db_cursor.execute("SELECT claimed_by FROM shift_reports WHERE date = %s AND shift = %s", (date, shift))
+    assert db_cursor.fetchone() == (scheduler.claim_id,)
+
+
+def test_stale_claim_of_other_host_is_not_taken_over(db_cursor, scheduler):
+    date, shift = last_due_shift(scheduler)
+    claim_unqueued(db_cursor, date, shift, "other/00000000-0000-0000-0000-000000000000", datetime.timedelta(hours=1))
+
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
+
+
+def test_shifts_older_than_catchup_are_reported_as_missed(db_cursor, scheduler, caplog):
+    last_mark = datetime.date.today() - datetime.timedelta(days=5)
+    db_cursor.execute("DELETE FROM shift_reports")
+    db_cursor.execute(
+        "INSERT INTO shift_reports (date, shift, claimed_by, queued_at) VALUES (%s, %s, 'other', now())",
+        (last_mark, SECOND)
+    )
+    db_cursor.connection.commit()
+
+    sent, missed = scheduler.send_due_reports(db_cursor)
+
+    assert missed and sent
+    assert missed[0] == (last_mark + datetime.timedelta(days=1), FIRST)
+    assert not set(missed) & {(date, shift) for date, shift, _ in sent}
+    assert scheduler.mail_queue.pending_count() == len(sent)
+    with caplog.at_level(logging.WARNING):
+        scheduler.on_reports_sent((sent, missed))
+    assert f"{FIRST} за {missed[0][0]}" in caplog.text
+    assert scheduler.send_due_reports(db_cursor) == ([], [])
@@ -0,0 +1,182 @@
+"""Распознавание речи по ходу записи: сеансы и порядок текста записей."""
+import threading
+
+import pytest
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QTextEdit
+
+import journal
+from conftest import wait_until
+
+
+class WordStream:
+    """Потоковое распознавание, в котором каждая порция данных - слово."""
+
+    def __init__(self):
+        self.words = []
+
+    def feed(self, data):
+        self.words.append(data.decode())
+        return " ".join(self.words)
+
+    def finish(self):
+        return " ".join(self.words)
+
+
+class WordEngine(journal.SpeechEngine):
+    name = "words"
+
+    def open_stream(self, sample_rate):
+        return WordStream()
+
+    def transcribe(self, audio_data):
+        return audio_data.decode()
+
+
+def test_transcriber_signals_carry_session(qapp):
+    received = []
+    transcriber = journal.StreamingTranscriber(WordEngine(), 16000, session=7)
+    transcriber.partial.connect(lambda session, text: received.append(("partial", session, text)))
+    transcriber.finished.connect(lambda session, result: received.append(("finished", session, result.text)))
+    transcriber.feed("пуск".encode())
+    transcriber.feed("насоса".encode())
+    transcriber.finish()
+
+    assert wait_until(qapp, lambda: len(received) == 3)
+    assert received == [("partial", 7, "пуск"), ("partial", 7, "пуск насоса"), ("finished", 7, "пуск насоса")]
+
+
+@pytest.fixture
+def dialog(qapp):
+    dialog = journal.VoiceRecorderDialog(QTextEdit())
+    yield dialog
+    dialog.recognition.stop()
+
+
+def result(text):
+    return journal.RecognitionResult(text, "words", 0.1, None)
+
+
+def test_stale_partial_is_ignored(dialog):
+    dialog.recording_number = 1
+    dialog.show_partial(1, "пуск")
+    dialog.recording_number = 2  # Началась следующая запись
+    dialog.show_partial(1, "пуск насоса")
+    dialog.show_partial(2, "останов")
+
+    assert dialog.target_text_edit.toPlainText() == "останов"
+
+
+def test_late_final_text_keeps_recording_order(dialog):
+    dialog.recording_number = 2
+    dialog.show_partial(2, "останов")
+    dialog.show_result(1, result("пуск насоса"))
+    assert dialog.target_text_edit.toPlainText() == "пуск насоса останов"
+
+    dialog.recording_number = 3
+    dialog.show_result(3, result("проверка"))
+    dialog.show_result(2, result("останов насоса"))
+    assert dialog.target_text_edit.toPlainText() == "пуск насоса останов насоса проверка"
+
+
+def test_failed_old_session_falls_back_to_its_own_recording(dialog):
+    dialog.recording_number = 2
+    dialog.pending_audio[1] = "первая запись"
+    submitted = []
+    dialog.recognition.submit = lambda audio_data: submitted.append(audio_data) or 41
+
+    dialog.on_transcription_failed(1, "ошибка")
+
+    assert submitted == ["первая запись"]
+    assert dialog.job_recordings == {41: 1}
+    assert 1 not in dialog.pending_audio
+
+
+class GatedEngine(journal.SpeechEngine):
+    """Движок, который распознает запись только после release."""
+    name = "gated"
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def transcribe(self, audio_data):
+        self.started.set()
+        self.release.wait(5)
+        return audio_data.text
+
+
+class FakeAudio:
+    """Запись для RecognitionQueue: движок получает ее целиком."""
+
+    def __init__(self, text):
+        self.text = text
+        self.frame_data = b"\0\0" * 1600
+        self.sample_rate = 16000
+        self.sample_width = 2
+
+
+@pytest.fixture
+def gated_queue(qapp):
+    engine = GatedEngine()
+    recognition = journal.RecognitionQueue(lambda: engine)
+    yield engine, recognition
+    engine.release.set()
+    recognition.stop()
+    recognition.thread.join(5)
+
+
+def test_pending_count_excludes_job_in_its_own_signal(qapp, gated_queue):
+    engine, recognition = gated_queue
+    seen = []
+    # Прямое соединение: обработчик выполняется в момент сигнала в потоке очереди
+    recognition.finished.connect(
+        lambda job_id, result: seen.append((job_id, recognition.pending_count())), Qt.DirectConnection
+    )
+    first = recognition.submit(FakeAudio("пуск"))
+    second = recognition.submit(FakeAudio("останов"))
+    assert recognition.pending_count() == 2
+
+    engine.release.set()
+
+    assert wait_until(qapp, lambda: len(seen) == 2)
+    assert seen == [(first, 1), (second, 0)]
+
+
+def test_cancel_all_cancels_current_and_queued_jobs(qapp, gated_queue):
+    engine, recognition = gated_queue
+    cancelled = []
+    recognition.cancelled.connect(cancelled.append)
+    jobs = [recognition.submit(FakeAudio(text)) for text in ("пуск", "останов", "проверка")]
+    assert engine.started.wait(5)
+
+    recognition.cancel_all()
+    engine.release.set()
+
+    assert wait_until(qapp, lambda: len(cancelled) == 3)
+    assert cancelled == jobs
+    assert recognition.pending_count() == 0
+
+
+def test_close_can_wait_for_pending_final_text(dialog, monkeypatch):
+    monkeypatch.setattr(journal.QMessageBox, "question", lambda *args: journal.QMessageBox.Yes)
+    dialog.show()
+    dialog.recording_number = 1
+    dialog.pending_audio[1] = "запись"
+
+    assert not dialog.close()
+    assert dialog.isVisible()
+
+    dialog.show_result(1, result("пуск насоса"))
+
+    assert not dialog.isVisible()
+    assert dialog.target_text_edit.toPlainText() == "пуск насоса"
+
+
+def test_close_without_waiting_cancels_recognition(dialog, monkeypatch):
+    monkeypatch.setattr(journal.QMessageBox, "question", lambda *args: journal.QMessageBox.No)
+    dialog.show()
+    dialog.pending_audio[1] = "запись"
+
+    assert dialog.close()
+    assert not dialog.isVisible()